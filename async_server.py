@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Asyncio Server for NorCal Surf Adventures
+Serves the same routes and pages as server.py, but every connection is a
+coroutine, so hanging and slow responses cost a little memory instead of a thread
+"""
+
+import asyncio
+import email.utils
+import http
+import http.server
+import os
+import random
+import socket
+import struct
+import sys
+import time
+
+from server import (CLOSE, NO_STAGE, RESET, SLOW_ROUTES, STATIC_FILES, ServerMetrics,
+                    SurfAdventuresHTTPRequestHandler, encode_page, print_banner, read_static_page, render_404_page, render_leaf_page,
+                    rate_limited_response, render_metrics, render_robots_txt, render_sitemap, render_synthetic_page,
+                    resolve_route, slow_response_body, slow_response_steps, static_response)
+
+# Matches the socketserver handler so both servers send the same headers
+PROTOCOL_VERSION = SurfAdventuresHTTPRequestHandler.protocol_version
+SERVER_VERSION = (SurfAdventuresHTTPRequestHandler.server_version + ' '
+                  + SurfAdventuresHTTPRequestHandler.sys_version)
+
+
+class AsyncSurfAdventuresServer:
+    """Asyncio implementation of SurfAdventuresHTTPRequestHandler's routes"""
+
+    def __init__(self, synthetic_pages=0, synthetic_fanout=10, metrics=None, crawl_delay=0,
+                 static_root='.', static_mode='sendfile', rate_limiter=None, profiler=None,
+                 slow_routes=None, static_files=None):
+        """
+        metrics, slow_routes and static_files are shared with the socketserver
+        handler when run_server starts this server; they default to fresh
+        ServerMetrics, SLOW_ROUTES and STATIC_FILES.
+        """
+        self.synthetic_pages = synthetic_pages
+        self.synthetic_fanout = synthetic_fanout
+        self.crawl_delay = crawl_delay
+        self.static_root = static_root
+        self.static_mode = static_mode
+        self.rate_limiter = rate_limiter
+        self.metrics = metrics or ServerMetrics()
+        self.slow_routes = SLOW_ROUTES if slow_routes is None else slow_routes
+        self.static_files = static_files or STATIC_FILES
+        self.profiler = profiler
+        self.access_log_sample_rate = SurfAdventuresHTTPRequestHandler.access_log_sample_rate
+
+    def stage(self, name):
+        """Time a stage of the request when profiling; only for code that doesn't await"""
+        return NO_STAGE if self.profiler is None else self.profiler.stage(name)
+
+    def build_head(self, status, headers):
+        """Build the status line and header block the way http.server does"""
+        lines = [f"{PROTOCOL_VERSION} {status} {http.HTTPStatus(status).phrase}",
+                 f"Server: {SERVER_VERSION}",
+                 f"Date: {email.utils.formatdate(time.time(), usegmt=True)}"]
+        lines.extend(f"{name}: {value}" for name, value in headers)
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1', 'strict')
+
+    def log_request(self, peer, request_line, status):
+        """Write a sampled access log line in http.server's format"""
+        if random.random() < self.access_log_sample_rate:
+            timestamp = time.strftime("%d/%b/%Y %H:%M:%S")
+            sys.stderr.write(f'{peer[0]} - - [{timestamp}] "{request_line}" {status} -\n')
+
+    async def handle(self, reader, writer):
+        """Serve one connection (one request, like HTTP/1.0 in server.py)"""
+        self.metrics.connection_opened()
+        try:
+            await self.handle_request(reader, writer)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            pass
+        finally:
+            self.metrics.connection_closed()
+            writer.close()
+
+    async def handle_request(self, reader, writer):
+        raw_request_line = await reader.readline()
+        if not raw_request_line:
+            return
+        started = time.perf_counter()
+        request_line = raw_request_line.decode('iso-8859-1').rstrip('\r\n')
+        request_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('iso-8859-1').partition(':')
+            request_headers[name.strip().lower()] = value.strip()
+        host = request_headers.get('host')
+
+        parts = request_line.split()
+        if len(parts) != 3:
+            await self.send_error(writer, 400, "Bad request syntax")
+            return
+        method, path, _ = parts
+        if method != 'GET':
+            await self.send_error(writer, 501, f"Unsupported method ({method!r})")
+            return
+
+        with self.stage('route'):
+            route, action, arg = resolve_route(path, self.synthetic_pages, self.static_root, self.slow_routes)
+        wait = self.rate_limiter.take() if self.rate_limiter is not None and action != 'metrics' else 0
+        if wait:
+            headers, body = rate_limited_response(wait)
+            self.log_request(writer.get_extra_info('peername') or ('-',), request_line, 429)
+            await self.write(writer, self.build_head(429, headers) + body)
+            self.metrics.observe(route, 429, time.perf_counter() - started)
+            return
+        self.log_request(writer.get_extra_info('peername') or ('-',), request_line,
+                         404 if action == '404' else 302 if action == 'redirect' else 200)
+
+        if action == 'slow':
+            await self.send_slow_response(reader, writer, path.partition('?')[0], arg)
+            self.metrics.observe(route, 200, time.perf_counter() - started)
+            return
+        
+        static = (self.static_files.open(os.path.join(self.static_root, arg))
+                  if action == 'static' else None)
+        if static is not None:
+            await self.send_static_file(writer, arg, static, request_headers.get('accept-encoding'))
+            self.metrics.observe(route, 200, time.perf_counter() - started)
+            return
+
+        with self.stage('render'):
+            status, headers, body, cache_key = 200, [('Content-type', 'text/html')], b"", None
+            if action == 'metrics':
+                content_type, body = render_metrics(self.metrics, arg)
+                headers = [('Content-type', content_type), ('Content-Length', str(len(body)))]
+            elif action in ('robots', 'sitemap'):
+                site_url = f"http://{host or 'localhost:%d' % writer.get_extra_info('sockname')[1]}"
+                if action == 'robots':
+                    content_type = 'text/plain'
+                    body = render_robots_txt(site_url, self.crawl_delay, self.slow_routes)
+                else:
+                    content_type = 'application/xml'
+                    body = render_sitemap(site_url, self.synthetic_pages, self.slow_routes)
+                headers = [('Content-type', content_type), ('Content-Length', str(len(body)))]
+            elif action == 'redirect':
+                status, headers = 302, [('Location', arg)]
+            elif action == 'static':
+                body, cache_key = read_static_page(arg, self.static_root), arg
+            elif action == 'leaf':
+                body, cache_key = render_leaf_page(arg), ('leaf', arg)
+            elif action == 'synthetic':
+                body = render_synthetic_page(arg, self.synthetic_pages, self.synthetic_fanout)
+                cache_key = ('synthetic', arg)
+            else:
+                status, body = 404, render_404_page(arg)
+
+        if action in ('static', 'leaf', 'synthetic', '404'):
+            with self.stage('encode'):
+                body, extra_headers = encode_page(body, request_headers.get('accept-encoding'), cache_key)
+                headers += extra_headers
+
+        await self.write(writer, self.build_head(status, headers) + body)
+        self.metrics.observe(route, status, time.perf_counter() - started)
+
+    async def send_static_file(self, writer, filename, static, accept_encoding):
+        """Send a page or gallery file, straight from the file when possible"""
+        headers, body = static_response(filename, static, accept_encoding)
+        if body is not None:
+            await self.write(writer, self.build_head(200, headers) + body)
+            return
+        await self.write(writer, self.build_head(200, headers))
+        if self.static_mode == 'read':
+            await self.write(writer, static.read())
+        elif self.static_mode == 'mmap':
+            await self.write(writer, static.view)
+        elif static.size:
+            # Uses os.sendfile where the loop supports it, plain writes otherwise
+            sent = await asyncio.get_running_loop().sendfile(writer.transport, static.file,
+                                                             0, static.size)
+            self.metrics.add_bytes(sent)
+
+    async def write(self, writer, data):
+        writer.write(data)
+        await writer.drain()
+        self.metrics.add_bytes(len(data))
+
+    async def send_error(self, writer, status, explain):
+        """Send an error page like BaseHTTPRequestHandler.send_error"""
+        body = (http.server.DEFAULT_ERROR_MESSAGE % {
+            'code': status,
+            'message': http.HTTPStatus(status).phrase,
+            'explain': explain,
+        }).encode('UTF-8', 'replace')
+        head = self.build_head(status, [('Connection', 'close'),
+                                        ('Content-Type', http.server.DEFAULT_ERROR_CONTENT_TYPE),
+                                        ('Content-Length', str(len(body)))])
+        await self.write(writer, head + body)
+
+    async def send_slow_response(self, reader, writer, path, profile):
+        """Play a slow response profile as a coroutine"""
+        body, length = slow_response_body(path, profile)
+        headers = [('Content-type', 'text/html')]
+        if length is not None:
+            headers.append(('Content-Length', str(length)))
+        steps = slow_response_steps(profile, self.build_head(200, headers), body)
+
+        self.metrics.hang_started()
+        try:
+            for delay, action in steps:
+                if delay is None:
+                    # Hold the connection until the client disconnects
+                    while await reader.read(4096):
+                        pass
+                    return
+                if delay and await self.client_left(reader, delay):
+                    return
+                if action == CLOSE:
+                    return
+                if action == RESET:
+                    # Zero linger makes the close send a RST instead of a FIN
+                    sock = writer.get_extra_info('socket')
+                    if sock is not None:
+                        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                    writer.transport.abort()
+                    return
+                await self.write(writer, action)
+        finally:
+            self.metrics.hang_finished()
+
+    @staticmethod
+    async def client_left(reader, delay):
+        """Wait `delay` seconds; return True early if the client hangs up"""
+        deadline = time.monotonic() + delay
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            try:
+                if not await asyncio.wait_for(reader.read(4096), remaining):
+                    return True
+            except asyncio.TimeoutError:
+                return False
+
+    async def serve(self, port, host=""):
+        server = await asyncio.start_server(self.handle, host or None, port,
+                                            backlog=1024, reuse_address=True)
+        print_banner(server.sockets[0].getsockname()[1], 'asyncio')
+        sys.stdout.flush()
+        async with server:
+            await server.serve_forever()
+
+
+def run_async_server(port, synthetic_pages=0, synthetic_fanout=10, slow_routes=None, crawl_delay=0,
+                     static_root='.', static_mode='sendfile', rate_limiter=None, profiler=None,
+                     metrics=None, static_files=None):
+    """Run the asyncio server until interrupted"""
+    server = AsyncSurfAdventuresServer(synthetic_pages, synthetic_fanout, metrics=metrics,
+                                       crawl_delay=crawl_delay, static_root=static_root,
+                                       static_mode=static_mode, rate_limiter=rate_limiter,
+                                       profiler=profiler, slow_routes=slow_routes,
+                                       static_files=static_files)
+    try:
+        asyncio.run(server.serve(port))
+    except KeyboardInterrupt:
+        print("\n🛑 Server stopped")
+
+
+if __name__ == "__main__":
+    from server import main
+    sys.argv[1:1] = ['--mode', 'asyncio']
+    main()
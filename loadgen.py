@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Load Generator for the NorCal Surf Adventures server
+Drives a configurable mix of routes over raw asyncio sockets, either at a fixed
+concurrency or a fixed arrival rate, and reports throughput and latency
+percentiles per route for each server mode
+"""
+
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urlparse
+
+from server import LEAF_PATHS, MISSING_PATHS, SERVER_MODES
+
+STATIC_PATHS = ['/', '/spots', '/about', '/gallery/mavericks-photos/']
+
+DEFAULT_MIX = 'static=60,leaf=15,404=15,decode=8,hang=2'
+
+
+def route_paths():
+    """Return the request paths each route class is drawn from"""
+    return {
+        'static': STATIC_PATHS,
+        'leaf': LEAF_PATHS,
+        '404': MISSING_PATHS + ['/no-such-page', '/spots/pleasure-point'],
+        'decode': ['/decode/' + base64.b64encode(path.encode()).decode()
+                   for path in LEAF_PATHS + ['/gallery/mavericks-photos/']],
+        'hang': ['/hang'],
+    }
+
+
+def parse_mix(spec):
+    """Parse 'static=60,leaf=15,...' into a list of (route, weight)"""
+    paths = route_paths()
+    mix = []
+    for item in spec.split(','):
+        route, _, weight = item.partition('=')
+        route = route.strip()
+        if route not in paths:
+            raise ValueError(f"Unknown route class '{route}' (choose from {', '.join(paths)})")
+        mix.append((route, float(weight or 1)))
+    return mix
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoadStats:
+    """Per-route latency samples and outcome counters"""
+
+    def __init__(self):
+        self.latencies = {}
+        self.status = {}
+        self.errors = {}
+        self.held = {}
+        self.bytes_received = 0
+
+    def record(self, route, outcome, latency, size=0):
+        self.bytes_received += size
+        if outcome == 'error':
+            self.errors[route] = self.errors.get(route, 0) + 1
+            return
+        if outcome == 'held':
+            # Hanging responses are measured to the first byte
+            self.held[route] = self.held.get(route, 0) + 1
+        else:
+            counts = self.status.setdefault(route, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+        self.latencies.setdefault(route, []).append(latency)
+
+    def report(self, duration):
+        """Summarise the samples as a JSON-serialisable dict"""
+        routes = {}
+        all_latencies = []
+        for route in sorted(set(self.latencies) | set(self.errors)):
+            samples = sorted(self.latencies.get(route, []))
+            all_latencies.extend(samples)
+            routes[route] = self._summary(samples, duration)
+            routes[route]['status'] = {str(k): v for k, v in self.status.get(route, {}).items()}
+            routes[route]['errors'] = self.errors.get(route, 0)
+            routes[route]['held'] = self.held.get(route, 0)
+        overall = self._summary(sorted(all_latencies), duration)
+        overall['errors'] = sum(self.errors.values())
+        overall['bytes_received'] = self.bytes_received
+        return {'duration_sec': duration, 'overall': overall, 'routes': routes}
+
+    @staticmethod
+    def _summary(samples, duration):
+        return {
+            'requests': len(samples),
+            'throughput_rps': len(samples) / duration if duration else 0.0,
+            'p50_ms': _ms(percentile(samples, 0.50)),
+            'p99_ms': _ms(percentile(samples, 0.99)),
+            'p999_ms': _ms(percentile(samples, 0.999)),
+            'max_ms': _ms(samples[-1] if samples else None),
+        }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+async def fetch(host, port, path, timeout, hang_timeout):
+    """Send one GET over a fresh connection and return (outcome, latency, bytes)"""
+    start = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                     f"Connection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        if not status_line:
+            return 'error', time.perf_counter() - start, 0
+        first_byte = time.perf_counter() - start
+        status = int(status_line.split()[1])
+        size = len(status_line)
+        try:
+            # The server speaks HTTP/1.0, so the body ends when it closes
+            body = await asyncio.wait_for(reader.read(), hang_timeout if path == '/hang' else timeout)
+            size += len(body)
+        except asyncio.TimeoutError:
+            if path == '/hang':
+                return 'held', first_byte, size
+            raise
+        return status, time.perf_counter() - start, size
+    except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+        return 'error', time.perf_counter() - start, 0
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+async def run_load(host, port, mix, duration, concurrency=None, rate=None,
+                   timeout=5.0, hang_timeout=2.0, max_in_flight=10000, seed=None):
+    """Run a closed-loop (concurrency) or open-loop (rate) load test"""
+    rng = random.Random(seed)
+    paths = route_paths()
+    routes = [route for route, _ in mix]
+    weights = [weight for _, weight in mix]
+    stats = LoadStats()
+
+    async def one_request():
+        route = rng.choices(routes, weights)[0]
+        outcome, latency, size = await fetch(host, port, rng.choice(paths[route]), timeout, hang_timeout)
+        stats.record(route, outcome, latency, size)
+
+    start = time.perf_counter()
+    deadline = start + duration
+
+    if rate:
+        # Open loop: Poisson arrivals, independent of how fast the server answers
+        in_flight = set()
+        next_arrival = start
+        while next_arrival < deadline:
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+            if len(in_flight) < max_in_flight:
+                task = asyncio.ensure_future(one_request())
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            else:
+                stats.record('dropped', 'error', 0.0)
+            next_arrival += rng.expovariate(rate)
+        if in_flight:
+            await asyncio.wait(in_flight)
+    else:
+        # Closed loop: each worker sends its next request as soon as the last one ends
+        async def worker():
+            while time.perf_counter() < deadline:
+                await one_request()
+        await asyncio.gather(*(worker() for _ in range(concurrency or 1)))
+
+    return stats.report(time.perf_counter() - start)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def spawned_server(mode, extra_args=()):
+    """Start server.py in the given mode on a free port and yield the port"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    port = free_port()
+    env = dict(os.environ, ACCESS_LOG_SAMPLE_RATE='0')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(root, 'server.py'), '--port', str(port), '--mode', mode,
+         *extra_args],
+        cwd=root, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/__metrics", timeout=1).read()
+                break
+            except OSError:
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError(f"server.py --mode {mode} did not start")
+                time.sleep(0.1)
+        yield port
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def print_report(title, report):
+    print(f"\n📊 {title}")
+    print("=" * 78)
+    print(f"{'route':<10}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'p999 ms':>10}{'errors':>9}{'held':>9}")
+    print("-" * 78)
+    rows = list(report['routes'].items()) + [('overall', report['overall'])]
+    for route, row in rows:
+        print(f"{route:<10}{row['requests']:>10}{row['throughput_rps']:>10.1f}"
+              f"{_fmt(row['p50_ms']):>10}{_fmt(row['p99_ms']):>10}{_fmt(row['p999_ms']):>10}"
+              f"{row.get('errors', 0):>9}{row.get('held', ''):>9}")
+
+
+def _fmt(value):
+    return '-' if value is None else f"{value:.2f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the NorCal Surf Adventures server")
+    parser.add_argument('--url', help="Server to test, e.g. http://localhost:8000 "
+                                      "(default: spawn server.py for each --spawn mode)")
+    parser.add_argument('--spawn', default=','.join(SERVER_MODES),
+                        help=f"Comma separated server modes to start and test ({', '.join(SERVER_MODES)})")
+    parser.add_argument('--mix', default=DEFAULT_MIX,
+                        help=f"Route mix as route=weight pairs (default: {DEFAULT_MIX})")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds to run each test")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--concurrency', type=int, default=None,
+                       help="Closed loop: number of concurrent clients (default: 16)")
+    group.add_argument('--rate', type=float, default=None,
+                       help="Open loop: requests per second (Poisson arrivals)")
+    parser.add_argument('--timeout', type=float, default=5.0, help="Per-request timeout in seconds")
+    parser.add_argument('--hang-timeout', type=float, default=2.0,
+                        help="How long to hold /hang connections before giving up")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for the route mix")
+    parser.add_argument('--json', action='store_true', help="Print the reports as JSON")
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    concurrency = args.concurrency if args.rate is None else None
+    if args.rate is None and concurrency is None:
+        concurrency = 16
+
+    def load(host, port):
+        return asyncio.run(run_load(host, port, mix, args.duration, concurrency=concurrency,
+                                    rate=args.rate, timeout=args.timeout,
+                                    hang_timeout=args.hang_timeout, seed=args.seed))
+
+    reports = {}
+    if args.url:
+        target = urlparse(args.url)
+        reports[args.url] = load(target.hostname, target.port or 80)
+    else:
+        for mode in args.spawn.split(','):
+            with spawned_server(mode.strip()) as port:
+                reports[mode.strip()] = load('127.0.0.1', port)
+
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return
+    load_desc = f"{args.rate:g} req/s" if args.rate else f"concurrency {concurrency}"
+    for name, report in reports.items():
+        print_report(f"{name} - {load_desc}, {report['duration_sec']:.1f}s", report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Parity Check for the socketserver and asyncio servers
+Sends identical requests to server.py in two modes and compares status codes,
+headers and bodies, including the slow and hanging responses
+"""
+
+import argparse
+import base64
+import socket
+import sys
+import time
+
+from loadgen import spawned_server
+from server import LEAF_PATHS, MISSING_PATHS
+
+# Headers that legitimately differ between two responses
+IGNORED_HEADERS = {'date', 'server'}
+
+PARITY_HOST = 'localhost:8000'
+
+
+def parity_requests():
+    """Return (path, read timeout) pairs covering every route"""
+    paths = ['/', '/index.html', '/spots', '/about', '/gallery/mavericks-photos/',
+             '/robots.txt', '/sitemap.xml', '/gallery/mavericks-photos.html',
+             '/gallery/../server.py', '/gallery/missing.png',
+             '/no-such-page', '/spots/pleasure-point', '/hang?mode=bogus',
+             '/decode/not-base64!', '/__metrics?format=nothing-here']
+    paths += LEAF_PATHS + MISSING_PATHS
+    paths += ['/decode/' + base64.b64encode(path.encode()).decode()
+              for path in LEAF_PATHS + ['/gallery/mavericks-photos/']]
+    requests = [(path, 5.0) for path in paths if not path.startswith('/__metrics')]
+    requests += [
+        ('/hang?mode=delay&seconds=0.3&bytes=500', 5.0),
+        ('/hang?mode=headers&seconds=0.3&bytes=500', 5.0),
+        ('/hang?mode=drip&rate=2000&bytes=600', 5.0),
+        ('/hang?mode=stall&after=40&seconds=0.5', 5.0),
+        ('/hang?mode=reset&after=25', 5.0),
+        ('/hang?seconds=1.2&interval=0.5', 5.0),
+        # Never finishes: compare what arrives in the first 1.5 seconds
+        ('/hang', 1.5),
+        ('/hang?mode=stall&after=64', 1.0),
+    ]
+    # Compressed variants: cached pages, a 404 compressed per request, and q-values
+    for accept in ('gzip', 'gzip, zstd', 'zstd;q=0, gzip;q=0.5', 'identity'):
+        requests += [(path, 5.0, {'Accept-Encoding': accept})
+                     for path in ['/', '/spots', LEAF_PATHS[0], '/no-such-page']]
+    return requests
+
+
+def synthetic_requests():
+    return [(path, 5.0) for path in ['/', '/synthetic/1', '/synthetic/7', '/synthetic/49',
+                                     '/synthetic/50', '/synthetic/abc', '/spots', '/robots.txt',
+                                     '/sitemap.xml']]
+
+
+def fetch_raw(port, path, read_timeout, headers=None):
+    """Fetch a path without following redirects; return a comparable summary"""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    # Same Host header for both servers so generated absolute URLs match
+    sock.sendall(f"GET {path} HTTP/1.1\r\nHost: {PARITY_HOST}\r\n{extra}"
+                 f"Connection: close\r\n\r\n".encode())
+    sock.settimeout(0.2)
+    data = b""
+    ending = 'eof'
+    deadline = time.monotonic() + read_timeout
+    try:
+        while True:
+            try:
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                if time.monotonic() >= deadline:
+                    ending = 'open'
+                    break
+                continue
+            if not chunk:
+                break
+            data += chunk
+    except ConnectionResetError:
+        ending = 'reset'
+    finally:
+        sock.close()
+
+    head, _, body = data.partition(b"\r\n\r\n")
+    lines = head.decode('latin-1').split("\r\n")
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        if name.strip().lower() not in IGNORED_HEADERS:
+            headers[name.strip().lower()] = value.strip()
+    return {'status_line': lines[0], 'headers': headers, 'body': body, 'ending': ending}
+
+
+def compare(path, expected, actual):
+    """Return a list of differences between two fetch summaries"""
+    problems = []
+    for key in ('status_line', 'headers', 'ending'):
+        if expected[key] != actual[key]:
+            problems.append(f"{key}: {expected[key]!r} != {actual[key]!r}")
+    if expected['body'] != actual['body']:
+        problems.append(f"body differs ({len(expected['body'])} vs {len(actual['body'])} bytes)")
+    return problems
+
+
+def run_parity(reference, candidate, requests, extra_args=()):
+    """Fetch every request from both modes and return the mismatches"""
+    mismatches = []
+    with spawned_server(reference, extra_args) as ref_port, \
+            spawned_server(candidate, extra_args) as cand_port:
+        for path, read_timeout, *headers in requests:
+            headers = headers[0] if headers else None
+            expected = fetch_raw(ref_port, path, read_timeout, headers)
+            actual = fetch_raw(cand_port, path, read_timeout, headers)
+            problems = compare(path, expected, actual)
+            status = '❌' if problems else '✅'
+            label = f"{path} {headers}" if headers else path
+            print(f"{status} {label} ({expected['status_line']}, {expected['ending']})")
+            for problem in problems:
+                print(f"      {problem}")
+            if problems:
+                mismatches.append((path, problems))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two server modes request by request")
+    parser.add_argument('--reference', default='threaded', help="Server mode to treat as correct")
+    parser.add_argument('--candidate', default='asyncio', help="Server mode to check")
+    args = parser.parse_args()
+
+    print(f"🏄‍♂️ Parity check: {args.candidate} vs {args.reference}")
+    print("=" * 50)
+    mismatches = run_parity(args.reference, args.candidate, parity_requests())
+    print("-" * 50)
+    print("Synthetic site")
+    mismatches += run_parity(args.reference, args.candidate, synthetic_requests(),
+                             ['--synthetic-pages', '50', '--synthetic-fanout', '7',
+                              '--crawl-delay', '0.5'])
+    print("=" * 50)
+    if mismatches:
+        print(f"❌ {len(mismatches)} requests differ")
+        return 1
+    print("✅ Both servers answered every request identically")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
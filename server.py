@@ -7,140 +7,697 @@ Handles content, 404 errors, hanging requests, and base64 decoded pages
 import http.server
 import socketserver
 import os
+import sys
+import signal
+import contextlib
 import time
 import base64
+import json
+import random
+import threading
+import argparse
+import heapq
+import selectors
+import socket
+import struct
+import urllib.parse
+import html
+import gzip
+import zlib
+import mimetypes
+import mmap
+import errno
+import math
 
-class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
-    def do_GET(self):
-        """Handle GET requests with custom routing"""
-        path = self.path
-        
-        # Handle base64 decode redirects
-        if path.startswith('/decode/'):
-            self.handle_base64_redirect(path)
-            return
-        
-        # Handle gallery pages
-        if path == '/gallery/mavericks-photos/':
-            self.send_gallery_page()
-            return
-        
-        # Handle base64 decoded internal pages (leaf nodes)
-        if path in ['/gear/wetsuit-guide/',
-                   '/conditions/weather-reports/', '/spots/surf-reports/',
-                   '/spots/tide-reports/', '/dynamic/surf-report/',
-                   '/dynamic/forecast/']:
-            self.send_base64_page(path)
-            return
-        
-        # Handle hanging request
-        if path == '/hang':
-            self.send_hanging_response()
-            return
-        
-        # Handle 404 errors for specific paths
-        if path in ['/spots/mavericks/forecast', '/spots/mavericks', 
-                   '/spots/steamer-lane', '/gear/equipment-guide',
-                   '/conditions/reports', '/shop/boards/channel-islands',
-                   '/dynamic/surf-report', '/dynamic/forecast']:
-            self.send_404_response(path)
-            return
-        
-        # Serve the main page for root and other paths
-        if path == '/' or path == '/index.html':
-            self.send_main_page()
-            return
-        
-        # Serve the spots page
-        if path == '/spots':
-            self.send_spots_page()
-            return
-        
-        # Serve the about page
-        if path == '/about':
-            self.send_about_page()
-            return
-        
-        # Default to 404 for unknown paths
-        self.send_404_response(path)
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
 
-    def send_main_page(self):
-        """Send the main HTML page"""
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
-        
-        # Read and serve the index.html file
+
+class ServerMetrics:
+    """Thread-safe request counters, latency histogram and connection gauges"""
+
+    # Upper bounds (seconds) of the latency histogram buckets
+    LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                       0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.routes = {}
+        self.open_connections = 0
+        self.hanging_connections = 0
+        self.bytes_served = 0
+
+    def connection_opened(self):
+        with self.lock:
+            self.open_connections += 1
+
+    def connection_closed(self):
+        with self.lock:
+            self.open_connections -= 1
+
+    def hang_started(self):
+        with self.lock:
+            self.hanging_connections += 1
+
+    def hang_finished(self):
+        with self.lock:
+            self.hanging_connections -= 1
+
+    def add_bytes(self, count):
+        with self.lock:
+            self.bytes_served += count
+
+    def observe(self, route, status, seconds):
+        """Record one finished request for a route"""
+        with self.lock:
+            stats = self.routes.get(route)
+            if stats is None:
+                stats = {
+                    'count': 0,
+                    'status': {},
+                    'latency_sum': 0.0,
+                    'latency_max': 0.0,
+                    # One extra bucket for anything slower than the last bound
+                    'buckets': [0] * (len(self.LATENCY_BUCKETS) + 1),
+                }
+                self.routes[route] = stats
+            stats['count'] += 1
+            stats['status'][status] = stats['status'].get(status, 0) + 1
+            stats['latency_sum'] += seconds
+            stats['latency_max'] = max(stats['latency_max'], seconds)
+            for i, bound in enumerate(self.LATENCY_BUCKETS):
+                if seconds <= bound:
+                    stats['buckets'][i] += 1
+                    break
+            else:
+                stats['buckets'][-1] += 1
+
+    def snapshot(self):
+        """Return a JSON-serialisable copy of all metrics"""
+        with self.lock:
+            uptime = time.time() - self.started
+            total = sum(stats['count'] for stats in self.routes.values())
+            routes = {}
+            for route, stats in self.routes.items():
+                histogram = {}
+                for bound, n in zip(self.LATENCY_BUCKETS + (None,), stats['buckets']):
+                    histogram['le_inf' if bound is None else f'le_{bound:g}'] = n
+                routes[route] = {
+                    'count': stats['count'],
+                    'rate_per_sec': stats['count'] / uptime if uptime else 0.0,
+                    'status': {str(code): n for code, n in stats['status'].items()},
+                    'latency_avg': stats['latency_sum'] / stats['count'],
+                    'latency_max': stats['latency_max'],
+                    'latency_histogram': histogram,
+                }
+            return {
+                'uptime_sec': uptime,
+                'requests_total': total,
+                'requests_per_sec': total / uptime if uptime else 0.0,
+                'open_connections': self.open_connections,
+                'hanging_connections': self.hanging_connections,
+                'bytes_served': self.bytes_served,
+                'cpu_seconds': time.process_time(),
+                'routes': routes,
+            }
+
+    def render_prometheus(self):
+        """Render the metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = [
+            f"surf_uptime_seconds {snapshot['uptime_sec']:.3f}",
+            f"surf_open_connections {snapshot['open_connections']}",
+            f"surf_hanging_connections {snapshot['hanging_connections']}",
+            f"surf_bytes_served_total {snapshot['bytes_served']}",
+            f"surf_process_cpu_seconds_total {snapshot['cpu_seconds']:.3f}",
+        ]
+        with self.lock:
+            for route, stats in sorted(self.routes.items()):
+                for code, n in stats['status'].items():
+                    lines.append(f'surf_requests_total{{route="{route}",status="{code}"}} {n}')
+                cumulative = 0
+                for bound, n in zip(self.LATENCY_BUCKETS + (None,), stats['buckets']):
+                    cumulative += n
+                    le = '+Inf' if bound is None else f'{bound:g}'
+                    lines.append(f'surf_request_seconds_bucket{{route="{route}",le="{le}"}} {cumulative}')
+                lines.append(f'surf_request_seconds_sum{{route="{route}"}} {stats["latency_sum"]:.6f}')
+                lines.append(f'surf_request_seconds_count{{route="{route}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+# Base64 decoded internal pages (leaf nodes)
+LEAF_PATHS = ['/gear/wetsuit-guide/',
+              '/conditions/weather-reports/', '/spots/surf-reports/',
+              '/spots/tide-reports/', '/dynamic/surf-report/',
+              '/dynamic/forecast/']
+
+# Links on the site that deliberately return 404
+MISSING_PATHS = ['/spots/mavericks/forecast', '/spots/mavericks',
+                 '/spots/steamer-lane', '/gear/equipment-guide',
+                 '/conditions/reports', '/shop/boards/channel-islands',
+                 '/dynamic/surf-report', '/dynamic/forecast']
+
+# Ways the server can be run
+SERVER_MODES = ('single', 'threaded', 'asyncio')
+
+# What a handler's stage() returns while profiling is off
+NO_STAGE = contextlib.nullcontext()
+
+# How static file bodies reach the socket: os.sendfile, an mmap'd memoryview,
+# or reading the file into bytes for every request
+STATIC_MODES = ('sendfile', 'mmap', 'read')
+
+
+def synthetic_children(index, pages, fanout):
+    """Return the child page numbers of a synthetic page (a complete fanout-ary tree)"""
+    first = index * fanout + 1
+    return list(range(first, min(first + fanout, pages)))
+
+
+def synthetic_path(index):
+    """Return the URL path of a synthetic page (page 0 is the site root)"""
+    return '/' if index == 0 else f'/synthetic/{index}'
+
+
+# Slow response actions understood by SlowResponseEngine
+CLOSE = 'close'
+RESET = 'reset'
+
+# Routes that always answer slowly, e.g. {'/spots/mavericks': {'mode': 'delay', 'seconds': 30}}
+SLOW_ROUTES = {}
+
+SLOW_MODES = ('hang', 'delay', 'drip', 'stall', 'reset', 'headers')
+
+
+def parse_slow_profile(query, defaults=None):
+    """Build a slow response profile from a query string such as 'mode=drip&rate=64'
+
+    Supported parameters:
+        mode     hang | delay | drip | stall | reset | headers (default hang)
+        seconds  how long the delay/stall/hang lasts (default forever for hang and stall)
+        rate     bytes per second for drip (default 64)
+        after    bytes of body sent before a stall or reset (default 0)
+        bytes    body size for delay/drip/headers (default 2048)
+        interval seconds between keep-alive chunks for hang (default 1)
+    """
+    profile = dict(defaults or {})
+    for key, values in urllib.parse.parse_qs(query).items():
+        profile[key] = values[-1]
+    mode = profile.get('mode', 'hang')
+    if mode not in SLOW_MODES:
+        raise ValueError(f"unknown slow response mode '{mode}'")
+    seconds = profile.get('seconds')
+    return {
+        'mode': mode,
+        'seconds': None if seconds in (None, '') else float(seconds),
+        'rate': max(1.0, float(profile.get('rate', 64))),
+        'after': int(profile.get('after', 0)),
+        'bytes': int(profile.get('bytes', 2048)),
+        'interval': max(0.01, float(profile.get('interval', 1))),
+    }
+
+
+def slow_filler_body(path, size):
+    """Return an HTML page of roughly `size` bytes for slow responses"""
+    head = f"<html><body><h1>Slow surf report</h1><p>Path: {path}</p>".encode()
+    tail = b"</body></html>"
+    filler = b"<p>" + b"~" * 60 + b"</p>\n"
+    repeats = max(0, size - len(head) - len(tail)) // len(filler) + 1
+    return head + filler * repeats + tail
+
+
+def slow_response_steps(profile, head, body):
+    """Yield (delay_seconds, action) pairs describing how a slow response is sent
+
+    An action is bytes to send, CLOSE or RESET. A delay of None holds the
+    connection open until the client goes away.
+    """
+    mode = profile['mode']
+    seconds = profile['seconds']
+    if mode == 'delay':
+        yield seconds or 0, head + body
+    elif mode == 'headers':
+        yield seconds or 0, head
+        yield 0, body
+    elif mode == 'drip':
+        yield 0, head
+        # Send ~10 chunks per second, or one byte at a time for very slow drips
+        chunk = max(1, int(profile['rate'] / 10))
+        for start in range(0, len(body), chunk):
+            yield (chunk / profile['rate']) if start else 0, body[start:start + chunk]
+    elif mode == 'stall':
+        yield 0, head + body[:profile['after']]
+        yield seconds, CLOSE
+    elif mode == 'reset':
+        if profile['after']:
+            yield 0, head + body[:profile['after']]
+        yield seconds or 0, RESET
+    else:
+        # Partial page, then a keep-alive comment every interval
+        yield 0, head + b"<html><body><h1>Loading...</h1>"
+        elapsed = 0.0
+        while seconds is None or elapsed + profile['interval'] <= seconds:
+            elapsed += profile['interval']
+            yield profile['interval'], b"<!-- still loading -->"
+        if seconds is not None:
+            yield seconds - elapsed, b"</body></html>"
+    yield 0, CLOSE
+
+
+class SlowConnection:
+    """A detached client socket that is being fed a slow response"""
+
+    def __init__(self, sock, steps, route, status, started):
+        self.sock = sock
+        self.steps = steps
+        self.route = route
+        self.status = status
+        self.started = started
+        self.pending = b""
+        self.due = None
+        self.closed = False
+
+
+class SlowResponseEngine:
+    """Serves slow responses for many sockets from a single timer + selector thread
+
+    Handler threads hand their socket over with add() and return right away,
+    so slow and hanging clients do not each pin a thread.
+    """
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+        self.lock = threading.Lock()
+        self.incoming = []
+        self.timers = []
+        self.sequence = 0
+        self.selector = selectors.DefaultSelector()
+        self.wake_reader, self.wake_writer = socket.socketpair()
+        self.wake_reader.setblocking(False)
+        self.selector.register(self.wake_reader, selectors.EVENT_READ, None)
+        self.thread = None
+
+    def add(self, sock, steps, route, status, started):
+        """Take over a connected socket and play `steps` on it"""
+        sock.setblocking(False)
+        conn = SlowConnection(sock, steps, route, status, started)
+        with self.lock:
+            self.incoming.append(conn)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='slow-responses', daemon=True)
+                self.thread.start()
+        self.metrics.hang_started()
         try:
-            with open('index.html', 'rb') as f:
-                self.wfile.write(f.read())
-        except FileNotFoundError:
-            self.wfile.write(b"<h1>Error: index.html not found</h1>")
+            self.wake_writer.send(b"x")
+        except BlockingIOError:
+            pass
 
-    def send_spots_page(self):
-        """Send the spots HTML page"""
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
-        
-        # Read and serve the spots.html file
+    def schedule(self, conn, delay):
+        self.sequence += 1
+        heapq.heappush(self.timers, (time.monotonic() + delay, self.sequence, conn))
+
+    def run(self):
+        while True:
+            timeout = None
+            if self.timers:
+                timeout = max(0.0, self.timers[0][0] - time.monotonic())
+            for key, _ in self.selector.select(timeout):
+                if key.data is None:
+                    self.accept_incoming()
+                else:
+                    self.on_readable(key.data)
+            now = time.monotonic()
+            while self.timers and self.timers[0][0] <= now:
+                _, _, conn = heapq.heappop(self.timers)
+                if not conn.closed:
+                    self.advance(conn)
+
+    def accept_incoming(self):
         try:
-            with open('spots.html', 'rb') as f:
-                self.wfile.write(f.read())
-        except FileNotFoundError:
-            self.wfile.write(b"<h1>Error: spots.html not found</h1>")
+            while self.wake_reader.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self.lock:
+            incoming, self.incoming = self.incoming, []
+        for conn in incoming:
+            self.selector.register(conn.sock, selectors.EVENT_READ, conn)
+            self.advance(conn)
 
-    def send_about_page(self):
-        """Send the about HTML page"""
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
-        
-        # Read and serve the about.html file
+    def on_readable(self, conn):
+        """The client sent data or hung up; only a hang-up matters"""
         try:
-            with open('about.html', 'rb') as f:
-                self.wfile.write(f.read())
-        except FileNotFoundError:
-            self.wfile.write(b"<h1>Error: about.html not found</h1>")
+            if conn.sock.recv(4096):
+                return
+        except BlockingIOError:
+            return
+        except OSError:
+            pass
+        self.close(conn)
+
+    def advance(self, conn):
+        """Send whatever is due and schedule the next step"""
+        while True:
+            if conn.pending:
+                if not self.send(conn, conn.pending):
+                    return
+                if conn.pending:
+                    # Socket buffer is full, try again shortly
+                    self.schedule(conn, 0.05)
+                    return
+            if conn.due is not None:
+                action, conn.due = conn.due, None
+            else:
+                try:
+                    delay, action = next(conn.steps)
+                except StopIteration:
+                    self.close(conn)
+                    return
+                if delay is None:
+                    # Hold the connection until the client disconnects
+                    return
+                if delay > 0:
+                    conn.due = action
+                    self.schedule(conn, delay)
+                    return
+            if action == CLOSE:
+                self.close(conn)
+                return
+            if action == RESET:
+                self.close(conn, reset=True)
+                return
+            if not self.send(conn, action):
+                return
 
-    def handle_base64_redirect(self, path):
-        """Handle base64 encoded redirects"""
+    def send(self, conn, data):
         try:
-            # Extract base64 string from path
-            base64_string = path.replace('/decode/', '')
-            
-            # Decode the base64 string
-            decoded_path = base64.b64decode(base64_string).decode('utf-8')
-            
-            # Redirect to the decoded path
-            self.send_response(302)
-            self.send_header('Location', decoded_path)
-            self.end_headers()
-            
-        except Exception as e:
+            sent = conn.sock.send(data)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self.close(conn)
+            return False
+        self.metrics.add_bytes(sent)
+        conn.pending = data[sent:]
+        return True
+
+    def close(self, conn, reset=False):
+        if conn.closed:
+            return
+        conn.closed = True
+        try:
+            self.selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            if reset:
+                # Zero linger makes close() send a RST instead of a FIN
+                conn.sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            conn.sock.close()
+        except OSError:
+            pass
+        self.metrics.hang_finished()
+        self.metrics.observe(conn.route, conn.status, time.perf_counter() - conn.started)
+
+
+# Static pages served from files, by path: (route label, filename)
+STATIC_PAGES = {
+    '/': ('main', 'index.html'),
+    '/index.html': ('main', 'index.html'),
+    '/spots': ('spots', 'spots.html'),
+    '/about': ('about', 'about.html'),
+    '/gallery/mavericks-photos/': ('gallery', 'gallery/mavericks-photos.html'),
+}
+
+
+def resolve_route(path, synthetic_pages=0, static_root='.', slow_routes=None):
+    """Map a request path to (route label, action, argument)
+
+    Both the socketserver handler and the asyncio server dispatch on this, so
+    they agree on every route. Actions are 'metrics', 'robots', 'sitemap',
+    'slow', 'redirect', 'static', 'leaf', 'synthetic' and '404'. slow_routes
+    defaults to SLOW_ROUTES.
+    """
+    if slow_routes is None:
+        slow_routes = SLOW_ROUTES
+    route_path, _, query = path.partition('?')
+    
+    # Server metrics for admin tooling
+    if route_path == '/__metrics':
+        return 'metrics', 'metrics', query
+    
+    # Crawler hints generated from the known routes
+    if route_path == '/robots.txt':
+        return 'robots', 'robots', None
+    if route_path == '/sitemap.xml':
+        return 'sitemap', 'sitemap', None
+    
+    # Routes configured to answer slowly
+    if route_path in slow_routes:
+        try:
+            return 'slow', 'slow', parse_slow_profile(query, slow_routes[route_path])
+        except ValueError:
+            return 'slow', '404', path
+    
+    # Handle base64 decode redirects
+    if path.startswith('/decode/'):
+        try:
+            return 'decode', 'redirect', base64.b64decode(path.replace('/decode/', '')).decode('utf-8')
+        except Exception:
             # If decoding fails, send 404
-            self.send_404_response(path)
+            return 'decode', '404', path
+    
+    # Handle synthetic site pages
+    if synthetic_pages and (path == '/' or path.startswith('/synthetic/')):
+        try:
+            index = 0 if path == '/' else int(path[len('/synthetic/'):])
+        except ValueError:
+            index = -1
+        if not 0 <= index < synthetic_pages:
+            return 'synthetic', '404', path
+        return 'synthetic', 'synthetic', index
+    
+    # Handle base64 decoded internal pages (leaf nodes)
+    if path in LEAF_PATHS:
+        return 'leaf', 'leaf', path
+    
+    # Handle hanging request (query parameters pick other slow behaviours)
+    if route_path == '/hang':
+        try:
+            return 'hang', 'slow', parse_slow_profile(query)
+        except ValueError:
+            return 'hang', '404', path
+    
+    # Handle 404 errors for specific paths
+    if path in MISSING_PATHS:
+        return 'missing', '404', path
+    
+    # Serve the main, spots, about and gallery pages
+    if path in STATIC_PAGES:
+        route, filename = STATIC_PAGES[path]
+        return route, 'static', filename
+    
+    # Serve any other file from the gallery directory
+    if route_path.startswith('/gallery/'):
+        filename = gallery_file(route_path, static_root)
+        if filename:
+            return 'gallery', 'static', filename
+    
+    # Default to 404 for unknown paths
+    return 'not_found', '404', path
 
-    def send_gallery_page(self):
-        """Send the gallery HTML page"""
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
-        
-        # Read and serve the gallery HTML file
+
+def gallery_file(route_path, static_root='.'):
+    """Map /gallery/<name> to a file under the gallery directory, or None"""
+    name = urllib.parse.unquote(route_path[len('/gallery/'):])
+    parts = name.split('/')
+    if not name or any(part in ('', '.', '..') for part in parts):
+        return None
+    filename = '/'.join(['gallery'] + parts)
+    return filename if os.path.isfile(os.path.join(static_root, filename)) else None
+
+
+def read_static_page(filename, static_root='.'):
+    """Return the contents of a page file, or an error snippet if it is missing"""
+    try:
+        with open(os.path.join(static_root, filename), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return f"<h1>Error: {filename} not found</h1>".encode()
+
+
+def static_content_type(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+class StaticFile:
+    """An open static file with its size and a lazily created mmap view"""
+
+    def __init__(self, path, stat):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.size = stat.st_size
+        self.version = (stat.st_size, stat.st_mtime_ns)
+        self._view = None
+
+    @property
+    def view(self):
+        """The file contents as a memoryview over an mmap (no copy into Python bytes)"""
+        if self._view is None:
+            if self.size == 0:
+                self._view = memoryview(b'')
+            else:
+                self._view = memoryview(mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ))
+        return self._view
+
+    def read(self):
+        """Read the file from disk into bytes (the plain read-and-write path)"""
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def fileno(self):
+        return self.file.fileno()
+
+
+class StaticFileCache:
+    """Keeps static files open between requests, reopening them when they change"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}
+
+    def open(self, path):
+        """Return the StaticFile for a path, or None if it does not exist"""
         try:
-            with open('gallery/mavericks-photos.html', 'rb') as f:
-                self.wfile.write(f.read())
-        except FileNotFoundError:
-            self.wfile.write(b"<h1>Error: gallery/mavericks-photos.html not found</h1>")
+            stat = os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            static = self.files.get(path)
+            if static is None or static.version != (stat.st_size, stat.st_mtime_ns):
+                # A replaced file is not closed here; requests may still be sending it
+                static = StaticFile(path, stat)
+                self.files[path] = static
+            return static
 
-    def send_404_response(self, path):
-        """Send a 404 error response"""
-        self.send_response(404)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
-        
-        html_content = f"""
+
+STATIC_FILES = StaticFileCache()
+
+
+def static_response(filename, static, accept_encoding):
+    """Return (headers, body) for a static file; body None means send the file itself"""
+    content_type = static_content_type(filename)
+    if content_type != 'text/html':
+        return [('Content-type', content_type), ('Content-Length', str(static.size))], None
+    body, headers = encode_page(static.view, accept_encoding, cache_key=filename)
+    headers = [('Content-type', content_type)] + headers
+    if body is not static.view:
+        return headers, body
+    return headers + [('Content-Length', str(static.size))], None
+
+
+def sendfile_all(sock, static):
+    """Send a file with os.sendfile and return how many bytes went out
+
+    Stops early when this socket/file pair can't use sendfile, so the caller can
+    send the rest another way.
+    """
+    offset = 0
+    while offset < static.size:
+        try:
+            sent = os.sendfile(sock.fileno(), static.fileno(), offset, static.size - offset)
+        except OSError as e:
+            if e.errno in (errno.EINVAL, errno.ENOSYS, errno.ENOTSOCK, errno.EOPNOTSUPP):
+                break
+            raise
+        if sent == 0:
+            break
+        offset += sent
+    return offset
+
+
+# Encodings the server can send, most preferred first
+CONTENT_ENCODINGS = ('zstd', 'gzip') if zstandard else ('gzip',)
+
+# Uncached (per-request) bodies smaller than this are sent as they are
+COMPRESS_MIN_BYTES = 1024
+
+
+def negotiate_encoding(accept_encoding):
+    """Pick a content encoding from an Accept-Encoding header, or None for identity"""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in CONTENT_ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body, encoding, level=None):
+    """Compress a body; gzip output has a fixed mtime so every server sends the same bytes"""
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=level or 19).compress(body)
+    return gzip.compress(body, compresslevel=level or 9, mtime=0)
+
+
+class CompressedCache:
+    """Compressed variants of page bodies, computed once per body and encoding"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.variants = {}
+
+    def get(self, key, body, encoding):
+        # The checksum catches page files edited while the server runs
+        cache_key = (key, encoding, len(body), zlib.crc32(body))
+        with self.lock:
+            compressed = self.variants.get(cache_key)
+        if compressed is None:
+            compressed = compress(body, encoding)
+            with self.lock:
+                self.variants[cache_key] = compressed
+        return compressed
+
+
+COMPRESSED_PAGES = CompressedCache()
+
+
+def encode_page(body, accept_encoding, cache_key=None):
+    """Return (body, extra headers) for an HTML page in the client's preferred encoding
+
+    Pages with a cache key (static, leaf and synthetic pages) are compressed once;
+    others (like 404 pages) are compressed per request when they are large enough.
+    """
+    encoding = negotiate_encoding(accept_encoding)
+    vary = [('Vary', 'Accept-Encoding')]
+    if encoding is None:
+        return body, vary
+    if cache_key is not None:
+        body = COMPRESSED_PAGES.get(cache_key, body, encoding)
+    elif len(body) >= COMPRESS_MIN_BYTES:
+        body = compress(body, encoding, level=6 if encoding == 'gzip' else 3)
+    else:
+        return body, vary
+    return body, vary + [('Content-Encoding', encoding), ('Content-Length', str(len(body)))]
+
+
+def render_404_page(path):
+    """Return the surf-themed 404 page for a path"""
+    html_content = f"""
         <!DOCTYPE html>
         <html>
         <head>
@@ -159,37 +716,15 @@ class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         </body>
         </html>
         """
-        self.wfile.write(html_content.encode())
+    return html_content.encode()
 
-    def send_hanging_response(self):
-        """Send a hanging response that never completes"""
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
-        
-        # Send partial content and then hang
-        self.wfile.write(b"<html><body><h1>Loading...</h1>")
-        self.wfile.flush()
-        
-        # Keep the connection open indefinitely
-        while True:
-            time.sleep(1)
-            try:
-                self.wfile.write(b"<!-- still loading -->")
-                self.wfile.flush()
-            except:
-                break
 
-    def send_base64_page(self, path):
-        """Send pages that are accessed via base64 decoded links (leaf nodes)"""
-        self.send_response(200)
-        self.send_header('Content-type', 'text/html')
-        self.end_headers()
-        
-        # Generate content based on the path
-        if path == '/gallery/mavericks-photos/':
-            title = "Mavericks Photo Gallery"
-            content = """
+def render_leaf_page(path):
+    """Return pages that are accessed via base64 decoded links (leaf nodes)"""
+    # Generate content based on the path
+    if path == '/gallery/mavericks-photos/':
+        title = "Mavericks Photo Gallery"
+        content = """
             <h2>🏄‍♂️ Mavericks Photo Gallery</h2>
             <p>Amazing photos of the legendary big wave spot.</p>
             <div style="background: #f0f0f0; padding: 20px; border-radius: 10px;">
@@ -198,9 +733,9 @@ class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 <p>📸 Photo 3: Aerial view of the break</p>
             </div>
             """
-        elif path == '/gear/wetsuit-guide/':
-            title = "Wetsuit Guide"
-            content = """
+    elif path == '/gear/wetsuit-guide/':
+        title = "Wetsuit Guide"
+        content = """
             <h2>🧥 NorCal Wetsuit Guide</h2>
             <p>Essential guide for staying warm in cold NorCal waters.</p>
             <div style="background: #f0f0f0; padding: 20px; border-radius: 10px;">
@@ -209,9 +744,9 @@ class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 <p>🧤 Booties and gloves essential</p>
             </div>
             """
-        elif path == '/conditions/weather-reports/':
-            title = "Weather Reports"
-            content = """
+    elif path == '/conditions/weather-reports/':
+        title = "Weather Reports"
+        content = """
             <h2>🌤️ Weather Reports</h2>
             <p>Current weather conditions for all NorCal surf spots.</p>
             <div style="background: #f0f0f0; padding: 20px; border-radius: 10px;">
@@ -220,9 +755,9 @@ class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 <p>🌡️ Water temp: 52°F</p>
             </div>
             """
-        elif path == '/spots/surf-reports/':
-            title = "Surf Reports"
-            content = """
+    elif path == '/spots/surf-reports/':
+        title = "Surf Reports"
+        content = """
             <h2>🌊 Surf Reports</h2>
             <p>Real-time surf conditions and forecasts.</p>
             <div style="background: #f0f0f0; padding: 20px; border-radius: 10px;">
@@ -231,9 +766,9 @@ class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 <p>⏰ Tide: High at 2:30 PM</p>
             </div>
             """
-        elif path == '/spots/tide-reports/':
-            title = "Tide Reports"
-            content = """
+    elif path == '/spots/tide-reports/':
+        title = "Tide Reports"
+        content = """
             <h2>🌊 Tide Reports</h2>
             <p>Daily tide schedules for optimal surfing.</p>
             <div style="background: #f0f0f0; padding: 20px; border-radius: 10px;">
@@ -242,9 +777,9 @@ class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 <p>🌅 Low tide: 7:15 PM</p>
             </div>
             """
-        elif path == '/dynamic/surf-report/':
-            title = "Dynamic Surf Report"
-            content = """
+    elif path == '/dynamic/surf-report/':
+        title = "Dynamic Surf Report"
+        content = """
             <h2>🌊 Dynamic Surf Report</h2>
             <p>Real-time conditions generated dynamically.</p>
             <div style="background: #f0f0f0; padding: 20px; border-radius: 10px;">
@@ -253,9 +788,9 @@ class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 <p>💨 Wind: Variable</p>
             </div>
             """
-        elif path == '/dynamic/forecast/':
-            title = "Extended Forecast"
-            content = """
+    elif path == '/dynamic/forecast/':
+        title = "Extended Forecast"
+        content = """
             <h2>📅 Extended Forecast</h2>
             <p>7-day surf forecast for NorCal spots.</p>
             <div style="background: #f0f0f0; padding: 20px; border-radius: 10px;">
@@ -264,11 +799,11 @@ class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
                 <p>📆 Next week: 6-10ft</p>
             </div>
             """
-        else:
-            title = "Unknown Page"
-            content = "<p>This page was accessed via base64 decoding.</p>"
-        
-        html_content = f"""
+    else:
+        title = "Unknown Page"
+        content = "<p>This page was accessed via base64 decoding.</p>"
+    
+    html_content = f"""
         <!DOCTYPE html>
         <html>
         <head>
@@ -310,44 +845,536 @@ class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
         </body>
         </html>
         """
-        self.wfile.write(html_content.encode())
+    return html_content.encode()
+
+
+def render_synthetic_page(index, pages, fanout):
+    """Return a generated page of the synthetic site with links to its children"""
+    children = synthetic_children(index, pages, fanout)
+    links = "\n".join(
+        f'<li><a href="{synthetic_path(child)}">Surf report #{child}</a></li>'
+        for child in children
+    )
+    html_content = f"""<!DOCTYPE html>
+<html>
+<head><title>Surf report #{index} - NorCal Surf Adventures</title></head>
+<body>
+    <h1>🌊 Surf report #{index}</h1>
+    <p>Synthetic page {index} of {pages}.</p>
+    <ul>
+{links}
+    </ul>
+    <p><a href="/">← Back to Home</a></p>
+</body>
+</html>
+"""
+    return html_content.encode()
+
+
+def sitemap_paths(synthetic_pages=0):
+    """Return every page path the server can answer with a 200"""
+    if synthetic_pages:
+        return [synthetic_path(index) for index in range(synthetic_pages)]
+    paths = [path for path in STATIC_PAGES if path != '/index.html']
+    return paths + LEAF_PATHS
+
+
+def render_robots_txt(site_url, crawl_delay=0, slow_routes=None):
+    """Return robots.txt keeping crawlers away from the hanging and admin routes"""
+    lines = ["User-agent: *", "Disallow: /hang", "Disallow: /__metrics"]
+    for route_path in SLOW_ROUTES if slow_routes is None else slow_routes:
+        # Only the route itself, not the pages below it
+        lines += [f"Disallow: {route_path}$", f"Disallow: {route_path}?"]
+    if crawl_delay:
+        lines.append(f"Crawl-delay: {crawl_delay:g}")
+    lines += ["", f"Sitemap: {site_url}/sitemap.xml", ""]
+    return "\n".join(lines).encode()
+
+
+def render_sitemap(site_url, synthetic_pages=0, slow_routes=None):
+    """Return sitemap.xml listing every page path"""
+    if slow_routes is None:
+        slow_routes = SLOW_ROUTES
+    urls = "".join(f"  <url><loc>{site_url}{html.escape(path)}</loc></url>\n"
+                   for path in sitemap_paths(synthetic_pages) if path not in slow_routes)
+    return ('<?xml version="1.0" encoding="UTF-8"?>\n'
+            '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+            f'{urls}</urlset>\n').encode()
+
+
+def render_metrics(metrics, query):
+    """Return (content type, body) for the metrics endpoint"""
+    if 'format=prometheus' in query:
+        return 'text/plain; version=0.0.4', metrics.render_prometheus().encode()
+    return 'application/json', json.dumps(metrics.snapshot(), indent=2).encode()
+
+
+def slow_response_body(path, profile):
+    """Return (body, content length or None) for a slow response profile"""
+    if profile['mode'] in ('delay', 'drip', 'headers'):
+        body = slow_filler_body(path, profile['bytes'])
+        return body, len(body)
+    return slow_filler_body(path, max(profile['after'], profile['bytes'])), None
+
+
+class RateLimiter:
+    """Token bucket shared by every connection: `rate` requests per second, bursts of `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, math.ceil(rate))
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Spend a token; return 0 if the request may go ahead, else seconds until one is free"""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+
+def rate_limited_response(wait):
+    """Return (headers, body) for a 429 answer; Retry-After is whole seconds, at least 1"""
+    retry_after = max(1, math.ceil(wait))
+    body = f"Too many requests, retry after {retry_after}s\n".encode()
+    return [('Content-type', 'text/plain'), ('Retry-After', str(retry_after)),
+            ('Content-Length', str(len(body)))], body
+
+
+class CountingWriter:
+    """Wraps the handler's wfile and counts every byte written to the socket"""
+
+    def __init__(self, raw, metrics):
+        self.raw = raw
+        self.metrics = metrics
 
-def run_server(port=None):
+    def write(self, data):
+        written = self.raw.write(data)
+        self.metrics.add_bytes(len(data) if written is None else written)
+        return written
+
+    def __getattr__(self, name):
+        return getattr(self.raw, name)
+
+
+class SurfAdventuresHTTPRequestHandler(http.server.SimpleHTTPRequestHandler):
+    # Shared by every handler instance
+    metrics = ServerMetrics()
+    slow_engine = SlowResponseEngine(metrics)
+
+    # Fraction of requests written to the access log (1.0 logs everything)
+    access_log_sample_rate = float(os.environ.get('ACCESS_LOG_SAMPLE_RATE', 1.0))
+
+    # Synthetic site mode: serve a generated tree of pages instead of index.html
+    synthetic_pages = int(os.environ.get('SYNTHETIC_PAGES', 0))
+    synthetic_fanout = int(os.environ.get('SYNTHETIC_FANOUT', 10))
+
+    # Crawl-delay advertised in robots.txt (0 leaves it out)
+    crawl_delay = float(os.environ.get('CRAWL_DELAY', 0))
+
+    # Where page files are read from, and how their bytes are sent (see STATIC_MODES)
+    static_root = os.environ.get('STATIC_ROOT', '.')
+    static_mode = os.environ.get('STATIC_MODE', 'sendfile')
+
+    # Requests per second answered before clients get 429 + Retry-After (0 turns it off)
+    rate_limit = float(os.environ.get('RATE_LIMIT', 0))
+    rate_burst = int(os.environ.get('RATE_BURST', 0))
+    rate_limiter = None
+
+    # A StageProfiler (websurfer_example/profiling.py) when running with --profile
+    profiler = None
+
+    def setup(self):
+        """Wrap the socket writer so bytes served are counted"""
+        super().setup()
+        self.wfile = CountingWriter(self.wfile, self.metrics)
+        self.metrics.connection_opened()
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            self.metrics.connection_closed()
+
+    def send_response(self, code, message=None):
+        """Remember the status code for the metrics"""
+        self.status_code = code
+        super().send_response(code, message)
+
+    def log_request(self, code='-', size='-'):
+        """Write only a sample of requests to the access log"""
+        if random.random() < self.access_log_sample_rate:
+            super().log_request(code, size)
+
+    def stage(self, name):
+        """Time a stage of the request when profiling"""
+        return NO_STAGE if self.profiler is None else self.profiler.stage(name)
+
+    def do_GET(self):
+        """Handle GET requests and record per-route metrics"""
+        self.route = 'other'
+        self.status_code = None
+        self.detached = False
+        self.request_started = time.perf_counter()
+        try:
+            with self.stage('request'):
+                self.route_request(self.path)
+        finally:
+            # Detached slow responses are recorded by the engine when they end
+            if not self.detached:
+                self.metrics.observe(self.route, self.status_code,
+                                     time.perf_counter() - self.request_started)
+
+    def route_request(self, path):
+        """Dispatch a request path to the matching page handler"""
+        with self.stage('route'):
+            self.route, action, arg = resolve_route(path, self.synthetic_pages, self.static_root)
+        # The metrics endpoint stays readable while clients are being throttled
+        if self.rate_limiter is not None and action != 'metrics':
+            wait = self.rate_limiter.take()
+            if wait:
+                self.send_rate_limited(wait)
+                return
+        if action == 'metrics':
+            self.send_metrics(arg)
+        elif action == 'robots':
+            with self.stage('render'):
+                body = render_robots_txt(self.site_url(), self.crawl_delay)
+            self.send_document('text/plain', body)
+        elif action == 'sitemap':
+            with self.stage('render'):
+                body = render_sitemap(self.site_url(), self.synthetic_pages)
+            self.send_document('application/xml', body)
+        elif action == 'slow':
+            self.send_slow_response(path.partition('?')[0], arg)
+        elif action == 'redirect':
+            self.send_redirect(arg)
+        elif action == 'static':
+            self.send_static_page(arg)
+        elif action == 'leaf':
+            self.send_base64_page(arg)
+        elif action == 'synthetic':
+            self.send_synthetic_page(arg)
+        else:
+            self.send_404_response(arg)
+
+    def send_metrics(self, query):
+        """Send the server metrics as JSON, or Prometheus text with ?format=prometheus"""
+        content_type, body = render_metrics(self.metrics, query)
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_rate_limited(self, wait):
+        """Send 429 Too Many Requests with a Retry-After header"""
+        headers, body = rate_limited_response(wait)
+        self.send_response(429)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def site_url(self):
+        """Return the scheme and host the client used to reach the server"""
+        host = self.headers.get('Host') or f"localhost:{self.server.server_address[1]}"
+        return f"http://{host}"
+
+    def send_document(self, content_type, body):
+        """Send a generated non-HTML document such as robots.txt"""
+        self.send_response(200)
+        self.send_header('Content-type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        with self.stage('send'):
+            self.end_headers()
+            self.wfile.write(body)
+
+    def send_page(self, body, status=200, cache_key=None):
+        """Send an HTML page, compressed when the client accepts it"""
+        with self.stage('encode'):
+            body, headers = encode_page(body, self.headers.get('Accept-Encoding'), cache_key)
+        self.send_response(status)
+        self.send_header('Content-type', 'text/html')
+        for name, value in headers:
+            self.send_header(name, value)
+        with self.stage('send'):
+            self.end_headers()
+            self.wfile.write(body)
+
+    def send_static_page(self, filename):
+        """Send a page or gallery file, straight from the file when possible"""
+        static = STATIC_FILES.open(os.path.join(self.static_root, filename))
+        if static is None:
+            with self.stage('render'):
+                body = read_static_page(filename, self.static_root)
+            self.send_page(body, cache_key=filename)
+            return
+        with self.stage('encode'):
+            headers, body = static_response(filename, static, self.headers.get('Accept-Encoding'))
+        self.send_response(200)
+        for name, value in headers:
+            self.send_header(name, value)
+        with self.stage('send'):
+            self.end_headers()
+            if body is not None:
+                self.wfile.write(body)
+            else:
+                self.send_file_body(static)
+
+    def send_file_body(self, static):
+        """Send a static file's bytes the way static_mode says"""
+        if self.static_mode == 'read':
+            self.wfile.write(static.read())
+            return
+        offset = 0
+        if self.static_mode == 'sendfile' and hasattr(os, 'sendfile'):
+            offset = sendfile_all(self.connection, static)
+            self.metrics.add_bytes(offset)
+        if offset < static.size:
+            # mmap mode, or whatever sendfile could not send
+            self.wfile.write(static.view[offset:])
+
+    def send_redirect(self, location):
+        """Redirect a decoded base64 link to its target"""
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.end_headers()
+
+    def send_404_response(self, path):
+        """Send a 404 error response"""
+        with self.stage('render'):
+            body = render_404_page(path)
+        self.send_page(body, status=404)
+
+    def send_slow_response(self, path, profile):
+        """Hand the connection to the slow response engine and return immediately"""
+        body, length = slow_response_body(path, profile)
+        # The engine sends the header block, so it is built here the way
+        # send_response() and send_header() would, instead of being written
+        self.status_code = 200
+        self.log_request(200)
+        lines = [f"{self.protocol_version} 200 {http.HTTPStatus.OK.phrase}",
+                 f"Server: {self.version_string()}",
+                 f"Date: {self.date_time_string()}",
+                 "Content-type: text/html"]
+        if length is not None:
+            lines.append(f"Content-Length: {length}")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1', 'strict')
+        
+        self.close_connection = True
+        self.detached = True
+        self.server.detach_request(self.request)
+        self.slow_engine.add(self.connection.dup(), slow_response_steps(profile, head, body),
+                             self.route, self.status_code, self.request_started)
+
+    def send_synthetic_page(self, index):
+        """Send a generated page of the synthetic site"""
+        with self.stage('render'):
+            body = render_synthetic_page(index, self.synthetic_pages, self.synthetic_fanout)
+        self.send_page(body, cache_key=('synthetic', index))
+
+    def send_base64_page(self, path):
+        """Send pages that are accessed via base64 decoded links (leaf nodes)"""
+        with self.stage('render'):
+            body = render_leaf_page(path)
+        self.send_page(body, cache_key=('leaf', path))
+
+class SurfAdventuresServer(socketserver.TCPServer):
+    """TCP server that can be restarted right away on the same port"""
+    allow_reuse_address = True
+    request_queue_size = 128
+
+    def __init__(self, *args, **kwargs):
+        self.detached_requests = set()
+        self.detached_lock = threading.Lock()
+        super().__init__(*args, **kwargs)
+
+    def detach_request(self, request):
+        """Mark a request whose socket now belongs to the slow response engine"""
+        with self.detached_lock:
+            self.detached_requests.add(request)
+
+    def shutdown_request(self, request):
+        """Close detached requests without shutting down the shared connection"""
+        with self.detached_lock:
+            detached = request in self.detached_requests
+            self.detached_requests.discard(request)
+        if detached:
+            self.close_request(request)
+        else:
+            super().shutdown_request(request)
+
+class ThreadedSurfAdventuresServer(socketserver.ThreadingMixIn, SurfAdventuresServer):
+    """Server that handles every connection in its own thread"""
+    daemon_threads = True
+
+def print_banner(port, mode):
+    """Print the startup banner with the available routes"""
+    print("🏄‍♂️ NorCal Surf Adventures Server")
+    print("=" * 50)
+    print(f"Server running on port {port} ({mode} mode)")
+    print(f"Website: http://localhost:{port}")
+    handler = SurfAdventuresHTTPRequestHandler
+    if handler.synthetic_pages:
+        print(f"Synthetic site: {handler.synthetic_pages} pages, fanout {handler.synthetic_fanout}")
+    print()
+    print("📋 Available Routes:")
+    print("   - Main page: /")
+    print("   - Surf spots page: /spots")
+    print("   - About page: /about")
+    print("   - Gallery page: /gallery/mavericks-photos/")
+    print("   - 404 errors: /spots/mavericks/forecast, /spots/mavericks, etc.")
+    print("   - Hanging request: /hang (e.g. /hang?mode=drip&rate=32, see parse_slow_profile)")
+    for route_path in SLOW_ROUTES:
+        print(f"   - Slow route: {route_path} {SLOW_ROUTES[route_path]}")
+    print("   - Base64 decoded pages: /gear/wetsuit-guide/, etc.")
+    print("   - Dynamic pages: /dynamic/surf-report/, /dynamic/forecast/")
+    print("   - Server metrics: /__metrics (add ?format=prometheus for text)")
+    print("   - Crawler hints: /robots.txt, /sitemap.xml")
+    print(f"   - Static files: {handler.static_root} ({handler.static_mode}), "
+          f"including anything under gallery/")
+    if handler.rate_limit:
+        print(f"   - Rate limit: {handler.rate_limit:g} requests/sec (burst "
+              f"{handler.rate_limiter.burst}), then 429 with Retry-After")
+    print()
+    print("🔐 Base64 encoded links:")
+    print("   - L2dhbGxlcnkvbWF2ZXJpY2tzLXBob3Rvcy8= → /gallery/mavericks-photos/")
+    print("   - L2dlYXIvd2V0c3VpdC1ndWlkZS8= → /gear/wetsuit-guide/")
+    print("   - L2NvbmRpdGlvbnMvd2VhdGhlci1yZXBvcnRzLw== → /conditions/weather-reports/")
+    print("   - L3Nwb3RzL3N1cmYtcmVwb3J0cy8= → /spots/surf-reports/")
+    print("   - L3Nwb3RzL3RpZGUtcmVwb3J0cy8= → /spots/tide-reports/")
+    print()
+    print("Press Ctrl+C to stop the server")
+
+def run_server(port=None, synthetic_pages=None, synthetic_fanout=None, mode=None,
+               slow_routes=None, crawl_delay=None, static_root=None, static_mode=None,
+               rate_limit=None, rate_burst=None, profiler=None, profile_dir='profile'):
     """Run the HTTP server"""
     if port is None:
         port = int(os.environ.get('PORT', 8000))
+    if mode is None:
+        mode = os.environ.get('SERVER_MODE', 'single')
     
     handler = SurfAdventuresHTTPRequestHandler
+    if synthetic_pages is not None:
+        handler.synthetic_pages = synthetic_pages
+    if synthetic_fanout is not None:
+        handler.synthetic_fanout = synthetic_fanout
+    if crawl_delay is not None:
+        handler.crawl_delay = crawl_delay
+    if static_root is not None:
+        handler.static_root = static_root
+    if static_mode is not None:
+        handler.static_mode = static_mode
+    if rate_limit is not None:
+        handler.rate_limit = rate_limit
+    if rate_burst is not None:
+        handler.rate_burst = rate_burst
+    handler.rate_limiter = (RateLimiter(handler.rate_limit, handler.rate_burst)
+                            if handler.rate_limit > 0 else None)
+    if profiler is not None:
+        handler.profiler = profiler
+        # benchmark.py and process managers stop the server with SIGTERM; dump the profile then too
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+        profiler.start()
+    for spec in slow_routes or []:
+        # '/spots/mavericks?mode=delay&seconds=30'
+        route_path, _, query = spec.partition('?')
+        SLOW_ROUTES[route_path] = dict(urllib.parse.parse_qsl(query))
+        parse_slow_profile(query)
     
-    with socketserver.TCPServer(("", port), handler) as httpd:
-        print("🏄‍♂️ NorCal Surf Adventures Server")
-        print("=" * 50)
-        print(f"Server running on port {port}")
-        print(f"Website: http://localhost:{port}")
-        print()
-        print("📋 Available Routes:")
-        print("   - Main page: /")
-        print("   - Surf spots page: /spots")
-        print("   - About page: /about")
-        print("   - Gallery page: /gallery/mavericks-photos/")
-        print("   - 404 errors: /spots/mavericks/forecast, /spots/mavericks, etc.")
-        print("   - Hanging request: /hang")
-        print("   - Base64 decoded pages: /gear/wetsuit-guide/, etc.")
-        print("   - Dynamic pages: /dynamic/surf-report/, /dynamic/forecast/")
-        print()
-        print("🔐 Base64 encoded links:")
-        print("   - L2dhbGxlcnkvbWF2ZXJpY2tzLXBob3Rvcy8= → /gallery/mavericks-photos/")
-        print("   - L2dlYXIvd2V0c3VpdC1ndWlkZS8= → /gear/wetsuit-guide/")
-        print("   - L2NvbmRpdGlvbnMvd2VhdGhlci1yZXBvcnRzLw== → /conditions/weather-reports/")
-        print("   - L3Nwb3RzL3N1cmYtcmVwb3J0cy8= → /spots/surf-reports/")
-        print("   - L3Nwb3RzL3RpZGUtcmVwb3J0cy8= → /spots/tide-reports/")
-        print()
-        print("Press Ctrl+C to stop the server")
+    try:
+        if mode == 'asyncio':
+            # Run as a script this module is __main__; without the alias async_server's
+            # "from server import" would load a second copy, with its own slow engine and caches
+            sys.modules.setdefault('server', sys.modules[__name__])
+            # Imported lazily so the socketserver modes do not load asyncio
+            from async_server import run_async_server
+            run_async_server(port, handler.synthetic_pages, handler.synthetic_fanout,
+                             slow_routes=SLOW_ROUTES, crawl_delay=handler.crawl_delay,
+                             static_root=handler.static_root, static_mode=handler.static_mode,
+                             rate_limiter=handler.rate_limiter, profiler=profiler,
+                             metrics=handler.metrics, static_files=STATIC_FILES)
+            return
         
-        try:
-            httpd.serve_forever()
-        except KeyboardInterrupt:
-            print("\n🛑 Server stopped")
+        server_class = ThreadedSurfAdventuresServer if mode == 'threaded' else SurfAdventuresServer
+        with server_class(("", port), handler) as httpd:
+            print_banner(httpd.server_address[1], mode)
+            
+            try:
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                print("\n🛑 Server stopped")
+    finally:
+        if profiler is not None:
+            profiler.finish()
+            print(profiler.summary())
+            print(f"Profile written to {', '.join(profiler.save(profile_dir))}")
+
+def make_profiler(cprofile=False, stacks_ms=None, memory_frames=0):
+    """A StageProfiler from the crawler's profiling module"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'websurfer_example'))
+    from profiling import StageProfiler
+    return StageProfiler(cprofile=cprofile, trace_memory=memory_frames,
+                         sample_interval=stacks_ms / 1000 if stacks_ms else None)
+
+def main():
+    """Parse command line options and run the server"""
+    parser = argparse.ArgumentParser(description="NorCal Surf Adventures test server")
+    parser.add_argument('--port', type=int, default=None,
+                        help="Port to listen on (default: $PORT or 8000, 0 picks a free port)")
+    parser.add_argument('--synthetic-pages', type=int, default=None,
+                        help="Serve a generated site with this many pages (default: $SYNTHETIC_PAGES)")
+    parser.add_argument('--synthetic-fanout', type=int, default=None,
+                        help="Links per synthetic page (default: $SYNTHETIC_FANOUT or 10)")
+    parser.add_argument('--mode', choices=SERVER_MODES, default=None,
+                        help="single handles one request at a time, threaded uses a thread "
+                             "per connection, asyncio runs every connection as a coroutine "
+                             "(default: $SERVER_MODE or single)")
+    parser.add_argument('--slow-route', action='append', default=[], metavar='PATH?QUERY',
+                        help="Make a route answer slowly, e.g. '/spots/mavericks?mode=delay&seconds=30' "
+                             "(repeatable)")
+    parser.add_argument('--crawl-delay', type=float, default=None,
+                        help="Crawl-delay to advertise in robots.txt (default: $CRAWL_DELAY or none)")
+    parser.add_argument('--static-root', default=None,
+                        help="Directory the page files and gallery/ are served from "
+                             "(default: $STATIC_ROOT or the current directory)")
+    parser.add_argument('--static-mode', choices=STATIC_MODES, default=None,
+                        help="Send static files with os.sendfile, from an mmap, or by reading "
+                             "them into memory per request (default: $STATIC_MODE or sendfile)")
+    parser.add_argument('--rate-limit', type=float, default=None, metavar='RPS',
+                        help="Answer 429 with Retry-After beyond this many requests per second "
+                             "(default: $RATE_LIMIT or no limit)")
+    parser.add_argument('--rate-burst', type=int, default=None,
+                        help="Requests allowed at once before the rate limit applies "
+                             "(default: $RATE_BURST or one second's worth)")
+    parser.add_argument('--profile', nargs='?', const='profile', default=os.environ.get('PROFILE_DIR'),
+                        metavar='DIR',
+                        help="Time each request stage (route, render, encode, send) and write the "
+                             "profile to DIR when the server stops (default: $PROFILE_DIR or off)")
+    parser.add_argument('--profile-cprofile', action='store_true',
+                        help="Add a cProfile of the main thread (every request in single mode)")
+    parser.add_argument('--profile-stacks', type=float, metavar='MS',
+                        help="Sample every thread's stack this often, for a flamegraph")
+    parser.add_argument('--profile-memory', type=int, nargs='?', const=1, default=0, metavar='FRAMES',
+                        help="Trace allocations with tracemalloc (slow), keeping FRAMES frames per site")
+    args = parser.parse_args()
+    profiler = None
+    if args.profile or args.profile_cprofile or args.profile_stacks or args.profile_memory:
+        profiler = make_profiler(args.profile_cprofile, args.profile_stacks, args.profile_memory)
+    run_server(port=args.port, synthetic_pages=args.synthetic_pages,
+               synthetic_fanout=args.synthetic_fanout, mode=args.mode,
+               slow_routes=args.slow_route, crawl_delay=args.crawl_delay,
+               static_root=args.static_root, static_mode=args.static_mode,
+               rate_limit=args.rate_limit, rate_burst=args.rate_burst,
+               profiler=profiler, profile_dir=args.profile or 'profile')
 
 if __name__ == "__main__":
-    run_server() 
\ No newline at end of file
+    main() 
\ No newline at end of file
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Static File Benchmark for the NorCal Surf Adventures server
+Serves the site pages plus larger generated gallery assets in each static mode
+(sendfile, mmap, read) and compares throughput, latency and server CPU per request
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import urllib.request
+
+from loadgen import LoadStats, fetch, spawned_server
+from server import STATIC_MODES
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+PAGE_PATHS = ['/', '/spots', '/about', '/gallery/mavericks-photos/']
+
+DEFAULT_ASSET_SIZES = '64K,1M,8M'
+
+
+def parse_size(text):
+    """Parse '64K', '1M' or a plain byte count"""
+    text = text.strip().upper()
+    scale = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}.get(text[-1:], 1)
+    return int(float(text.rstrip('KMG')) * scale)
+
+
+def make_static_root(directory, sizes):
+    """Copy the site pages into `directory` and add one gallery asset per size"""
+    for name in ('index.html', 'spots.html', 'about.html'):
+        shutil.copy(os.path.join(ROOT, name), directory)
+    shutil.copytree(os.path.join(ROOT, 'gallery'), os.path.join(directory, 'gallery'))
+    assets = []
+    for size in sizes:
+        name = f"asset-{size}.bin"
+        with open(os.path.join(directory, 'gallery', name), 'wb') as f:
+            f.write(os.urandom(size))
+        assets.append((f"/gallery/{name}", size))
+    return assets
+
+
+def server_cpu(port):
+    """Server process CPU seconds, from its metrics endpoint"""
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}/__metrics", timeout=5) as response:
+        return json.load(response)['cpu_seconds']
+
+
+async def hammer(port, paths, duration, concurrency, timeout):
+    """Fetch the paths round-robin from `concurrency` clients for `duration` seconds"""
+    stats = LoadStats()
+    deadline = time.perf_counter() + duration
+
+    async def worker(offset):
+        index = offset
+        while time.perf_counter() < deadline:
+            path = paths[index % len(paths)]
+            index += 1
+            outcome, latency, size = await fetch('127.0.0.1', port, path, timeout, timeout)
+            stats.record('static', outcome, latency, size)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return stats.report(time.perf_counter() - start)
+
+
+def run_case(port, paths, args):
+    cpu_before = server_cpu(port)
+    report = asyncio.run(hammer(port, paths, args.duration, args.concurrency, args.timeout))
+    cpu = server_cpu(port) - cpu_before
+    overall = report['overall']
+    return {
+        'requests': overall['requests'],
+        'errors': overall['errors'],
+        'throughput_rps': overall['throughput_rps'],
+        'mb_per_sec': overall['bytes_received'] / report['duration_sec'] / (1 << 20),
+        'p50_ms': overall['p50_ms'],
+        'p99_ms': overall['p99_ms'],
+        'server_cpu_ms_per_request': cpu * 1000 / overall['requests'] if overall['requests'] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the server's static file modes")
+    parser.add_argument('--static-modes', default=','.join(STATIC_MODES),
+                        help=f"Comma separated static modes to compare ({', '.join(STATIC_MODES)})")
+    parser.add_argument('--server-mode', default='threaded', help="server.py --mode to run")
+    parser.add_argument('--sizes', default=DEFAULT_ASSET_SIZES,
+                        help=f"Generated gallery asset sizes (default: {DEFAULT_ASSET_SIZES})")
+    parser.add_argument('--duration', type=float, default=5, help="Seconds per case")
+    parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients")
+    parser.add_argument('--timeout', type=float, default=30.0, help="Per-request timeout")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    sizes = [parse_size(size) for size in args.sizes.split(',')]
+    results = {}
+    with tempfile.TemporaryDirectory() as static_root:
+        assets = make_static_root(static_root, sizes)
+        cases = [('pages', PAGE_PATHS)] + [(os.path.basename(path), [path]) for path, _ in assets]
+        for static_mode in args.static_modes.split(','):
+            extra = ['--static-mode', static_mode, '--static-root', static_root]
+            with spawned_server(args.server_mode, extra) as port:
+                results[static_mode] = {name: run_case(port, paths, args) for name, paths in cases}
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"📊 Static files - {args.server_mode} server, concurrency {args.concurrency}, "
+          f"{args.duration:g}s per case")
+    print("=" * 86)
+    print(f"{'mode':<10}{'case':<22}{'rps':>10}{'MB/s':>10}{'p50 ms':>10}{'p99 ms':>10}"
+          f"{'cpu ms/req':>12}{'errors':>8}")
+    print("-" * 86)
+    for static_mode, cases in results.items():
+        for name, row in cases.items():
+            cpu = row['server_cpu_ms_per_request']
+            print(f"{static_mode:<10}{name:<22}{row['throughput_rps']:>10.1f}{row['mb_per_sec']:>10.1f}"
+                  f"{row['p50_ms'] or 0:>10.2f}{row['p99_ms'] or 0:>10.2f}"
+                  f"{'-' if cpu is None else f'{cpu:.3f}':>12}{row['errors']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
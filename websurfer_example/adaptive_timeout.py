@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Adaptive Timeouts for the requests-based scrapers
+Learns response time quantiles per host and per path prefix in small HDR-style
+histograms and sets each request's timeout from them, within bounds: fast
+routes fail fast, slow routes that do answer get the time they need, and
+prefixes that only ever time out are given up on quickly
+"""
+
+import threading
+
+# Each power of two is split into 2**SUB_BUCKET_BITS linear buckets (~6% error)
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+
+def bucket_index(micros):
+    """HDR histogram bucket of a value in microseconds"""
+    shift = max(0, micros.bit_length() - SUB_BUCKET_BITS - 1)
+    return shift * SUB_BUCKETS + (micros >> shift)
+
+
+def bucket_upper(index):
+    """Largest value in microseconds that falls into a bucket"""
+    shift = max(0, index // SUB_BUCKETS - 1)
+    return ((index - shift * SUB_BUCKETS + 1) << shift) - 1
+
+
+def route_keys(url, prefix_segments=1):
+    """Return the (host, path prefix) keys of a URL
+
+    e.g. ('http://localhost:8000', 'http://localhost:8000/spots/') for
+    http://localhost:8000/spots/mavericks?day=1
+    """
+    scheme, _, rest = url.partition('://')
+    host, _, path = rest.partition('/')
+    path = path.split('?', 1)[0].split('#', 1)[0]
+    segments = path.split('/')
+    prefix = '/'.join(segments[:prefix_segments])
+    if len(segments) > prefix_segments:
+        prefix += '/'
+    host = f"{scheme}://{host}"
+    return host, f"{host}/{prefix}"
+
+
+class LatencyHistogram:
+    """Log-linear latency histogram that forgets old samples by halving
+
+    Covers a microsecond to hours in a few hundred counters; once `window`
+    samples are held every count is halved, so the quantiles follow a route
+    whose speed changes.
+    """
+
+    def __init__(self, window=512):
+        self.window = window
+        self.counts = []
+        self.total = 0
+
+    def record(self, seconds):
+        index = bucket_index(max(1, int(seconds * 1e6)))
+        if index >= len(self.counts):
+            self.counts.extend([0] * (index + 1 - len(self.counts)))
+        self.counts[index] += 1
+        self.total += 1
+        if self.total >= self.window:
+            self.counts = [count // 2 for count in self.counts]
+            self.total = sum(self.counts)
+
+    def quantile(self, q):
+        """Upper bound (seconds) of the bucket holding the q-th quantile, or None"""
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bucket_upper(index) / 1e6
+        return bucket_upper(len(self.counts) - 1) / 1e6
+
+
+class RouteLatency:
+    """What has been seen for one host or path prefix"""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.successes = 0
+        self.timeouts = 0
+        self.slowest = 0.0
+
+
+class AdaptiveTimeouts:
+    """Per host and per path prefix request timeouts learned from observed latency
+
+    A prefix with `min_samples` observations gets its `quantile` latency times
+    `multiplier`; one with fewer gets at least `multiplier` times its slowest
+    answer; an unseen one gets `default` (or more, if its host is slower).
+    Timeouts are recorded as observations of the timeout itself, so a route
+    that has become slower earns a longer timeout. A prefix that has never
+    answered gets `multiplier` times longer after each timeout, until it has
+    timed out `hung_after` times and drops to `floor`. Every timeout is kept
+    between `floor` and `ceiling`.
+    """
+
+    def __init__(self, default=2.0, floor=0.25, ceiling=10.0, quantile=0.99, multiplier=2.0,
+                 min_samples=5, hung_after=2, prefix_segments=1):
+        self.default = default
+        self.floor = floor
+        self.ceiling = ceiling
+        self.quantile = quantile
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self.hung_after = hung_after
+        self.prefix_segments = prefix_segments
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def keys(self, url):
+        return route_keys(url, self.prefix_segments)
+
+    def clamp(self, seconds):
+        return min(self.ceiling, max(self.floor, seconds))
+
+    def learned(self, stats):
+        """Timeout from a route's own samples, or None if it has too few"""
+        if stats is None or stats.histogram.total < self.min_samples:
+            return None
+        return self.clamp(stats.histogram.quantile(self.quantile) * self.multiplier)
+
+    def timeout(self, url):
+        """Return the timeout (seconds) to use for a request to `url`"""
+        host, prefix = self.keys(url)
+        with self.lock:
+            stats = self.routes.get(prefix)
+            learned = self.learned(stats)
+            if learned is not None:
+                return learned
+            budget = max(self.default, self.learned(self.routes.get(host)) or 0)
+            if stats is not None and not stats.successes and stats.timeouts:
+                if stats.timeouts >= self.hung_after:
+                    # Nothing under this prefix ever answers
+                    return self.floor
+                # Maybe it is just slow; give it a longer chance
+                budget *= self.multiplier ** stats.timeouts
+            elif stats is not None:
+                budget = max(budget, stats.slowest * self.multiplier)
+            return self.clamp(budget)
+
+    def record(self, url, seconds):
+        """Record a request that answered after `seconds`"""
+        with self.lock:
+            for key in self.keys(url):
+                stats = self.routes.setdefault(key, RouteLatency())
+                stats.histogram.record(seconds)
+                stats.successes += 1
+                stats.slowest = max(stats.slowest, seconds)
+
+    def record_timeout(self, url, seconds):
+        """Record a request that was given up on after `seconds`"""
+        host, prefix = self.keys(url)
+        with self.lock:
+            self.routes.setdefault(host, RouteLatency()).timeouts += 1
+            stats = self.routes.setdefault(prefix, RouteLatency())
+            stats.timeouts += 1
+            # It took at least this long; only prefixes that also answer learn from it,
+            # so one hung prefix doesn't slow down the host's other routes
+            if stats.successes:
+                stats.histogram.record(seconds)
+
+    def print_report(self, limit=10):
+        """Print the learned timeouts of the busiest prefixes"""
+        with self.lock:
+            rows = sorted(self.routes.items(), key=lambda item: -(item[1].successes + item[1].timeouts))
+        # Host keys are the ones without a path
+        prefixes = [(key, stats) for key, stats in rows if key.count('/') > 2]
+        if not prefixes:
+            return
+        print("Learned timeouts:")
+        for key, stats in prefixes[:limit]:
+            p50 = stats.histogram.quantile(0.5)
+            p99 = stats.histogram.quantile(self.quantile)
+            latency = f"p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms" if p50 is not None else "no answers"
+            print(f"  {key}: {stats.successes} answered, {stats.timeouts} timed out, {latency}, "
+                  f"timeout {self.timeout(key):.2f}s")
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Async Web Scraper
+Crawls like BFSWebScraper's concurrent mode, but keeps its requests in flight
+as asyncio tasks on one thread over a small keep-alive HTTP/1.1 client instead
+of on a worker pool, so hundreds of slow pages cost sockets rather than threads.
+Responses are handed to the scraper as ordinary requests responses, so
+parsing, redirects, budgets and every instrument work unchanged
+"""
+
+import asyncio
+import io
+import ssl
+import time
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+from circuit_breaker import FAILURE, OK, TIMEOUT
+from concurrency import THROTTLED, outcome_of, retry_after_seconds
+from web_scraper import BFSWebScraper
+
+REDIRECTS = (301, 302, 303, 307, 308)
+MAX_REDIRECTS = 10
+MAX_HEADER_LINES = 100
+
+
+class ProtocolError(Exception):
+    """A server answer this client cannot read"""
+
+
+class Connection:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.reused = False
+
+    def close(self):
+        self.writer.close()
+
+
+class AsyncHttpClient:
+    """GET-only HTTP/1.1 client with one keep-alive pool per host
+
+    Bodies are returned as sent (still compressed); redirects are followed
+    and kept in the response's history, like requests does.
+    """
+
+    def __init__(self, headers, verify=False):
+        self.headers = dict(headers)
+        self.pools = {}  # (scheme, host, port) -> idle Connections
+        self.adapter = HTTPAdapter()
+        self.ssl_context = ssl.create_default_context()
+        if not verify:
+            self.ssl_context.check_hostname = False
+            self.ssl_context.verify_mode = ssl.CERT_NONE
+        self.connections = 0
+
+    async def connect(self, key):
+        idle = self.pools.get(key)
+        while idle:
+            connection = idle.pop()
+            if not connection.reader.at_eof():
+                connection.reused = True
+                return connection
+            connection.close()
+        scheme, host, port = key
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=self.ssl_context if scheme == 'https' else None, limit=1 << 20)
+        self.connections += 1
+        return Connection(reader, writer)
+
+    def release(self, key, connection):
+        self.pools.setdefault(key, []).append(connection)
+
+    async def get(self, url):
+        """GET a URL, following redirects; returns a requests.Response"""
+        history = []
+        for _ in range(MAX_REDIRECTS + 1):
+            response = await self.get_once(url)
+            location = response.headers.get('Location')
+            if response.status_code not in REDIRECTS or not location:
+                response.history = history
+                return response
+            history.append(response)
+            url = urljoin(url, location)
+        raise requests.exceptions.TooManyRedirects(f"more than {MAX_REDIRECTS} redirects from {url}")
+
+    async def get_once(self, url):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise requests.exceptions.InvalidSchema(f"no connection for {url}")
+        key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+        target = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        lines = [f"GET {target} HTTP/1.1", f"Host: {parts.netloc}"]
+        lines += [f"{name}: {value}" for name, value in self.headers.items()]
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+        connection = await self.connect(key)
+        try:
+            connection.writer.write(request)
+            await connection.writer.drain()
+            status_line = await connection.reader.readline()
+            if not status_line and connection.reused:
+                # The server closed an idle connection; that's not this URL's fault
+                connection.close()
+                connection = await self.connect_fresh(key)
+                connection.writer.write(request)
+                await connection.writer.drain()
+                status_line = await connection.reader.readline()
+            version, status, reason, headers = await self.read_head(connection.reader, status_line)
+            body, keep_alive = await self.read_body(connection.reader, version, status, headers)
+        except BaseException:
+            # Cancelled (timed out) or broken mid-answer: the connection can't be reused
+            connection.close()
+            raise
+        if keep_alive:
+            self.release(key, connection)
+        else:
+            connection.close()
+
+        raw = HTTPResponse(body=io.BytesIO(body), headers=headers, status=status, reason=reason,
+                           preload_content=False, request_method='GET', request_url=url)
+        return self.adapter.build_response(requests.Request('GET', url).prepare(), raw)
+
+    async def connect_fresh(self, key):
+        for connection in self.pools.pop(key, []):
+            connection.close()
+        return await self.connect(key)
+
+    async def read_head(self, reader, status_line):
+        parts = status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/') or not parts[1].isdigit():
+            raise ProtocolError(f"bad status line {status_line[:80]!r}")
+        headers = HTTPHeaderDict()
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                return parts[0], int(parts[1]), parts[2] if len(parts) > 2 else '', headers
+            name, _, value = line.decode('latin-1').partition(':')
+            headers.add(name.strip(), value.strip())
+        raise ProtocolError(f"more than {MAX_HEADER_LINES} header lines")
+
+    async def read_body(self, reader, version, status, headers):
+        """The body as sent and whether the connection may be reused"""
+        connection = headers.get('Connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        if status in (204, 304) or 100 <= status < 200:
+            return b'', keep_alive
+        if 'chunked' in headers.get('Transfer-Encoding', '').lower():
+            chunks = []
+            while True:
+                size_line = await reader.readline()
+                try:
+                    size = int(size_line.split(b';', 1)[0].strip(), 16)
+                except ValueError:
+                    raise ProtocolError(f"bad chunk size {size_line[:40]!r}")
+                if not size:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            # Trailers
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            return b''.join(chunks), keep_alive
+        length = headers.get('Content-Length')
+        if length is not None:
+            return await reader.readexactly(int(length)), keep_alive
+        # No framing: the body runs until the server closes the connection
+        return await reader.read(), False
+
+    def close(self):
+        for pool in self.pools.values():
+            for connection in pool:
+                connection.close()
+        self.pools.clear()
+
+
+class AsyncBFSWebScraper(BFSWebScraper):
+    def __init__(self, base_url, **kwargs):
+        """
+        Args:
+            base_url (str): The starting URL to crawl
+            **kwargs: As for BFSWebScraper; the crawl is always concurrent, `transport`
+                and `executor` don't apply (the session only reads robots.txt and the
+                sitemap), and a streamed page is parsed once it has fully arrived
+        """
+        for name in ('transport', 'executor'):
+            if kwargs.pop(name, None) is not None:
+                print(f"⚠️  The async scraper does its own networking; ignoring {name}")
+        kwargs['concurrent'] = True
+        super().__init__(base_url, **kwargs)
+        # robots.txt and the sitemap are read with the session before the loop starts
+        self.client = AsyncHttpClient(self.session.headers, verify=self.session.verify)
+
+    async def timed_get(self, url):
+        """Fetch a URL as a task and feed the outcome to the timeouts, breaker and limiter"""
+        timeout = self.timeouts.timeout(url)
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(self.client.get(url), timeout)
+        except asyncio.TimeoutError:
+            self.profiler.record('fetch', timeout)
+            self.timeouts.record_timeout(url, timeout)
+            self.breaker.record(url, TIMEOUT)
+            self.limiter.record(timeout, TIMEOUT)
+            print(f"Request timeout for {url} after {timeout:.2f}s")
+            return None
+        except (OSError, EOFError, ValueError, ProtocolError,
+                requests.exceptions.RequestException) as e:
+            self.profiler.record('fetch', time.monotonic() - start)
+            self.breaker.record(url, FAILURE)
+            self.limiter.record(time.monotonic() - start, FAILURE)
+            print(f"Request error for {url}: {e!r}")
+            return None
+        elapsed = time.monotonic() - start
+        # Tasks interleave on one thread, so a fetch is timed as a whole, without CPU time
+        self.profiler.record('fetch', elapsed)
+        self.timeouts.record(url, elapsed)
+        outcome = outcome_of(response)
+        # Being throttled says nothing about whether the route works
+        self.breaker.record(url, OK if outcome == THROTTLED else outcome)
+        self.limiter.record(elapsed, outcome, retry_after_seconds(response.headers.get('Retry-After')))
+        return response
+
+    async def crawl_tasks(self):
+        in_flight = {}  # task -> (url, final URL, depth)
+        try:
+            while (self.queue and not self.out_of_budget()) or in_flight:
+                self.queue.extend(self.breaker.release())
+                # Once the budget is spent, only the fetches in flight are finished
+                while self.queue and self.limiter.available(len(in_flight)) and not self.out_of_budget():
+                    item = self.next_target()
+                    if item is not None:
+                        in_flight[asyncio.ensure_future(self.timed_get(item[1]))] = item
+
+                if not in_flight:
+                    # Everything left waits on a 429's Retry-After
+                    await asyncio.sleep(self.limiter.pause_remaining())
+                    continue
+
+                done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    current_url, target_url, depth = in_flight.pop(task)
+                    self.process_response(current_url, target_url, depth, task.result())
+        finally:
+            for task in in_flight:
+                task.cancel()
+            self.client.close()
+
+    def crawl_concurrently(self):
+        """Keep as many URLs in flight as the limiter allows, as tasks on one event loop"""
+        asyncio.run(self.crawl_tasks())
+        print(f"Opened {self.client.connections} connections")
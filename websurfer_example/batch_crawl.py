@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Batch Crawler for many sites in one process
+Crawls a list of seed sites concurrently with one BFSWebScraper per site
+(its own frontier, depth limit and results file) but a single session, fetch
+worker pool, page parser and set of instruments. A round-robin scheduler
+hands out the shared fetch slots one site at a time, so one huge site cannot
+starve the others
+"""
+
+import argparse
+import contextlib
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+
+from adaptive_timeout import AdaptiveTimeouts
+from concurrency import AIMDLimiter
+from content_fingerprint import ContentFingerprints
+from streaming_parser import StreamStats
+from transfer_stats import TransferStats
+from web_scraper import BFSWebScraper
+
+
+def results_filename(base_url):
+    """A results file name for a site, e.g. localhost_8000.txt"""
+    parts = urlsplit(base_url)
+    name = (parts.netloc + parts.path.rstrip('/')).replace(':', '_').replace('/', '_')
+    return f"{name or 'site'}.txt"
+
+
+class Site:
+    """One site of a batch: its scraper and scheduling state"""
+
+    def __init__(self, scraper, output):
+        self.scraper = scraper
+        self.output = output
+        self.in_flight = 0
+        self.fetches = 0
+        self.finished = None
+
+    def ready(self):
+        """Whether the site has a URL to fetch and its limiter has room for it"""
+        return bool(self.scraper.queue) and self.scraper.limiter.available(self.in_flight) > 0
+
+    def done(self):
+        return not self.scraper.queue and not self.in_flight
+
+
+class BatchCrawler:
+    """Crawls several sites at once over shared pools
+
+    `workers` fetches are in flight across all sites. Each site also has its
+    own AIMD limiter, capped at `per_site`, so one server is never sent more
+    than it handles well. Free slots go to the ready sites in turn, one each.
+    """
+
+    def __init__(self, base_urls, max_depth=3, workers=16, per_site=8, output_dir='batch_results',
+                 streaming=False, use_sitemap=True, transport=None):
+        self.max_depth = max_depth
+        self.workers = workers
+        self.output_dir = output_dir
+        self.use_sitemap = use_sitemap
+        self.session = requests.Session()
+        adapter = transport or requests.adapters.HTTPAdapter(pool_connections=max(10, len(base_urls)),
+                                                             pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        # Shared instruments; routes are keyed by host, so sites don't mix
+        self.timeouts = AdaptiveTimeouts(default=1.0)
+        self.transfer = TransferStats()
+        self.fingerprints = ContentFingerprints()
+        self.stream_stats = StreamStats()
+        self.sites = []
+        for base_url in dict.fromkeys(base_urls):
+            scraper = BFSWebScraper(base_url, max_depth=max_depth, delay=0, use_sitemap=use_sitemap,
+                                    streaming=streaming, timeouts=self.timeouts,
+                                    limiter=AIMDLimiter(initial=min(4, per_site), maximum=per_site),
+                                    session=self.session, executor=self.executor)
+            scraper.transfer = self.transfer
+            scraper.fingerprints = self.fingerprints
+            scraper.stream_stats = self.stream_stats
+            self.sites.append(Site(scraper, os.path.join(output_dir, results_filename(base_url))))
+        self.turn = 0
+        self.started = None
+
+    def seed(self):
+        """Read every site's robots.txt and sitemap on the worker pool"""
+        for site, error in zip(self.sites, self.executor.map(self.seed_site, self.sites)):
+            if error:
+                print(f"Could not seed {site.scraper.base_url}: {error}")
+
+    def seed_site(self, site):
+        try:
+            site.scraper.seed_frontier()
+        except Exception as e:
+            return e
+        return None
+
+    def fill(self, in_flight):
+        """Start fetches until the pool is full or no site is ready, one site at a time"""
+        progress = True
+        while progress and len(in_flight) < self.workers:
+            progress = False
+            count = len(self.sites)
+            for offset in range(count):
+                if len(in_flight) >= self.workers:
+                    break
+                index = (self.turn + offset) % count
+                site = self.sites[index]
+                if not site.ready():
+                    continue
+                progress = True
+                item = site.scraper.next_target()
+                if item is None:
+                    continue
+                scraper = site.scraper
+                future = self.executor.submit(
+                    scraper.redirects.fetch_once, item[1],
+                    lambda url, scraper=scraper: scraper.timed_fetch(url, stream=scraper.streaming))
+                in_flight[future] = (site, item)
+                site.in_flight += 1
+                site.fetches += 1
+                # The next free slot goes to the site after this one
+                self.turn = index + 1
+
+    def finish(self, site):
+        site.finished = time.perf_counter() - self.started
+        site.scraper.save_results(site.output)
+
+    def crawl(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        self.started = time.perf_counter()
+        print(f"Starting batch crawl of {len(self.sites)} sites, {self.workers} fetch workers")
+        print("-" * 50)
+        if self.use_sitemap:
+            self.seed()
+
+        in_flight = {}  # future -> (site, (url, final URL, depth))
+        active = list(self.sites)
+        while active:
+            for site in active:
+                site.scraper.queue.extend(site.scraper.breaker.release())
+            self.fill(in_flight)
+            # A site can run out of URLs while filling, when all it had left was skipped
+            for site in [site for site in active if site.done()]:
+                active.remove(site)
+                self.finish(site)
+
+            if not in_flight:
+                # Whatever is left waits on a 429's Retry-After
+                pauses = [site.scraper.limiter.pause_remaining() for site in active]
+                if pauses:
+                    time.sleep(max(0.01, min(pauses)))
+                continue
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                site, (current_url, target_url, depth) = in_flight.pop(future)
+                site.in_flight -= 1
+                response, owner = future.result()
+                if owner:
+                    site.scraper.process_response(current_url, target_url, depth, response)
+
+    def print_report(self):
+        wall = time.perf_counter() - self.started
+        pages = sum(site.scraper.crawled_count for site in self.sites)
+        print("-" * 50)
+        print(f"Batch completed: {pages} pages from {len(self.sites)} sites in {wall:.2f}s "
+              f"({pages / wall if wall else 0:.1f} pages/s)")
+        for site in sorted(self.sites, key=lambda site: site.finished or wall):
+            scraper = site.scraper
+            print(f"   {scraper.base_url}: {scraper.crawled_count} pages, {scraper.error_count} errors, "
+                  f"{len(scraper.all_links)} links, done at {site.finished or wall:.2f}s -> {site.output}")
+        print(self.transfer.summary())
+        self.timeouts.print_report()
+        if self.sites and self.sites[0].scraper.streaming:
+            print(self.stream_stats.summary())
+        else:
+            self.fingerprints.print_report()
+
+    def cleanup(self):
+        self.executor.shutdown(wait=False)
+
+
+def read_sites(filename):
+    """Seed sites from a file, one per line; blank lines and # comments are skipped"""
+    with open(filename, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl many sites concurrently in one process")
+    parser.add_argument('sites', nargs='*', help="Seed site URLs")
+    parser.add_argument('--sites-file', help="File with one seed site URL per line")
+    parser.add_argument('--max-depth', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=16, help="Fetches in flight across all sites")
+    parser.add_argument('--per-site', type=int, default=8, help="Most fetches in flight to one site")
+    parser.add_argument('--output-dir', default='batch_results', help="One results file per site goes here")
+    parser.add_argument('--streaming', action='store_true', help="Parse pages as they arrive")
+    parser.add_argument('--no-sitemap', action='store_true', help="Don't read robots.txt and sitemaps")
+    parser.add_argument('--quiet', action='store_true', help="Only print the final report")
+    args = parser.parse_args()
+
+    sites = args.sites + (read_sites(args.sites_file) if args.sites_file else [])
+    if not sites:
+        parser.error("give at least one site (or --sites-file)")
+
+    batch = BatchCrawler(sites, max_depth=args.max_depth, workers=args.workers, per_site=args.per_site,
+                         output_dir=args.output_dir, streaming=args.streaming,
+                         use_sitemap=not args.no_sitemap)
+    try:
+        with open(os.devnull, 'w') as devnull, \
+                contextlib.redirect_stdout(devnull) if args.quiet else contextlib.nullcontext():
+            batch.crawl()
+    except KeyboardInterrupt:
+        print("\nBatch interrupted; saving what each site has so far...")
+        for site in batch.sites:
+            if site.finished is None:
+                site.scraper.save_results(site.output)
+    finally:
+        batch.cleanup()
+    batch.print_report()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+Crawler Benchmark Suite
+Starts server.py on a free port, runs each scraper under fixed configurations
+and records wall time, pages/sec, peak RSS, CPU time and correctness to a
+JSON history file so regressions can be spotted between runs. With --replay
+the crawls are served from recorded HTTP archives instead of a live server
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from validate import load_entries, normalize_entry
+
+EXAMPLE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(EXAMPLE_DIR)
+
+# Fixed benchmark configurations (server options + crawler options)
+CONFIGS = {
+    'site': {
+        'synthetic_pages': 0,
+        'synthetic_fanout': 0,
+        'max_depth': 3,
+    },
+    'synthetic-2k': {
+        'synthetic_pages': 2000,
+        'synthetic_fanout': 8,
+        'max_depth': 5,
+    },
+}
+
+CRAWLERS = {
+    'bfs': ('web_scraper', 'BFSWebScraper', {}),
+    'bfs-stream': ('web_scraper', 'BFSWebScraper', {'streaming': True}),
+    'bfs-concurrent': ('web_scraper', 'BFSWebScraper', {'concurrent': True}),
+    'bfs-best-first': ('web_scraper', 'BFSWebScraper', {'best_first': True}),
+    'bfs-compact': ('web_scraper', 'BFSWebScraper', {'compact': True}),
+    'async': ('async_scraper', 'AsyncBFSWebScraper', {}),
+    'simple': ('simple_scraper', 'SimpleBFSWebScraper', {}),
+    'headless': ('headless_scraper', 'HeadlessBFSWebScraper', {}),
+}
+
+# Crawlers that do their own networking, so an HTTP archive can't replay them
+UNREPLAYABLE = ('async', 'headless')
+
+# Default regression thresholds (relative to the median of recent runs)
+DEFAULT_THRESHOLDS = {
+    'max_slowdown': 0.25,      # wall time may grow by 25%
+    'max_rss_growth': 0.50,    # peak RSS may grow by 50%
+    'max_recall_drop': 0.02,   # recall may drop by 2 points
+}
+
+
+def expected_entries(config):
+    """Return the set of links a complete crawl of this configuration finds"""
+    sys.path.insert(0, REPO_ROOT)
+    from server import sitemap_paths, synthetic_children, synthetic_path
+
+    if not config['synthetic_pages']:
+        # Pages only listed in the sitemap count too, since the crawlers read it
+        entries = load_entries(os.path.join(EXAMPLE_DIR, 'solution.txt'))
+        for path in sitemap_paths():
+            entries.update(normalize_entry(path))
+        return entries
+
+    # Pages deeper than max_depth are linked but never fetched, so their
+    # children are not expected
+    entries = {'/'}
+    layer = [0]
+    for depth in range(config['max_depth']):
+        next_layer = []
+        for index in layer:
+            for child in synthetic_children(index, config['synthetic_pages'], config['synthetic_fanout']):
+                entries.add(synthetic_path(child))
+                next_layer.append(child)
+        layer = next_layer
+    return entries
+
+
+def free_port():
+    """Ask the OS for an unused TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@contextlib.contextmanager
+def running_server(config):
+    """Start server.py for a configuration and yield its base URL"""
+    port = free_port()
+    cmd = [sys.executable, os.path.join(REPO_ROOT, 'server.py'), '--port', str(port)]
+    if config['synthetic_pages']:
+        cmd += ['--synthetic-pages', str(config['synthetic_pages']),
+                '--synthetic-fanout', str(config['synthetic_fanout'])]
+    env = dict(os.environ, ACCESS_LOG_SAMPLE_RATE='0')
+    process = subprocess.Popen(cmd, cwd=REPO_ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                urllib.request.urlopen(base_url + '/__metrics', timeout=1).read()
+                break
+            except OSError:
+                if time.time() > deadline or process.poll() is not None:
+                    raise RuntimeError("server.py did not start")
+                time.sleep(0.1)
+        yield base_url
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def headless_available():
+    """Check whether Selenium and a Chrome driver are installed"""
+    try:
+        import selenium  # noqa: F401
+    except ImportError:
+        return False
+    return bool(shutil.which('chromedriver') or shutil.which('google-chrome')
+                or shutil.which('chromium'))
+
+
+def archive_path(archive_dir, config_name):
+    return os.path.join(archive_dir, f"{config_name}.surfarc")
+
+
+def record_archive(path, config_name):
+    """Record every requests-based crawler's crawl of a configuration into an archive"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with running_server(CONFIGS[config_name]) as base_url:
+        cmd = [sys.executable, os.path.join(EXAMPLE_DIR, 'http_archive.py'), 'record', path,
+               '--base-url', base_url, '--max-depth', str(CONFIGS[config_name]['max_depth'])]
+        for crawler in sorted(CRAWLERS):
+            if crawler not in UNREPLAYABLE:
+                cmd += ['--crawler', crawler]
+        subprocess.run(cmd, cwd=EXAMPLE_DIR, check=True, stdout=subprocess.DEVNULL)
+
+
+def run_worker(crawler, config_name, base_url, archive=None, latency=0.0, budget=None):
+    """Run one crawl in this process and return its measurements"""
+    import importlib
+
+    config = CONFIGS[config_name]
+    module_name, class_name, options = CRAWLERS[crawler]
+    sys.path.insert(0, EXAMPLE_DIR)
+    scraper_class = getattr(importlib.import_module(module_name), class_name)
+    if archive:
+        from http_archive import HttpArchive, ReplayAdapter
+        archive = HttpArchive(archive)
+        base_url = archive.meta['base_url']
+        options = dict(options, transport=ReplayAdapter(archive, latency=latency))
+    if budget:
+        from crawl_budget import CrawlBudget
+        options = dict(options, budget=CrawlBudget(**budget))
+    results_file = os.path.join(os.environ.get('TMPDIR', '/tmp'), f"bench-{os.getpid()}.txt")
+
+    cpu_start = os.times()
+    start = time.perf_counter()
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        scraper = scraper_class(base_url=base_url, max_depth=config['max_depth'], delay=0, **options)
+        try:
+            scraper.crawl()
+            scraper.save_results(results_file)
+        finally:
+            if hasattr(scraper, 'cleanup'):
+                scraper.cleanup()
+    wall = time.perf_counter() - start
+    cpu_end = os.times()
+
+    found = load_entries(results_file)
+    os.remove(results_file)
+    expected = expected_entries(config)
+    hits = len(found & expected)
+
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform != 'darwin':
+        peak_rss *= 1024
+
+    return {
+        'crawler': crawler,
+        'config': config_name,
+        'replay': archive is not None,
+        'budget': budget,
+        'wall_sec': wall,
+        'cpu_sec': (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system),
+        'pages': len(scraper.visited),
+        'pages_per_sec': len(scraper.visited) / wall if wall else 0.0,
+        'peak_rss_bytes': peak_rss,
+        'links_found': len(found),
+        'recall': hits / len(expected) if expected else 1.0,
+        'precision': hits / len(found) if found else 0.0,
+        'wire_bytes': scraper.transfer.wire_bytes if hasattr(scraper, 'transfer') else None,
+        'decoded_bytes': scraper.transfer.decoded_bytes if hasattr(scraper, 'transfer') else None,
+        'coverage_area': scraper.coverage.area() if hasattr(scraper, 'coverage') else None,
+    }
+
+
+def run_benchmark(crawler, config_name, base_url, run_timeout, archive=None, latency=0.0, budget=None):
+    """Run one crawl in a fresh interpreter so RSS and CPU are not shared"""
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker',
+           '--crawler', crawler, '--config', config_name]
+    if archive:
+        cmd += ['--archive', archive, '--replay-latency', str(latency)]
+    else:
+        cmd += ['--base-url', base_url]
+    if budget:
+        cmd += ['--budget', json.dumps(budget)]
+    try:
+        output = subprocess.run(cmd, capture_output=True, text=True, check=True,
+                                timeout=run_timeout).stdout
+    except subprocess.TimeoutExpired:
+        return {'crawler': crawler, 'config': config_name, 'timed_out': True,
+                'wall_sec': float(run_timeout)}
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def load_history(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def check_regressions(result, history, thresholds, window=5):
+    """Compare a result with the median of the last runs of the same benchmark"""
+    # Replayed, live and budgeted crawls are only compared with their own kind
+    previous = [r for run in history for r in run['results']
+                if r['crawler'] == result['crawler'] and r['config'] == result['config']
+                and r.get('replay', False) == result.get('replay', False)
+                and r.get('budget') == result.get('budget') and not r.get('timed_out')]
+    previous = previous[-window:]
+    if result.get('timed_out'):
+        return ["crawl did not finish"] if previous else []
+    if not previous:
+        return []
+
+    problems = []
+    wall = statistics.median(r['wall_sec'] for r in previous)
+    if result['wall_sec'] > wall * (1 + thresholds['max_slowdown']):
+        problems.append(f"wall time {result['wall_sec']:.2f}s vs median {wall:.2f}s")
+    rss = statistics.median(r['peak_rss_bytes'] for r in previous)
+    if result['peak_rss_bytes'] > rss * (1 + thresholds['max_rss_growth']):
+        problems.append(f"peak RSS {result['peak_rss_bytes'] >> 20}MB vs median {int(rss) >> 20}MB")
+    recall = statistics.median(r['recall'] for r in previous)
+    if result['recall'] < recall - thresholds['max_recall_drop']:
+        problems.append(f"recall {result['recall']:.1%} vs median {recall:.1%}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crawlers against a local server.py")
+    parser.add_argument('--crawler', action='append', choices=sorted(CRAWLERS),
+                        help="Crawler to run (repeatable, default: all available)")
+    parser.add_argument('--config', action='append', choices=sorted(CONFIGS),
+                        help="Configuration to run (repeatable, default: all)")
+    parser.add_argument('--history', default=os.path.join(EXAMPLE_DIR, 'benchmark_history.json'),
+                        help="JSON file the results are appended to")
+    parser.add_argument('--no-save', action='store_true', help="Do not append to the history file")
+    parser.add_argument('--run-timeout', type=float, default=300,
+                        help="Give up on a single crawl after this many seconds")
+    parser.add_argument('--max-slowdown', type=float, default=DEFAULT_THRESHOLDS['max_slowdown'])
+    parser.add_argument('--max-rss-growth', type=float, default=DEFAULT_THRESHOLDS['max_rss_growth'])
+    parser.add_argument('--max-recall-drop', type=float, default=DEFAULT_THRESHOLDS['max_recall_drop'])
+    parser.add_argument('--replay', action='store_true',
+                        help="Serve the crawls from recorded HTTP archives (recorded first if missing)")
+    parser.add_argument('--archive-dir', default=os.path.join(EXAMPLE_DIR, 'archives'),
+                        help="Where --replay keeps one archive per configuration")
+    parser.add_argument('--replay-latency', type=float, default=0.0,
+                        help="With --replay, wait this multiple of each recorded response time")
+    parser.add_argument('--budget-pages', type=int, help="Stop each crawl after this many pages")
+    parser.add_argument('--budget-seconds', type=float, help="Stop each crawl after this many seconds")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--base-url', help=argparse.SUPPRESS)
+    parser.add_argument('--archive', help=argparse.SUPPRESS)
+    parser.add_argument('--budget', type=json.loads, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.crawler[0], args.config[0], args.base_url,
+                                    args.archive, args.replay_latency, args.budget)))
+        return 0
+
+    budget = {}
+    if args.budget_pages is not None:
+        budget['pages'] = args.budget_pages
+    if args.budget_seconds is not None:
+        budget['seconds'] = args.budget_seconds
+
+    # The headless browser does its own networking, so it cannot be replayed (or budgeted)
+    crawlers = args.crawler or [c for c in sorted(CRAWLERS)
+                                if c != 'headless' or (headless_available() and not args.replay and not budget)]
+    if (args.replay or budget) and 'headless' in crawlers:
+        print("⚠️  The headless crawler cannot be replayed or budgeted; skipping it")
+        crawlers.remove('headless')
+    if args.replay and 'async' in crawlers:
+        print("⚠️  The async crawler cannot be replayed; skipping it")
+        crawlers.remove('async')
+    configs = args.config or sorted(CONFIGS)
+    thresholds = {
+        'max_slowdown': args.max_slowdown,
+        'max_rss_growth': args.max_rss_growth,
+        'max_recall_drop': args.max_recall_drop,
+    }
+    history = load_history(args.history)
+
+    print("🏄‍♂️ Crawler Benchmark")
+    print("=" * 50)
+    results = []
+    regressions = []
+    for config_name in configs:
+        archive = None
+        if args.replay:
+            archive = archive_path(args.archive_dir, config_name)
+            if not os.path.exists(archive):
+                print(f"Recording {config_name} to {archive}...")
+                record_archive(archive, config_name)
+        with (contextlib.nullcontext() if archive else running_server(CONFIGS[config_name])) as base_url:
+            for crawler in crawlers:
+                print(f"Running {crawler} on {config_name}{' (replayed)' if archive else ''}...")
+                result = run_benchmark(crawler, config_name, base_url, args.run_timeout,
+                                       archive, args.replay_latency, budget or None)
+                results.append(result)
+                if result.get('timed_out'):
+                    print(f"   did not finish within {args.run_timeout:.0f}s")
+                    continue
+                print(f"   wall {result['wall_sec']:.2f}s | cpu {result['cpu_sec']:.2f}s | "
+                      f"{result['pages_per_sec']:.1f} pages/s | "
+                      f"RSS {result['peak_rss_bytes'] >> 20}MB | "
+                      f"recall {result['recall']:.1%} | precision {result['precision']:.1%}")
+                if result.get('budget'):
+                    print(f"   budget {result['budget']}: coverage area {result['coverage_area']:.2f}")
+                if result.get('wire_bytes'):
+                    print(f"   {result['wire_bytes'] >> 10}KB on the wire, "
+                          f"{result['decoded_bytes'] >> 10}KB decoded")
+                for problem in check_regressions(result, history, thresholds):
+                    regressions.append(f"{crawler}/{config_name}: {problem}")
+
+    if not args.no_save:
+        history.append({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'revision': git_revision(),
+            'thresholds': thresholds,
+            'results': results,
+        })
+        with open(args.history, 'w', encoding='utf-8') as f:
+            json.dump(history, f, indent=2)
+        print(f"Results appended to {args.history}")
+
+    if regressions:
+        print("-" * 50)
+        print("❌ Performance regressions:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        return 1
+    print("✅ No regressions against recent runs")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Circuit Breaker for the scrapers
+Tracks recent outcomes per host and per path prefix. Once a prefix (or a whole
+host) keeps failing or timing out its circuit opens and its URLs are skipped
+instead of each paying the full timeout; after a cooldown one URL is let
+through as a probe, and a successful probe re-queues everything skipped
+"""
+
+import threading
+import time
+from collections import deque
+
+from adaptive_timeout import route_keys
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+OK = 'ok'
+FAILURE = 'failure'
+TIMEOUT = 'timeout'
+
+
+class Circuit:
+    """State of one host or path prefix"""
+
+    def __init__(self, key, window):
+        self.key = key
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=window)
+        self.opened_at = 0.0
+        self.cooldown = 0.0
+        self.trips = 0
+        self.skipped = {}   # url -> queue item, in skip order
+        self.skip_count = 0
+        self.probe_released = False
+
+    def rates(self):
+        """Return (failure rate, timeout rate) over the recent outcomes; timeouts are failures too"""
+        total = len(self.outcomes)
+        if not total:
+            return 0.0, 0.0
+        timeouts = sum(1 for outcome in self.outcomes if outcome == TIMEOUT)
+        failures = timeouts + sum(1 for outcome in self.outcomes if outcome == FAILURE)
+        return failures / total, timeouts / total
+
+
+class CircuitBreaker:
+    """Closed/open/half-open circuits keyed by host and by path prefix
+
+    A circuit opens when, over its last `window` outcomes (at least
+    `min_requests` of them; `host_min_requests` for a whole host), the
+    failure rate reaches `failure_rate` or the timeout rate reaches
+    `timeout_rate`. An open circuit skips its URLs for `cooldown` seconds,
+    then lets one probe through (half-open): success closes it again, failure
+    reopens it with the cooldown doubled, up to `max_cooldown`.
+    """
+
+    def __init__(self, window=10, min_requests=3, host_min_requests=20, failure_rate=0.6,
+                 timeout_rate=0.5, cooldown=5.0, max_cooldown=60.0, prefix_segments=1,
+                 clock=time.monotonic):
+        self.window = window
+        self.min_requests = min_requests
+        self.host_min_requests = host_min_requests
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.prefix_segments = prefix_segments
+        self.clock = clock
+        self.circuits = {}
+        self.released = []
+        self.lock = threading.Lock()
+
+    def circuits_for(self, url):
+        """Return the (host, prefix) circuits of a URL, creating them if needed"""
+        circuits = []
+        # A host's window spans all its prefixes, so it holds more outcomes
+        for key, window in zip(route_keys(url, self.prefix_segments), (self.window * 4, self.window)):
+            circuit = self.circuits.get(key)
+            if circuit is None:
+                circuit = self.circuits[key] = Circuit(key, window)
+            circuits.append(circuit)
+        return circuits
+
+    def allow(self, url):
+        """Check whether a URL may be fetched now; may admit it as a half-open probe"""
+        now = self.clock()
+        with self.lock:
+            circuits = self.circuits_for(url)
+            for circuit in circuits:
+                if circuit.state == OPEN and now - circuit.opened_at < circuit.cooldown:
+                    return False
+                if circuit.state == HALF_OPEN:
+                    # The probe is still out
+                    return False
+            for circuit in circuits:
+                if circuit.state == OPEN:
+                    circuit.state = HALF_OPEN
+            return True
+
+    def skip(self, url, item):
+        """Remember a URL that was not fetched because its circuit is open"""
+        with self.lock:
+            host, prefix = self.circuits_for(url)
+            circuit = host if host.state != CLOSED else prefix
+            circuit.skipped.setdefault(url, item)
+            circuit.skip_count += 1
+            # A released probe that was skipped again (e.g. by its host) doesn't count
+            circuit.probe_released = False
+
+    def record(self, url, outcome):
+        """Record the OK, FAILURE or TIMEOUT outcome of a fetch"""
+        now = self.clock()
+        with self.lock:
+            host, prefix = self.circuits_for(url)
+            for circuit, min_requests in ((prefix, self.min_requests), (host, self.host_min_requests)):
+                circuit.outcomes.append(outcome)
+                if circuit.state == HALF_OPEN:
+                    if outcome == OK:
+                        self.close(circuit)
+                    else:
+                        self.open(circuit, now, min(self.max_cooldown, circuit.cooldown * 2))
+                elif circuit.state == CLOSED and len(circuit.outcomes) >= min_requests:
+                    failure_rate, timeout_rate = circuit.rates()
+                    if failure_rate >= self.failure_rate or timeout_rate >= self.timeout_rate:
+                        self.open(circuit, now, self.base_cooldown)
+
+    def open(self, circuit, now, cooldown):
+        circuit.state = OPEN
+        circuit.opened_at = now
+        circuit.cooldown = cooldown
+        circuit.trips += 1
+        circuit.probe_released = False
+        print(f"Circuit open for {circuit.key} ({len(circuit.outcomes)} recent requests, "
+              f"cooling down {cooldown:g}s)")
+
+    def close(self, circuit):
+        circuit.state = CLOSED
+        circuit.outcomes.clear()
+        circuit.cooldown = 0.0
+        print(f"Circuit closed for {circuit.key}, re-queueing {len(circuit.skipped)} skipped URLs")
+        self.released.extend(circuit.skipped.values())
+        circuit.skipped.clear()
+
+    def release(self):
+        """Return queue items to crawl again: everything skipped by circuits that have
+        closed, plus one probe per open circuit whose cooldown has passed"""
+        now = self.clock()
+        with self.lock:
+            items, self.released = self.released, []
+            for circuit in self.circuits.values():
+                if (circuit.state == OPEN and circuit.skipped and not circuit.probe_released
+                        and now - circuit.opened_at >= circuit.cooldown):
+                    url = next(iter(circuit.skipped))
+                    items.append(circuit.skipped.pop(url))
+                    circuit.probe_released = True
+            return items
+
+    def pending(self):
+        """Return the number of skipped URLs still waiting on an open circuit"""
+        with self.lock:
+            return sum(len(circuit.skipped) for circuit in self.circuits.values())
+
+    def print_report(self):
+        """Print the circuits that tripped and what they skipped"""
+        with self.lock:
+            tripped = [circuit for circuit in self.circuits.values() if circuit.trips]
+            if not tripped:
+                return
+            print("Circuit breakers:")
+            for circuit in tripped:
+                print(f"  {circuit.key}: {circuit.state}, tripped {circuit.trips}x, "
+                      f"skipped {circuit.skip_count} fetches")
+                for url in list(circuit.skipped)[:3]:
+                    print(f"    - {url} (skipped, breaker open)")
+                if len(circuit.skipped) > 3:
+                    print(f"    ... and {len(circuit.skipped) - 3} more")
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Adaptive Concurrency for the requests-based scrapers
+Sets how many requests may be in flight from what the server's answers say:
+one more per round trip while latency stays flat (additive increase), and
+half as many as soon as latency climbs, the server errors or throttles, or a
+request times out (multiplicative decrease). A 429's Retry-After pauses new
+requests until it has passed
+"""
+
+import email.utils
+import threading
+import time
+
+from circuit_breaker import FAILURE, OK, TIMEOUT
+
+# A 429 Too Many Requests answer
+THROTTLED = 'throttled'
+
+
+def retry_after_seconds(value):
+    """Seconds a Retry-After header (delta-seconds or an HTTP date) asks to wait, or None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def outcome_of(response):
+    """The limiter outcome of a response: THROTTLED, FAILURE for 5xx, else OK"""
+    if response.status_code == 429:
+        return THROTTLED
+    return FAILURE if response.status_code >= 500 else OK
+
+
+class AIMDLimiter:
+    """Additive-increase/multiplicative-decrease limit on requests in flight
+
+    Every OK answer adds 1/limit, so the limit grows by about one per round
+    of `limit` requests, up to `maximum`. Latency is compared against a
+    baseline (the lowest seen, drifting up slowly so it follows a server that
+    has become slower): once the smoothed latency exceeds `tolerance` times
+    the baseline plus `slack` seconds, or on a 5xx, 429 or timeout, the limit
+    is multiplied by `backoff`, down to `minimum`. Backing off happens at most
+    once per smoothed round trip, since the answers still arriving were sent
+    under the old limit.
+    """
+
+    def __init__(self, initial=4, minimum=1, maximum=32, backoff=0.5, tolerance=2.0, slack=0.005,
+                 smoothing=0.2, drift=1.002, clock=time.monotonic):
+        self.initial = initial
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.slack = slack
+        self.smoothing = smoothing
+        self.drift = drift
+        self.clock = clock
+        self.baseline = None
+        self.smoothed = None
+        self.paused_until = 0.0
+        self.last_backoff = float('-inf')
+        self.peak = self.limit
+        self.backoffs = {'latency': 0, FAILURE: 0, TIMEOUT: 0, THROTTLED: 0}
+        self.lock = threading.Lock()
+
+    def available(self, in_flight):
+        """Return how many more requests may start now, with `in_flight` already out"""
+        with self.lock:
+            if self.clock() < self.paused_until:
+                return 0
+            return max(0, int(self.limit) - in_flight)
+
+    def pause_remaining(self):
+        """Seconds left of a Retry-After pause (0 when not paused)"""
+        with self.lock:
+            return max(0.0, self.paused_until - self.clock())
+
+    def record(self, seconds, outcome, retry_after=None):
+        """Record a request that ended with `outcome` after `seconds`"""
+        with self.lock:
+            now = self.clock()
+            if outcome == THROTTLED and retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+            if outcome != OK:
+                self.decrease(now, outcome)
+                return
+            self.smoothed = seconds if self.smoothed is None else (
+                self.smoothed + self.smoothing * (seconds - self.smoothed))
+            self.baseline = seconds if self.baseline is None else min(seconds, self.baseline * self.drift)
+            if self.smoothed > self.baseline * self.tolerance + self.slack:
+                self.decrease(now, 'latency')
+            else:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                self.peak = max(self.peak, self.limit)
+
+    def decrease(self, now, reason):
+        if now - self.last_backoff < (self.smoothed or 0):
+            return
+        self.last_backoff = now
+        self.limit = max(self.minimum, self.limit * self.backoff)
+        self.backoffs[reason] += 1
+
+    def summary(self):
+        with self.lock:
+            reasons = ', '.join(f"{count} on {reason}" for reason, count in self.backoffs.items() if count)
+            return (f"Concurrency: started at {self.initial}, peaked at {int(self.peak)}, ended at "
+                    f"{int(self.limit)} in flight; backed off {sum(self.backoffs.values())}x"
+                    + (f" ({reasons})" if reasons else ""))
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+Content Fingerprinting for the scrapers
+Detects exact duplicate bodies by hash and near-duplicates (pages sharing a
+template, like the 404 page) by SimHash over their lines. Duplicates reuse the
+links already parsed out of their template, so only the lines that differ are
+tokenized again
+"""
+
+import hashlib
+from collections import Counter
+from difflib import SequenceMatcher
+
+from streaming_parser import LinkTokenizer
+
+# SimHash bit counts are summed in 24-bit lanes of one big integer
+LANE_BITS = 24
+SIMHASH_BITS = 64
+BANDS = 4
+BAND_BITS = SIMHASH_BITS // BANDS
+
+
+def _spread_table(shift):
+    """Map each byte value to its 8 bits spread into lanes, starting at lane `shift`"""
+    table = []
+    for value in range(256):
+        spread = 0
+        for bit in range(8):
+            if value >> bit & 1:
+                spread |= 1 << ((shift + bit) * LANE_BITS)
+        table.append(spread)
+    return table
+
+
+SPREAD_TABLES = [_spread_table(8 * index) for index in range(SIMHASH_BITS // 8)]
+
+
+def body_hash(text):
+    """Exact fingerprint of a response body"""
+    return hashlib.blake2b(text.encode('utf-8', 'replace'), digest_size=16).digest()
+
+
+def simhash(features):
+    """64-bit SimHash of an iterable of strings
+
+    Each feature's hash bits are added into per-bit counters held as lanes of one
+    integer, so a feature costs eight table lookups instead of 64 bit tests.
+    """
+    total = 0
+    count = 0
+    for feature in features:
+        digest = hashlib.blake2b(feature.encode('utf-8', 'replace'), digest_size=8).digest()
+        for index, byte in enumerate(digest):
+            total += SPREAD_TABLES[index][byte]
+        count += 1
+
+    fingerprint = 0
+    lane_mask = (1 << LANE_BITS) - 1
+    for bit in range(SIMHASH_BITS):
+        if (total >> (bit * LANE_BITS)) & lane_mask > count / 2:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class LineTokenizer(LinkTokenizer):
+    """LinkTokenizer that also records the line each link's tag starts on
+
+    Fed one line at a time, it notes where each line starts: in text, in a script
+    or style, or (None) inside a tag or comment. Text can be cut before a line
+    that doesn't start inside a tag and tokenized on its own from that state.
+    """
+
+    def __init__(self, state=''):
+        super().__init__()
+        self.lines = []
+        self.states = []
+        if state:
+            self.set_cdata_mode(state)
+
+    def handle_starttag(self, tag, attrs):
+        found = len(self.links)
+        super().handle_starttag(tag, attrs)
+        self.lines.extend([self.getpos()[0] - 1] * (len(self.links) - found))
+
+    def feed_lines(self, lines):
+        """Feed lines as splitlines() returns them; returns the state after the last one"""
+        for line in lines:
+            self.states.append(self.state())
+            self.feed(line + "\n")
+        self.states.append(self.state())
+        return self.states[-1]
+
+    def state(self):
+        """'' in text, 'script' or 'style' in their content, None anywhere else"""
+        if self.cdata_elem is None:
+            return None if '<' in self.rawdata else ''
+        if self.cdata_elem in ('script', 'style') and '</' not in self.rawdata:
+            return self.cdata_elem
+        return None
+
+
+class TemplateCluster:
+    """A representative page and the pages that duplicate it"""
+
+    def __init__(self, url, lines, tag_links, fingerprint):
+        self.url = url
+        self.lines = lines
+        self.line_set = set(lines)
+        self.tag_links = tag_links
+        self.fingerprint = fingerprint
+        self.members = []           # (url, 'exact' or 'near')
+        self.located_links = None   # (raw link, line its tag starts on), found on first reuse
+        self.line_states = None     # LineTokenizer state at the start of each line, and at the end
+
+    def locate_links(self):
+        """Tokenize the template recording link lines; False if that can't reproduce its parse"""
+        if self.located_links is None:
+            tokenizer = LineTokenizer()
+            tokenizer.feed_lines(self.lines)
+            tokenizer.close()
+            if Counter(tokenizer.links) != Counter(self.tag_links):
+                # e.g. another BeautifulSoup parser reading broken markup differently
+                self.located_links = False
+            else:
+                self.located_links = list(zip(tokenizer.links, tokenizer.lines))
+                self.line_states = tokenizer.states
+        return self.located_links
+
+
+class ContentFingerprints:
+    """Remembers page fingerprints and reuses link extraction across duplicates"""
+
+    def __init__(self, max_distance=3, max_delta=0.25):
+        """
+        Args:
+            max_distance (int): SimHash bits two near-duplicates may differ in (at most BANDS - 1)
+            max_delta (float): Largest fraction of changed lines worth a partial extraction
+        """
+        self.max_distance = min(max_distance, BANDS - 1)
+        self.max_delta = max_delta
+        self.pages = {}     # body hash -> (cluster, raw links)
+        self.bands = {}     # (band, bits) -> [cluster]
+        self.clusters = []
+        self.stats = {'exact': 0, 'near': 0, 'full': 0}
+
+    def raw_links(self, url, text, parse, scan):
+        """Return parse(text) + scan(text), reusing earlier results for duplicate pages
+
+        Both map HTML text to a list of raw (unresolved) link targets. `parse` is
+        the expensive HTML parser pass; a near-duplicate reuses its template's
+        links for the lines they share and tokenizes only the changed lines, so
+        its links come in document order whichever parser `parse` uses. `scan`
+        (the script link scan, which can span lines) is re-run on the whole page
+        unless it is an exact duplicate.
+        """
+        digest = body_hash(text)
+        known = self.pages.get(digest)
+        if known is not None:
+            cluster, raw = known
+            cluster.members.append((url, 'exact'))
+            self.stats['exact'] += 1
+            return raw
+
+        lines = text.splitlines()
+        fingerprint = simhash(line.strip() for line in lines)
+        cluster = self.find_near_duplicate(fingerprint)
+        if cluster is not None:
+            tag_links = self.reuse_template(cluster, lines)
+            if tag_links is not None:
+                raw = tag_links + scan(text)
+                cluster.members.append((url, 'near'))
+                self.pages[digest] = (cluster, raw)
+                self.stats['near'] += 1
+                return raw
+
+        tag_links = parse(text)
+        raw = tag_links + scan(text)
+        self.stats['full'] += 1
+        cluster = TemplateCluster(url, lines, tag_links, fingerprint)
+        self.clusters.append(cluster)
+        for band in range(BANDS):
+            key = (band, fingerprint >> (band * BAND_BITS) & ((1 << BAND_BITS) - 1))
+            self.bands.setdefault(key, []).append(cluster)
+        self.pages[digest] = (cluster, raw)
+        return raw
+
+    def find_near_duplicate(self, fingerprint):
+        """Find a cluster within max_distance bits; any such cluster shares a band"""
+        for band in range(BANDS):
+            key = (band, fingerprint >> (band * BAND_BITS) & ((1 << BAND_BITS) - 1))
+            for cluster in self.bands.get(key, ()):
+                if hamming(cluster.fingerprint, fingerprint) <= self.max_distance:
+                    return cluster
+        return None
+
+    def reuse_template(self, cluster, lines):
+        """Tag links of the lines shared with the template from the cache plus those of the changed lines
+
+        Returns None unless every changed run of lines starts and ends outside any
+        tag or comment, in the same state in the template and in the page, so a
+        tag split across a change or markup opened by one is parsed with the
+        whole page.
+        """
+        # Lines found nowhere in the template are a lower bound on the changed lines
+        if sum(1 for line in lines if line not in cluster.line_set) > self.max_delta * len(lines):
+            return None
+        opcodes = SequenceMatcher(None, cluster.lines, lines, autojunk=False).get_opcodes()
+        changed = sum(j2 - j1 for kind, _, _, j1, j2 in opcodes if kind != 'equal')
+        if changed > self.max_delta * len(lines):
+            return None
+        located = cluster.locate_links()
+        if located is False:
+            return None
+        
+        found = []          # (page line, link)
+        template = iter(located)
+        link = next(template, None)
+        for kind, i1, i2, j1, j2 in opcodes:
+            # Template links on lines the page replaced or dropped are skipped
+            while link is not None and link[1] < i1:
+                link = next(template, None)
+            if kind == 'equal':
+                while link is not None and link[1] < i2:
+                    found.append((link[1] - i1 + j1, link[0]))
+                    link = next(template, None)
+                continue
+            state = cluster.line_states[i1]
+            if state is None or cluster.line_states[i2] is None:
+                return None
+            tokenizer = LineTokenizer(state)
+            if tokenizer.feed_lines(lines[j1:j2]) != cluster.line_states[i2]:
+                return None
+            found.extend((line + j1, raw) for raw, line in zip(tokenizer.links, tokenizer.lines))
+        found.sort(key=lambda item: item[0])
+        return [raw for _, raw in found]
+
+    def duplicate_clusters(self):
+        """Return the clusters that have at least one duplicate, largest first"""
+        clusters = [cluster for cluster in self.clusters if cluster.members]
+        return sorted(clusters, key=lambda cluster: len(cluster.members), reverse=True)
+
+    def print_report(self, limit=10):
+        """Print the extraction savings and the largest duplicate clusters"""
+        stats = self.stats
+        print(f"Pages parsed in full: {stats['full']}, exact duplicates: {stats['exact']}, "
+              f"near-duplicates: {stats['near']}")
+        clusters = self.duplicate_clusters()
+        if not clusters:
+            return
+        print("Duplicate clusters:")
+        for cluster in clusters[:limit]:
+            exact = sum(1 for _, kind in cluster.members if kind == 'exact')
+            print(f"  {cluster.url}: {len(cluster.members)} duplicates "
+                  f"({exact} exact, {len(cluster.members) - exact} near)")
+            for url, kind in cluster.members[:3]:
+                print(f"    - {url} ({kind})")
+        if len(clusters) > limit:
+            print(f"  ... and {len(clusters) - limit} more clusters")
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Crawl Budgets for the requests-based scrapers
+Hard limits on wall time, pages, bytes and errors, so a crawl of a large site
+ends when its budget does, plus a best-first frontier that spends that budget
+on the URLs most likely to turn up new links first, and a coverage-versus-time
+curve to show how early the links were found
+"""
+
+import heapq
+import itertools
+import json
+import math
+import time
+from collections import deque
+
+from adaptive_timeout import route_keys
+
+
+class CrawlBudget:
+    """Limits a crawl stops at; None means no limit
+
+    Limits are checked before each fetch is started, so a crawl ends at most
+    one fetch (bounded by its timeout) past them.
+    """
+
+    def __init__(self, seconds=None, pages=None, bytes=None, errors=None, clock=time.monotonic):
+        self.seconds = seconds
+        self.pages = pages
+        self.bytes = bytes
+        self.errors = errors
+        self.clock = clock
+        self.started = clock()
+        self.reason = None
+
+    def start(self):
+        self.started = self.clock()
+        self.reason = None
+
+    def elapsed(self):
+        return self.clock() - self.started
+
+    def exceeded(self, pages, errors, wire_bytes):
+        """The name of the first limit reached ('time', 'pages', 'bytes', 'errors'), or None"""
+        if self.reason is None:
+            if self.seconds is not None and self.elapsed() >= self.seconds:
+                self.reason = 'time'
+            elif self.pages is not None and pages >= self.pages:
+                self.reason = 'pages'
+            elif self.bytes is not None and wire_bytes >= self.bytes:
+                self.reason = 'bytes'
+            elif self.errors is not None and errors >= self.errors:
+                self.reason = 'errors'
+        return self.reason
+
+    def describe(self):
+        limits = [f"{self.seconds}s" if self.seconds is not None else None,
+                  f"{self.pages} pages" if self.pages is not None else None,
+                  f"{self.bytes >> 10}KB" if self.bytes is not None else None,
+                  f"{self.errors} errors" if self.errors is not None else None]
+        return ', '.join(limit for limit in limits if limit) or 'unlimited'
+
+
+class BestFirstFrontier:
+    """A crawl queue that pops the URL expected to turn up the most new links first
+
+    Drop-in for the scrapers' deque of (url, depth). URLs are queued per path
+    prefix, and each pop goes to the prefix whose pages have yielded the most
+    new links per fetch so far. Unseen prefixes are credited with twice the
+    crawl's average, so each gets tried early, and prefixes full of 404s and
+    hangs sink, with failures counted against them once more since they also
+    spend the error and time budgets. Within a prefix, and between prefixes
+    scoring alike, URLs linked from more pages and shallower ones go first;
+    ties keep BFS order. appendleft() (used for 429 retries) goes ahead of
+    everything.
+    """
+
+    def __init__(self, items=(), prefix_segments=1, depth_weight=0.25, in_link_weight=0.1):
+        self.prefix_segments = prefix_segments
+        self.depth_weight = depth_weight
+        self.in_link_weight = in_link_weight
+        self.queues = {}                # prefix -> heap of (-URL weight, order, version, url)
+        self.entries = {}               # url -> [depth, in-links, version, prefix, order]
+        self.prefixes = {}              # prefix -> [fetched, failed, new links]
+        self.fetched = 0
+        self.found = 0
+        self.links = 0                  # the crawl's link total at the last record()
+        self.urgent = deque()
+        self.order = itertools.count()
+        self.extend(items)
+
+    def __len__(self):
+        return len(self.urgent) + len(self.entries)
+
+    def __bool__(self):
+        return bool(self.urgent or self.entries)
+
+    def weight(self, entry):
+        """How a URL ranks against others of its prefix"""
+        depth, in_links = entry[0], entry[1]
+        return (1 + self.in_link_weight * math.log2(in_links)) / (1 + self.depth_weight * depth)
+
+    def expected_links(self, prefix):
+        """New links a page of this prefix is expected to yield"""
+        fetched, failed, found = self.prefixes.get(prefix, (0, 0, 0))
+        prior = 2 * (self.found + 1) / (self.fetched + 1)
+        return (found + prior) / (fetched + 1) * (1 - failed / (fetched + 2))
+
+    def append(self, item):
+        url, depth = item
+        entry = self.entries.get(url)
+        if entry is None:
+            prefix = route_keys(url, self.prefix_segments)[1]
+            entry = self.entries[url] = [depth, 1, 0, prefix, next(self.order)]
+        else:
+            # Another page links here: the new weight supersedes the queued one
+            entry[0] = min(entry[0], depth)
+            entry[1] += 1
+            entry[2] += 1
+        heapq.heappush(self.queues.setdefault(entry[3], []),
+                       (-self.weight(entry), entry[4], entry[2], url))
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def appendleft(self, item):
+        self.urgent.append(item)
+
+    def top(self, prefix):
+        """The current top entry of a prefix's queue, dropping superseded ones; None once empty"""
+        heap = self.queues[prefix]
+        while heap:
+            _, _, version, url = heap[0]
+            entry = self.entries.get(url)
+            if entry is not None and entry[2] == version:
+                return heap[0]
+            heapq.heappop(heap)
+        del self.queues[prefix]
+        return None
+
+    def popleft(self):
+        if self.urgent:
+            return self.urgent.popleft()
+        best = best_key = None
+        for prefix in list(self.queues):
+            top = self.top(prefix)
+            if top is None:
+                continue
+            # Highest expected yield first, then the earliest queued
+            key = (-self.expected_links(prefix) * -top[0], top[1])
+            if best_key is None or key < best_key:
+                best, best_key = prefix, key
+        if best is None:
+            raise IndexError("pop from an empty frontier")
+        url = heapq.heappop(self.queues[best])[3]
+        return url, self.entries.pop(url)[0]
+
+    def record(self, url, ok, links):
+        """Count a fetched page against its path prefix; `links` is the crawl's link total after it"""
+        found = max(0, links - self.links)
+        self.links = links
+        stats = self.prefixes.setdefault(route_keys(url, self.prefix_segments)[1], [0, 0, 0])
+        stats[0] += 1
+        stats[1] += not ok
+        stats[2] += found
+        self.fetched += 1
+        self.found += found
+
+
+class CoverageCurve:
+    """Unique links found against time into the crawl"""
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self.started = clock()
+        self.points = []  # (seconds, links, pages)
+
+    def start(self):
+        self.started = self.clock()
+        self.points = []
+
+    def record(self, links, pages):
+        if not self.points or links != self.points[-1][1]:
+            self.points.append((self.clock() - self.started, links, pages))
+
+    def finish(self, links, pages):
+        """Close the curve at the end of the crawl"""
+        self.points.append((self.clock() - self.started, links, pages))
+
+    def links_at(self, seconds):
+        links = 0
+        for at, found, _ in self.points:
+            if at > seconds:
+                break
+            links = found
+        return links
+
+    def area(self):
+        """Mean share of the final links found over the crawl (1.0: all at once)"""
+        if not self.points or not self.points[-1][0] or not self.points[-1][1]:
+            return 0.0
+        total, final = self.points[-1][0], self.points[-1][1]
+        area = 0.0
+        for (at, links, _), (next_at, _, _) in zip(self.points, self.points[1:]):
+            area += links * (next_at - at)
+        return area / (total * final)
+
+    def summary(self, steps=5):
+        if not self.points:
+            return "Coverage: no pages crawled"
+        total, final = self.points[-1][0], self.points[-1][1]
+        lines = [f"Coverage over time ({final} links in {total:.2f}s, area {self.area():.2f}):"]
+        for step in range(1, steps + 1):
+            at = total * step / steps
+            links = self.links_at(at)
+            lines.append(f"  {at:6.2f}s: {links} links ({links / final:.0%})")
+        return '\n'.join(lines)
+
+    def save(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump([{'seconds': round(at, 4), 'links': links, 'pages': pages}
+                       for at, links, pages in self.points], f)
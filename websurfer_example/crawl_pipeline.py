@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Crawl Pipeline shared by the requests-based scrapers
+The steps BFSWebScraper and SimpleBFSWebScraper run alike once a page is in
+hand, or before the first one is fetched, so each lives in one place: seeding
+the frontier from robots.txt and the sitemap, extracting a page's links and
+queueing them, and feeding finished pages to the crawl's instruments. The
+scrapers keep their own fetching and crawl loops
+"""
+
+import base64
+import time
+from urllib.parse import urljoin
+
+from js_links import scan_script_links
+from profiling import profiled
+from site_seeds import load_site_seeds
+from streaming_parser import stream_page, tag_links
+
+
+class CrawlPipeline:
+    """Mixin for scrapers with base_url, session, url_filter, queue, all_links, visited and friends"""
+
+    @profiled('seed')
+    def seed_frontier(self):
+        """Apply robots.txt rules and queue every page listed in the sitemap"""
+        seeds = load_site_seeds(self.base_url, self.session)
+        seeds.apply_to(self.url_filter)
+        if seeds.crawl_delay > self.delay:
+            print(f"Using crawl delay from robots.txt: {seeds.crawl_delay}s")
+            self.delay = seeds.crawl_delay
+        
+        # Sitemap pages are one hop from the start page
+        urls = self.url_filter.scope(self.url_filter.filter(seeds.urls))
+        for url in urls:
+            self.all_links.add(url)
+            self.queue.append((url, 1))
+        print(f"Seeded {len(urls)} URLs from the sitemap")
+
+    def next_target(self):
+        """Pop the next URL to fetch from the queue
+        
+        Returns (url, final URL, depth), or None when the popped URL is skipped.
+        """
+        current_url, depth = self.queue.popleft()
+        
+        # Redirect sources are fetched through their final URL, once
+        target_url = self.redirects.resolve(current_url)
+        if current_url in self.visited or target_url in self.visited or depth > self.max_depth:
+            return None
+        
+        # Don't spend a timeout on a prefix that keeps failing
+        if not self.breaker.allow(target_url):
+            print(f"Skipped (breaker open): {current_url}")
+            self.breaker.skip(target_url, (current_url, depth))
+            self.skipped_count += 1
+            return None
+        
+        if target_url != current_url:
+            print(f"Crawling (depth {depth}): {current_url} -> {target_url}")
+        else:
+            print(f"Crawling (depth {depth}): {current_url}")
+        self.visited.add(current_url)
+        self.visited.add(target_url)
+        return current_url, target_url, depth
+
+    @profiled('extract')
+    def extract_links(self, url, html_content):
+        """Extract all links from HTML content including dynamic ones"""
+        # Duplicate and near-duplicate pages reuse their template's parsed links
+        raw_links = self.fingerprints.raw_links(url, html_content, self.parse_tag_links,
+                                                self.scan_script_links)
+        return self.url_filter.filter(urljoin(url, raw) for raw in raw_links)
+
+    @profiled('parse')
+    def parse_tag_links(self, html_content):
+        """Find link targets in tags and attributes, before resolving them against the page URL"""
+        if self.parser == 'tokenizer':
+            return tag_links(html_content)
+        # Loaded on first use, so crawls with the tokenizer never import bs4
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(html_content, self.parser)
+        links = []
+        
+        # Extract links from <a> tags
+        for link in soup.find_all('a', href=True):
+            href = link['href']
+            links.append(href)
+        
+        # Extract links from data attributes
+        for element in soup.find_all(attrs={'data-url': True}):
+            href = element['data-url']
+            links.append(href)
+        
+        for element in soup.find_all(attrs={'data-href': True}):
+            href = element['data-href']
+            links.append(href)
+        
+        # Extract links from form actions
+        for form in soup.find_all('form', action=True):
+            action = form['action']
+            links.append(action)
+        
+        return links
+
+    @profiled('scripts')
+    def scan_script_links(self, html_content):
+        """Find link targets built by inline scripts and event handlers"""
+        return scan_script_links(html_content)
+
+    def decode_base64_url(self, url):
+        """Decode base64-encoded URLs if possible"""
+        try:
+            # Check if URL contains /decode/ followed by base64
+            if '/decode/' in url:
+                parts = url.split('/decode/')
+                if len(parts) == 2:
+                    encoded_part = parts[1]
+                    # Try to decode the base64 part
+                    decoded_bytes = base64.b64decode(encoded_part)
+                    decoded_path = decoded_bytes.decode('utf-8')
+                    return decoded_path
+        except:
+            pass
+        return url
+
+    @profiled('urls')
+    def queue_links(self, links, depth, page=None):
+        """Record links found on `page` at `depth` and queue the ones in scope"""
+        # Add all valid links to results
+        self.all_links.update(links)
+        if self.records is not None and page is not None:
+            for link in links:
+                self.records.link(page, link, depth + 1)
+        
+        # Only crawl links in scope (same domain by default)
+        for link in self.url_filter.scope(links):
+            if link not in self.visited:
+                # Resolve base64 URLs locally instead of fetching the redirect
+                if '/decode/' in link:
+                    decoded_url = self.decode_base64_url(link)
+                    if decoded_url != link:
+                        # Construct full decoded URL
+                        if decoded_url.startswith('/'):
+                            decoded_full_url = self.base_url + decoded_url
+                        else:
+                            decoded_full_url = urljoin(self.base_url, decoded_url)
+                        
+                        # Add decoded URL to results and remember the redirect
+                        self.all_links.add(decoded_full_url)
+                        self.redirects.record(link, decoded_full_url)
+                        if self.records is not None:
+                            self.records.redirect(link, decoded_full_url)
+                
+                # Queue the link unless its final URL was already crawled
+                if self.redirects.resolve(link) not in self.visited:
+                    self.queue.append((link, depth + 1))
+
+    @profiled('stream')
+    def stream_links(self, response, depth):
+        """Parse a streamed body as it arrives, queueing tag links as soon as they are found"""
+        found = set()
+        
+        def on_links(raw_links):
+            links = [link for link in self.url_filter.filter(urljoin(response.url, raw) for raw in raw_links)
+                     if link not in found]
+            found.update(links)
+            self.queue_links(links, depth, response.url)
+        
+        page = stream_page(response, time.monotonic() + self.body_deadline, on_links)
+        self.transfer.record(response, page.decoded_bytes)
+        
+        # Script links can span chunks, so they are scanned once the body is done
+        on_links(self.scan_script_links(page.text))
+        if not page.complete:
+            print(f"Body of {response.url} cut short ({page.error}), keeping {len(found)} links")
+        self.stream_stats.record(page, found)
+
+    def page_done(self, url, ok):
+        """Feed a finished page to the coverage curve and the best-first frontier"""
+        self.coverage.record(len(self.all_links), self.crawled_count)
+        if self.best_first:
+            self.queue.record(url, ok, len(self.all_links))
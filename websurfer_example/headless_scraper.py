@@ -7,9 +7,14 @@ Uses Selenium with Chrome headless to execute JavaScript and capture dynamic lin
 import time
 import signal
 import sys
-import base64
-import re
-from urllib.parse import urljoin, urlparse
+from crawl_pipeline import CrawlPipeline
+from redirect_map import RedirectMap
+from url_filter import UrlFilter
+from circuit_breaker import FAILURE, OK, TIMEOUT, CircuitBreaker
+from js_links import scan_script_links
+from network_log import BLOCKED_URL_PATTERNS, BLOCKING_PREFS, NetworkCapture, PageLoadStats
+from profiling import NullProfiler, profiled
+from urllib.parse import urljoin
 from collections import deque
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -18,8 +23,10 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException, WebDriverException
 
-class HeadlessBFSWebScraper:
-    def __init__(self, base_url, max_depth=3, delay=1, js_wait_time=3):
+class HeadlessBFSWebScraper(CrawlPipeline):
+    def __init__(self, base_url, max_depth=3, delay=1, js_wait_time=3, url_filter=None, use_sitemap=True,
+                 breaker=None, block_resources=True, capture_network=True, launch=True,
+                 profiler=None):
         """
         Initialize the headless BFS web scraper
         
@@ -28,6 +35,13 @@ class HeadlessBFSWebScraper:
             max_depth (int): Maximum depth to crawl
             delay (float): Delay between requests in seconds
             js_wait_time (float): Time to wait for JavaScript to load
+            url_filter (UrlFilter): Link filter and crawl scope (default: same host as base_url)
+            use_sitemap (bool): Honour robots.txt and seed the queue from the sitemap
+            breaker (CircuitBreaker): Skips hosts and path prefixes that keep failing
+            block_resources (bool): Don't download images, stylesheets, fonts and media
+            capture_network (bool): Add the URLs of every document, XHR and fetch request a page makes
+            launch (bool): Start Chrome now; otherwise start_driver() must be called before crawling
+            profiler (StageProfiler): Times page loads, DOM link extraction and saving
         """
         self.base_url = base_url
         self.max_depth = max_depth
@@ -36,6 +50,21 @@ class HeadlessBFSWebScraper:
         self.visited = set()
         self.queue = deque([(base_url, 0)])
         self.all_links = set()
+        self.redirects = RedirectMap()
+        self.records = None
+        # Chrome loads the pages; robots.txt and the sitemap are read without a session
+        self.session = None
+        self.url_filter = url_filter or UrlFilter(base_url)
+        self.use_sitemap = use_sitemap
+        self.breaker = breaker or CircuitBreaker()
+        self.block_resources = block_resources
+        self.capture_network = capture_network
+        self.network = NetworkCapture()
+        self.profiler = profiler or NullProfiler()
+        self.page_loads = PageLoadStats()
+        self.crawled_count = 0
+        self.error_count = 0
+        self.skipped_count = 0
         
         # Setup Chrome options for headless browsing
         self.chrome_options = Options()
@@ -45,56 +74,65 @@ class HeadlessBFSWebScraper:
         self.chrome_options.add_argument("--disable-gpu")
         self.chrome_options.add_argument("--window-size=1920,1080")
         self.chrome_options.add_argument("--user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
+        if block_resources:
+            self.chrome_options.add_experimental_option('prefs', BLOCKING_PREFS)
+        if capture_network:
+            # DevTools Network events end up in driver.get_log('performance')
+            self.chrome_options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
         
         # Initialize the driver
         self.driver = None
-        self.setup_driver()
+        if launch:
+            self.setup_driver()
+    
+    def start_driver(self):
+        """Start Chrome, raising if it cannot be started"""
+        self.driver = webdriver.Chrome(options=self.chrome_options)
+        self.driver.set_page_load_timeout(10)
+        print("✓ Chrome WebDriver initialized successfully")
+        if self.block_resources:
+            self.block_resource_urls()
     
     def setup_driver(self):
         """Initialize the Chrome WebDriver"""
         try:
-            self.driver = webdriver.Chrome(options=self.chrome_options)
-            self.driver.set_page_load_timeout(10)
-            print("✓ Chrome WebDriver initialized successfully")
+            self.start_driver()
         except Exception as e:
             print(f"✗ Failed to initialize Chrome WebDriver: {e}")
             print("Make sure Chrome and chromedriver are installed")
             sys.exit(1)
     
-    def is_valid_url(self, url):
-        """Check if URL is valid (including external URLs)"""
+    def block_resource_urls(self):
+        """Have Chrome drop stylesheet, font and media requests (images are blocked by prefs)"""
         try:
-            parsed = urlparse(url)
-            
-            # Skip non-HTTP/HTTPS URLs
-            if parsed.scheme not in ['http', 'https']:
-                return False
-            
-            # Skip common non-content URLs
-            skip_extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.gif', '.css', '.js', '.xml', '.zip', '.tar', '.gz']
-            if any(url.lower().endswith(ext) for ext in skip_extensions):
-                return False
-            
-            return True
-        except:
-            return False
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        except (AttributeError, WebDriverException) as e:
+            # Not a Chromium driver, or DevTools is unavailable
+            print(f"Resource blocking unavailable: {e}")
+    
+    def network_links(self):
+        """Return the page and endpoint URLs requested since the last call"""
+        if not self.capture_network:
+            return []
+        try:
+            return self.network.read(self.driver.get_log('performance'))
+        except WebDriverException:
+            return []
     
-    def decode_base64_url(self, url):
-        """Decode base64-encoded URLs if possible"""
+    def page_heap_bytes(self):
+        """JavaScript heap in use by the current tab, when Chrome reports it"""
         try:
-            # Check if URL contains /decode/ followed by base64
-            if '/decode/' in url:
-                parts = url.split('/decode/')
-                if len(parts) == 2:
-                    encoded_part = parts[1]
-                    # Try to decode the base64 part
-                    decoded_bytes = base64.b64decode(encoded_part)
-                    decoded_path = decoded_bytes.decode('utf-8')
-                    return decoded_path
-        except:
-            pass
-        return url
+            return self.driver.execute_script(
+                "return window.performance && performance.memory ? performance.memory.usedJSHeapSize : null")
+        except WebDriverException:
+            return None
+    
+    def is_valid_url(self, url):
+        """Check if URL is valid (including external URLs)"""
+        return self.url_filter.allows(url)
     
+    @profiled('extract')
     def extract_links_from_dom(self, url):
         """Extract all links from the rendered DOM"""
         links = []
@@ -113,37 +151,17 @@ class HeadlessBFSWebScraper:
             for element in anchor_elements:
                 try:
                     href = element.get_attribute("href")
-                    if href and self.is_valid_url(href):
+                    if href:
                         links.append(href)
                 except:
                     continue
             
-            # Extract links from JavaScript variables (from page source)
-            page_source = self.driver.page_source
-            
-            # Look for common URL patterns in JavaScript
-            js_patterns = [
-                r'["\']([^"\']*\.php[^"\']*)["\']',  # PHP files
-                r'["\']([^"\']*\.html?[^"\']*)["\']',  # HTML files
-                r'["\']([^"\']*\.js[^"\']*)["\']',  # JS files
-                r'["\']([^"\']*\.json[^"\']*)["\']',  # JSON endpoints
-                r'["\']([^"\']*\.xml[^"\']*)["\']',  # XML endpoints
-                r'["\']([^"\']*api/[^"\']*)["\']',  # API endpoints
-                r'["\']([^"\']*ajax/[^"\']*)["\']',  # AJAX endpoints
-                r'["\']([^"\']*\/[a-zA-Z0-9_-]+\/[^"\']*)["\']',  # General path patterns
-                r'["\']([^"\']*\?[^"\']*)["\']',  # URLs with query parameters
-            ]
+            # Links built by inline scripts that haven't run yet (e.g. click handlers)
+            for raw in scan_script_links(self.driver.page_source):
+                links.append(urljoin(url, raw))
             
-            for pattern in js_patterns:
-                matches = re.findall(pattern, page_source, re.IGNORECASE)
-                for match in matches:
-                    if match.startswith('http'):
-                        absolute_url = match
-                    else:
-                        absolute_url = urljoin(url, match)
-                    
-                    if self.is_valid_url(absolute_url):
-                        links.append(absolute_url)
+            # Every document, XHR and fetch request the page actually made
+            links.extend(self.network_links())
             
             # Extract links from data attributes
             data_url_elements = self.driver.find_elements(By.CSS_SELECTOR, "[data-url]")
@@ -152,8 +170,7 @@ class HeadlessBFSWebScraper:
                     href = element.get_attribute("data-url")
                     if href:
                         absolute_url = urljoin(url, href)
-                        if self.is_valid_url(absolute_url):
-                            links.append(absolute_url)
+                        links.append(absolute_url)
                 except:
                     continue
             
@@ -163,8 +180,7 @@ class HeadlessBFSWebScraper:
                     href = element.get_attribute("data-href")
                     if href:
                         absolute_url = urljoin(url, href)
-                        if self.is_valid_url(absolute_url):
-                            links.append(absolute_url)
+                        links.append(absolute_url)
                 except:
                     continue
             
@@ -175,20 +191,12 @@ class HeadlessBFSWebScraper:
                     action = element.get_attribute("action")
                     if action:
                         absolute_url = urljoin(url, action)
-                        if self.is_valid_url(absolute_url):
-                            links.append(absolute_url)
+                        links.append(absolute_url)
                 except:
                     continue
             
-            # Remove duplicates while preserving order
-            seen = set()
-            unique_links = []
-            for link in links:
-                if link not in seen:
-                    seen.add(link)
-                    unique_links.append(link)
-            
-            return unique_links
+            # Drop filtered and duplicate links in one pass
+            return self.url_filter.filter(links)
             
         except TimeoutException:
             print(f"Timeout waiting for page to load: {url}")
@@ -204,75 +212,76 @@ class HeadlessBFSWebScraper:
         print(f"JavaScript wait time: {self.js_wait_time}s")
         print("-" * 50)
         
-        crawled_count = 0
-        error_count = 0
+        if self.use_sitemap:
+            self.seed_frontier()
         
         while self.queue:
-            current_url, depth = self.queue.popleft()
-            
-            if current_url in self.visited or depth > self.max_depth:
+            # Probes and URLs whose circuit closed again go back in the queue
+            self.queue.extend(self.breaker.release())
+            item = self.next_target()
+            if item is None:
                 continue
-            
-            print(f"Crawling (depth {depth}): {current_url}")
-            self.visited.add(current_url)
+            current_url, target_url, depth = item
             
             try:
+                # Requests still logged from the previous page are links too
+                self.all_links.update(self.url_filter.filter(self.network_links()))
+                
                 # Navigate to the page
-                self.driver.get(current_url)
+                load_start = time.monotonic()
+                try:
+                    with self.profiler.stage('load'):
+                        self.driver.get(target_url)
+                except TimeoutException:
+                    self.breaker.record(target_url, TIMEOUT)
+                    raise
+                except WebDriverException:
+                    self.breaker.record(target_url, FAILURE)
+                    raise
+                self.breaker.record(target_url, OK)
+                self.page_loads.record(time.monotonic() - load_start, self.page_heap_bytes())
+                
+                # Remember redirects the browser followed
+                final_url = self.driver.current_url
+                if final_url and final_url != target_url:
+                    self.redirects.record(target_url, final_url)
+                    self.visited.add(final_url)
                 
                 # Add current URL to all_links
                 self.all_links.add(current_url)
                 
                 # Extract links from the rendered page
                 if depth < self.max_depth:
-                    links = self.extract_links_from_dom(current_url)
-                    
-                    for link in links:
-                        # Add all valid links to results
-                        self.all_links.add(link)
-                        
-                        # Only crawl internal links (same domain)
-                        parsed = urlparse(link)
-                        base_parsed = urlparse(self.base_url)
-                        if parsed.netloc == base_parsed.netloc and link not in self.visited:
-                            self.queue.append((link, depth + 1))
-                            
-                            # Also crawl decoded version if it's a base64 URL
-                            if '/decode/' in link:
-                                decoded_url = self.decode_base64_url(link)
-                                if decoded_url != link:
-                                    # Construct full decoded URL
-                                    if decoded_url.startswith('/'):
-                                        decoded_full_url = self.base_url + decoded_url
-                                    else:
-                                        decoded_full_url = urljoin(self.base_url, decoded_url)
-                                    
-                                    # Add decoded URL to results and crawl queue
-                                    self.all_links.add(decoded_full_url)
-                                    if decoded_full_url not in self.visited:
-                                        self.queue.append((decoded_full_url, depth + 1))
+                    links = self.extract_links_from_dom(final_url or target_url)
+                    self.queue_links(links, depth)
                 
-                crawled_count += 1
+                self.crawled_count += 1
                 
             except TimeoutException:
                 print(f"Timeout error crawling {current_url}")
-                error_count += 1
+                self.error_count += 1
             except WebDriverException as e:
                 print(f"WebDriver error crawling {current_url}: {e}")
-                error_count += 1
+                self.error_count += 1
             except Exception as e:
                 print(f"Unexpected error crawling {current_url}: {e}")
-                error_count += 1
+                self.error_count += 1
             
             # Delay between requests
             time.sleep(self.delay)
         
         print("-" * 50)
         print(f"Crawling completed!")
-        print(f"Successfully crawled: {crawled_count} URLs")
-        print(f"Errors encountered: {error_count} URLs")
+        print(f"Successfully crawled: {self.crawled_count} URLs")
+        print(f"Errors encountered: {self.error_count} URLs")
+        print(f"Skipped (breaker open): {self.skipped_count} fetches, {self.breaker.pending()} URLs never fetched")
         print(f"Total unique links found: {len(self.all_links)}")
+        print(self.page_loads.summary())
+        if self.capture_network:
+            print(self.network.summary())
+        self.breaker.print_report()
     
+    @profiled('save')
     def save_results(self, filename="results.txt"):
         """Save all discovered links to a file"""
         with open(filename, 'w', encoding='utf-8') as f:
@@ -287,8 +296,13 @@ class HeadlessBFSWebScraper:
                     if relative_path != "/" and relative_path.endswith("/"):
                         relative_path = relative_path[:-1]
                     
-                    # Decode base64 URLs if present
-                    decoded_path = self.decode_base64_url(relative_path)
+                    # Redirect sources (like /decode/ links) are written as "source -> target"
+                    target = self.redirects.redirect_target(link)
+                    if target is not None:
+                        decoded_path = target[len(self.base_url):] if target.startswith(self.base_url) else target
+                        decoded_path = decoded_path or "/"
+                    else:
+                        decoded_path = self.decode_base64_url(relative_path)
                     if decoded_path != relative_path:
                         # Remove trailing slash from decoded path too
                         if decoded_path != "/" and decoded_path.endswith("/"):
@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+HTTP Archive for offline crawler benchmarks
+Records every exchange a requests-based scraper makes (URL, status, headers,
+body as sent and timing) into one length-prefixed file with a sorted hash
+index, and replays them from a memory map through a transport adapter, so
+extraction and scheduling can be timed without a server or network, with the
+recorded latency optionally played back too
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib3._collections import HTTPHeaderDict
+
+from streaming_parser import READ_ERRORS, response_chunks
+
+MAGIC = b'SURFARC1'
+RECORD = struct.Struct('<II')           # metadata length, body length
+INDEX_ENTRY = struct.Struct('<QQ')      # URL key, record offset
+FOOTER = struct.Struct('<QQI8s')        # index offset, entries, archive metadata length, MAGIC
+
+# Errors an exchange can end with, so a replay raises what the live fetch did
+ERRORS = {error.__name__: error for error in (
+    requests.exceptions.ConnectTimeout, requests.exceptions.ReadTimeout,
+    requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError,
+    requests.exceptions.TooManyRedirects,
+)}
+
+
+def url_key(method, url):
+    """64-bit index key of a request"""
+    return int.from_bytes(hashlib.blake2b(f"{method} {url}".encode(), digest_size=8).digest(), 'little')
+
+
+def read_timeout(timeout):
+    """The read part of a requests timeout (a number, a (connect, read) pair or None)"""
+    return timeout[1] if isinstance(timeout, tuple) else timeout
+
+
+class Exchange:
+    """One recorded request and what came back"""
+
+    __slots__ = ('method', 'url', 'status', 'reason', 'headers', 'body', 'elapsed', 'error')
+
+    def __init__(self, method, url, status=None, reason='', headers=(), body=b'', elapsed=0.0, error=None):
+        self.method = method
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+        self.elapsed = elapsed
+        self.error = error
+
+    def meta(self):
+        return json.dumps([self.method, self.url, self.status, self.reason, self.headers,
+                           round(self.elapsed, 6), self.error], separators=(',', ':')).encode()
+
+
+class ArchiveWriter:
+    """Appends exchanges to an archive file; the index is written by close()
+
+    A URL recorded more than once is replayed from its last exchange.
+    """
+
+    def __init__(self, path, meta=None):
+        self.path = path
+        self.meta = dict(meta or {})
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.offsets = {}
+        self.records = 0
+        self.lock = threading.Lock()
+
+    def append(self, exchange):
+        meta = exchange.meta()
+        with self.lock:
+            offset = self.file.tell()
+            self.file.write(RECORD.pack(len(meta), len(exchange.body)))
+            self.file.write(meta)
+            self.file.write(exchange.body)
+            self.offsets[url_key(exchange.method, exchange.url)] = offset
+            self.records += 1
+        return exchange
+
+    def close(self):
+        with self.lock:
+            if self.file.closed:
+                return
+            index_offset = self.file.tell()
+            for key in sorted(self.offsets):
+                self.file.write(INDEX_ENTRY.pack(key, self.offsets[key]))
+            meta = json.dumps(self.meta).encode()
+            self.file.write(meta)
+            self.file.write(FOOTER.pack(index_offset, len(self.offsets), len(meta), MAGIC))
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class HttpArchive:
+    """Read-only view of an archive through mmap; lookups binary search the index"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < len(MAGIC) + FOOTER.size or self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not an HTTP archive")
+        self.index_offset, self.entries, meta_length, magic = FOOTER.unpack_from(self.map, len(self.map) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{path} was not closed properly (no index)")
+        meta_offset = self.index_offset + self.entries * INDEX_ENTRY.size
+        self.meta = json.loads(self.map[meta_offset:meta_offset + meta_length])
+
+    def __len__(self):
+        return self.entries
+
+    def find(self, method, url):
+        """Offset of a request's record, or None"""
+        key = url_key(method, url)
+        lo, hi = 0, self.entries
+        while lo < hi:
+            mid = (lo + hi) // 2
+            mid_key, offset = INDEX_ENTRY.unpack_from(self.map, self.index_offset + mid * INDEX_ENTRY.size)
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return offset
+        return None
+
+    def record_at(self, offset):
+        meta_length, body_length = RECORD.unpack_from(self.map, offset)
+        start = offset + RECORD.size
+        method, url, status, reason, headers, elapsed, error = json.loads(self.map[start:start + meta_length])
+        body = self.map[start + meta_length:start + meta_length + body_length]
+        return Exchange(method, url, status, reason, headers, body, elapsed, error)
+
+    def get(self, method, url):
+        """The recorded exchange for a request, or None"""
+        offset = self.find(method, url)
+        if offset is None:
+            return None
+        exchange = self.record_at(offset)
+        # Two URLs sharing a 64-bit key is possible, just very unlikely
+        return exchange if exchange.url == url and exchange.method == method else None
+
+    def __iter__(self):
+        """Every record in the order it was written, repeats included"""
+        offset = len(MAGIC)
+        while offset < self.index_offset:
+            exchange = self.record_at(offset)
+            yield exchange
+            meta_length, body_length = RECORD.unpack_from(self.map, offset)
+            offset += RECORD.size + meta_length + body_length
+
+    def close(self):
+        self.map.close()
+
+
+def build_response(adapter, request, exchange):
+    """A requests response whose body is read from the exchange, decoded like a live one"""
+    raw = HTTPResponse(body=io.BytesIO(exchange.body), headers=HTTPHeaderDict(exchange.headers),
+                       status=exchange.status, reason=exchange.reason, preload_content=False,
+                       request_method=request.method, request_url=request.url)
+    return adapter.build_response(request, raw)
+
+
+def raise_recorded(request, exchange):
+    error = ERRORS.get(exchange.error, requests.exceptions.ConnectionError)
+    raise error(f"{exchange.error} for {exchange.url} (recorded)", request=request)
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Transport that fetches live and appends each exchange to an ArchiveWriter
+
+    Bodies are read in full (still compressed) before the response is handed
+    on, within the request's read timeout, so a body that never finishes is
+    recorded and raised as a ReadTimeout.
+    """
+
+    def __init__(self, writer, **kwargs):
+        super().__init__(**kwargs)
+        self.writer = writer
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        start = time.monotonic()
+        limit = read_timeout(timeout)
+        try:
+            response = super().send(request, stream=True, timeout=timeout, verify=verify,
+                                    cert=cert, proxies=proxies)
+            chunks = []
+            try:
+                for chunk in response_chunks(response, 65536, decode_content=False):
+                    chunks.append(chunk)
+                    if limit is not None and time.monotonic() - start > limit:
+                        raise requests.exceptions.ReadTimeout(f"body of {request.url} still arriving",
+                                                              request=request)
+            finally:
+                response.close()
+        except requests.exceptions.RequestException as e:
+            self.writer.append(Exchange(request.method, request.url, elapsed=time.monotonic() - start,
+                                        error=e.__class__.__name__))
+            raise
+        except READ_ERRORS as e:
+            self.writer.append(Exchange(request.method, request.url, elapsed=time.monotonic() - start,
+                                        error='ConnectionError'))
+            raise requests.exceptions.ConnectionError(e, request=request)
+        exchange = self.writer.append(Exchange(
+            request.method, request.url, response.status_code, response.reason,
+            list(response.raw.headers.items()), b''.join(chunks), time.monotonic() - start))
+        return build_response(self, request, exchange)
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Transport that answers from an HttpArchive instead of the network
+
+    `latency` scales the recorded response times that are waited out (0 serves
+    at once; 1 as recorded), and a recorded time longer than the request's read
+    timeout times out as it would have live. A request missing from the
+    archive fails with ConnectionError.
+    """
+
+    def __init__(self, archive, latency=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = archive
+        self.latency = latency
+        self.hits = 0
+        self.misses = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        exchange = self.archive.get(request.method, request.url)
+        if exchange is None:
+            self.misses += 1
+            raise requests.exceptions.ConnectionError(f"{request.method} {request.url} is not in the archive",
+                                                      request=request)
+        self.hits += 1
+        if self.latency:
+            wait = exchange.elapsed * self.latency
+            limit = read_timeout(timeout)
+            if limit is not None and wait > limit:
+                time.sleep(limit)
+                raise requests.exceptions.ReadTimeout(f"{request.url} took {wait:.2f}s (recorded)",
+                                                      request=request)
+            time.sleep(wait)
+        if exchange.error:
+            raise_recorded(request, exchange)
+        return build_response(self, request, exchange)
+
+
+def mount(session, adapter):
+    """Send all of a session's http and https requests through an adapter"""
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+
+def crawler_class(name):
+    """Import a requests-based scraper class by its benchmark name"""
+    import importlib
+
+    from benchmark import CRAWLERS
+    module_name, class_name, options = CRAWLERS[name]
+    return getattr(importlib.import_module(module_name), class_name), options
+
+
+def run_crawl(name, base_url, max_depth, transport):
+    """Run one crawl with its output silenced; returns (scraper, seconds)"""
+    scraper_class, options = crawler_class(name)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        scraper = scraper_class(base_url=base_url, max_depth=max_depth, delay=0, transport=transport, **options)
+        try:
+            scraper.crawl()
+        finally:
+            if hasattr(scraper, 'cleanup'):
+                scraper.cleanup()
+    return scraper, time.perf_counter() - start
+
+
+def record(path, base_url, crawlers, max_depth):
+    """Crawl a live site with each crawler in turn, recording into one archive"""
+    meta = {'base_url': base_url, 'max_depth': max_depth, 'crawlers': crawlers,
+            'recorded': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    with ArchiveWriter(path, meta) as writer:
+        for name in crawlers:
+            scraper, seconds = run_crawl(name, base_url, max_depth, RecordingAdapter(writer))
+            print(f"   {name}: {len(scraper.visited)} pages in {seconds:.2f}s")
+        records, urls = writer.records, len(writer.offsets)
+    print(f"📼 Recorded {records} exchanges ({urls} distinct requests) to {path} "
+          f"({os.path.getsize(path) >> 10}KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record crawls into an HTTP archive and replay them offline")
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help="Crawl a live site and record every exchange")
+    record_parser.add_argument('archive')
+    record_parser.add_argument('--base-url', default='http://localhost:8000')
+    record_parser.add_argument('--crawler', action='append',
+                               help="Crawler(s) whose requests to record (repeatable, default: bfs)")
+    record_parser.add_argument('--max-depth', type=int, default=3)
+    replay_parser = commands.add_parser('replay', help="Crawl the archive instead of the site")
+    replay_parser.add_argument('archive')
+    replay_parser.add_argument('--crawler', default='bfs')
+    replay_parser.add_argument('--latency', type=float, default=0.0,
+                               help="Wait this multiple of each recorded response time (default: 0)")
+    replay_parser.add_argument('--repeat', type=int, default=1, help="Crawls to time")
+    info_parser = commands.add_parser('info', help="Summarize an archive")
+    info_parser.add_argument('archive')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.archive, args.base_url, args.crawler or ['bfs'], args.max_depth)
+        return 0
+
+    archive = HttpArchive(args.archive)
+    if args.command == 'info':
+        statuses = {}
+        size = records = 0
+        for exchange in archive:
+            records += 1
+            key = exchange.error or str(exchange.status)
+            statuses[key] = statuses.get(key, 0) + 1
+            size += len(exchange.body)
+        print(f"📼 {args.archive}: {records} exchanges of {len(archive)} requests, {size >> 10}KB of bodies, recorded "
+              f"{archive.meta.get('recorded')} from {archive.meta.get('base_url')}")
+        print("   " + ", ".join(f"{key}: {count}" for key, count in sorted(statuses.items())))
+        return 0
+
+    for run in range(args.repeat):
+        transport = ReplayAdapter(archive, latency=args.latency)
+        scraper, seconds = run_crawl(args.crawler, archive.meta['base_url'], archive.meta['max_depth'], transport)
+        print(f"   {args.crawler} replay {run + 1}: {len(scraper.visited)} pages, {len(scraper.all_links)} links "
+              f"in {seconds:.3f}s ({transport.hits} served, {transport.misses} not in the archive)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
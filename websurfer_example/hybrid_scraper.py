@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Hybrid Web Scraper
+Crawls with plain HTTP requests like BFSWebScraper and only loads the pages
+that carry scripts in a headless browser, adding the links of their rendered
+DOM, so a mostly static site costs requests-speed crawling plus one browser
+load per scripted page instead of one per page. Selenium and Chrome are only
+loaded once the first scripted page turns up; without them the crawl carries
+on with the static links alone
+"""
+
+import re
+import time
+
+from web_scraper import BFSWebScraper
+
+# Pages worth rendering: anything with a script or an inline event handler
+SCRIPTED = re.compile(r'<script\b|\son[a-z]+\s*=', re.IGNORECASE)
+
+
+class HybridBFSWebScraper(BFSWebScraper):
+    def __init__(self, base_url, js_wait_time=1, render=True, **kwargs):
+        """
+        Args:
+            base_url (str): The starting URL to crawl
+            js_wait_time (float): Time to wait for a rendered page's JavaScript
+            render (bool): Load scripted pages in the browser; False crawls like BFSWebScraper
+            **kwargs: Passed on to BFSWebScraper; pages are always buffered, so streaming is off
+        """
+        kwargs['streaming'] = False
+        super().__init__(base_url, **kwargs)
+        self.js_wait_time = js_wait_time
+        self.render = render
+        self.renderer = None
+        self.rendered = 0
+        self.render_seconds = 0.0
+        self.rendered_links = 0
+
+    def start_renderer(self):
+        """Start the headless browser the first time a page needs it; False if it can't run here"""
+        if self.renderer is not None:
+            return True
+        try:
+            from headless_scraper import HeadlessBFSWebScraper
+            renderer = HeadlessBFSWebScraper(self.base_url, js_wait_time=self.js_wait_time,
+                                             url_filter=self.url_filter, use_sitemap=False, launch=False)
+            renderer.start_driver()
+        except Exception as e:
+            print(f"⚠️  Headless rendering unavailable ({e}); keeping static links only")
+            self.render = False
+            return False
+        self.renderer = renderer
+        return True
+
+    def extract_links(self, url, html_content):
+        """Static links, plus the rendered DOM's links for pages with scripts"""
+        links = super().extract_links(url, html_content)
+        if not self.render or not SCRIPTED.search(html_content) or not self.start_renderer():
+            return links
+        start = time.monotonic()
+        try:
+            with self.profiler.stage('render'):
+                self.renderer.driver.get(url)
+                rendered = self.renderer.extract_links_from_dom(self.renderer.driver.current_url or url)
+        except Exception as e:
+            print(f"Rendering failed for {url}: {e}")
+            return links
+        finally:
+            self.render_seconds += time.monotonic() - start
+        self.rendered += 1
+        combined = self.url_filter.filter(links + rendered)
+        self.rendered_links += len(combined) - len(links)
+        return combined
+
+    def crawl(self):
+        super().crawl()
+        print(f"Rendered {self.rendered}/{self.crawled_count} pages in the browser "
+              f"({self.render_seconds:.2f}s), adding {self.rendered_links} links")
+
+    def cleanup(self):
+        super().cleanup()
+        if self.renderer is not None:
+            self.renderer.cleanup()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Static JavaScript Link Discovery for the requests-based scrapers
+Tokenizes only <script> blocks and inline event handlers, instead of running
+quote-delimited regexes over the whole document. It picks up string literals
+and template literal pieces, href/location assignments and fetch()/open()
+arguments, folding simple constant concatenation, so links that JavaScript
+builds are found at static parse speed, without a browser
+"""
+
+import html
+import re
+
+from streaming_parser import LinkTokenizer
+
+# Inline <script> blocks; ones with a src or a non-JavaScript type are skipped below
+SCRIPT_BLOCK = re.compile(r'<script\b([^>]*)>(.*?)</script\s*>', re.S | re.I)
+SCRIPT_SRC_OR_TYPE = re.compile(r'''\b(src|type)\s*=\s*["']?([^"'\s>]*)''', re.I)
+JS_TYPES = ('', 'text/javascript', 'application/javascript', 'module')
+
+# Event handler attributes (onclick="...") and javascript: links
+INLINE_HANDLER = re.compile(r'''\son[a-z]+\s*=\s*(?:"([^"]*)"|'([^']*)')''', re.I)
+JAVASCRIPT_HREF = re.compile(r'''\shref\s*=\s*(?:"\s*javascript:([^"]*)"|'\s*javascript:([^']*)')''', re.I)
+
+TOKEN = re.compile(r'''
+    (?P<space>\s+|//[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+  | (?P<name>[A-Za-z_$][\w$]*)
+  | (?P<number>\.?\d[\w.]*)
+  | (?P<punct>=>|[=!]==?|[-+*/%&|^<>]=|&&|\|\||\?\?|\?\.|\.\.\.|[{}()\[\];,.:+=?<>!&|*/%^~-])
+''', re.S | re.X)
+REGEX_LITERAL = re.compile(r'/(?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+/[a-z]*')
+ESCAPE = re.compile(r'''\\(u\{[0-9a-fA-F]+\}|u[0-9a-fA-F]{4}|x[0-9a-fA-F]{2}|\r\n|.)''', re.S)
+ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f', 'v': '\v', '0': '\0',
+           '\n': '', '\r\n': ''}
+
+# A '/' after one of these starts a regular expression, not a division
+REGEX_AFTER_NAMES = {'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void',
+                     'throw', 'instanceof', 'yield', 'await'}
+
+# Where any string is a link target, whatever it looks like
+LINK_PROPERTIES = {'href', 'url', 'link', 'src', 'action', 'path', 'endpoint', 'location'}
+LINK_CALLS = {'fetch', 'open', 'assign', 'replace', 'pushState', 'replaceState', 'getJSON', 'ajax',
+              'get', 'post', 'load'}
+DECLARATIONS = {'const', 'let', 'var'}
+HTTP_METHODS = {'GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'}
+
+# Elsewhere a string must look like a URL or a page file
+URL_SHAPE = re.compile(r'''^(?:https?://|//|\.{0,2}/)[^\s<>"'`]+$|^[\w.~-]+(?:/[\w.~-]+)*\.(?:html?|php|aspx?|json|xml)(?:[?#][^\s<>"'`]*)?$''')
+
+# Stands in for the unknown values of template expressions
+HOLE = '\x00'
+
+# Templates nested deeper than this inside ${...} are read as plain text, so
+# tokenizing (and folding, which follows the nesting) stays within the stack
+MAX_TEMPLATE_NESTING = 32
+
+
+class Template:
+    """A template literal: its text pieces and the tokens of each ${...} between them"""
+
+    def __init__(self, pieces, expressions):
+        self.pieces = pieces
+        self.expressions = expressions
+
+
+def unescape(body):
+    """Decode the escapes of a JavaScript string literal's body"""
+    def replace(match):
+        escape = match.group(1)
+        if escape[0] in 'ux' and len(escape) > 1:
+            return chr(int(escape[1:].strip('{}'), 16))
+        return ESCAPES.get(escape, escape)
+    return ESCAPE.sub(replace, body) if '\\' in body else body
+
+
+def tokenize(source, pos=0, in_template=False, nesting=0):
+    """Split JavaScript into (kind, value) tokens; returns (tokens, end position)
+
+    Kinds are 'string' (decoded), 'template' (a Template), 'name', 'number',
+    'regex' and 'punct'. With in_template, stops at the '}' closing a ${...};
+    `nesting` counts the templates around it. Malformed input never raises;
+    unknown characters are skipped.
+    """
+    tokens = []
+    depth = 0
+    end = len(source)
+    while pos < end:
+        char = source[pos]
+        if char == '`':
+            template, pos = read_template(source, pos + 1, nesting)
+            tokens.append(('template', template))
+            continue
+        if char == '/' and source[pos + 1:pos + 2] not in ('/', '*') and starts_regex(tokens):
+            match = REGEX_LITERAL.match(source, pos)
+            if match:
+                tokens.append(('regex', match.group()))
+                pos = match.end()
+                continue
+        match = TOKEN.match(source, pos)
+        if match is None:
+            pos += 1
+            continue
+        pos = match.end()
+        kind = match.lastgroup
+        if kind == 'space':
+            continue
+        value = match.group()
+        if kind == 'string':
+            value = unescape(value[1:-1])
+        elif kind == 'punct' and in_template:
+            if value == '{':
+                depth += 1
+            elif value == '}':
+                if not depth:
+                    return tokens, pos
+                depth -= 1
+        tokens.append((kind, value))
+    return tokens, pos
+
+
+def starts_regex(tokens):
+    """Whether a '/' after these tokens begins a regular expression literal"""
+    if not tokens:
+        return True
+    kind, value = tokens[-1]
+    if kind == 'name':
+        return value in REGEX_AFTER_NAMES
+    return kind == 'punct' and value not in (')', ']', '}')
+
+
+def read_template(source, pos, nesting=0):
+    """Read a template literal from just after its opening backtick
+
+    Past MAX_TEMPLATE_NESTING, a ${...} is kept as text instead of tokenized.
+    """
+    pieces, expressions, text = [], [], []
+    end = len(source)
+    while pos < end:
+        char = source[pos]
+        if char == '\\':
+            text.append(source[pos:pos + 2])
+            pos += 2
+        elif char == '`':
+            pos += 1
+            break
+        elif source.startswith('${', pos) and nesting < MAX_TEMPLATE_NESTING:
+            pieces.append(unescape(''.join(text)))
+            text = []
+            tokens, pos = tokenize(source, pos + 2, in_template=True, nesting=nesting + 1)
+            expressions.append(tokens)
+        else:
+            text.append(char)
+            pos += 1
+    pieces.append(unescape(''.join(text)))
+    return Template(pieces, expressions), pos
+
+
+def evaluate(tokens, i, constants):
+    """Fold the expression starting at tokens[i] if it only joins strings and known constants
+
+    Returns ((value, text), next index). value is None when any part is
+    unknown; text has HOLE for each unknown ${...} so markup in it can still
+    be parsed, and is None when the expression is not a string at all.
+    """
+    parts = []
+    known = True
+    while i < len(tokens):
+        kind, value = tokens[i]
+        if kind == 'string':
+            parts.append(value)
+        elif kind == 'template':
+            text = value.pieces[0]
+            for expression, piece in zip(value.expressions, value.pieces[1:]):
+                (folded, _), end = evaluate(expression, 0, constants)
+                if folded is None or end != len(expression):
+                    known = False
+                    folded = HOLE
+                text += folded + piece
+            parts.append(text)
+        elif kind == 'name' and value in constants:
+            parts.append(constants[value])
+        else:
+            # '/spots/' + id: the end of the value is unknown
+            known = known and not parts
+            break
+        i += 1
+        if i + 1 < len(tokens) and tokens[i] == ('punct', '+'):
+            i += 1
+            continue
+        break
+    if not parts:
+        return (None, None), i
+    text = ''.join(parts)
+    return (text if known else None, text), i
+
+
+def markup_links(text):
+    """Links in an HTML fragment held by a string, dropping any built from unknown values"""
+    tokenizer = LinkTokenizer()
+    tokenizer.feed(text)
+    tokenizer.close()
+    return [link for link in tokenizer.links if link and HOLE not in link]
+
+
+def looks_like_link(text):
+    return len(text) > 1 and URL_SHAPE.match(text) is not None
+
+
+def expects_link(tokens, i):
+    """Whether the expression at tokens[i] is used as a link target
+
+    e.g. el.href = ..., location = ..., { url: ... }, fetch(...), window.open(...)
+    or xhr.open('GET', ...)
+    """
+    previous = tokens[i - 1] if i > 0 else None
+    before = tokens[i - 2] if i > 1 else ('', '')
+    if previous in (('punct', '='), ('punct', ':')):
+        return before[0] == 'name' and before[1] in LINK_PROPERTIES
+    if previous == ('punct', '('):
+        return before[0] == 'name' and before[1] in LINK_CALLS
+    return (previous == ('punct', ',') and i > 3 and before[0] == 'string'
+            and tokens[i - 3] == ('punct', '(') and tokens[i - 4] == ('name', 'open'))
+
+
+def token_links(tokens, constants, links):
+    """Append the link targets in a token list (and its templates' expressions) to `links`"""
+    for i, (kind, value) in enumerate(tokens):
+        if kind == 'template':
+            for expression in value.expressions:
+                token_links(expression, constants, links)
+        if kind not in ('string', 'template', 'name'):
+            continue
+        # Only fold where an expression starts, not halfway through one or at obj.NAME
+        if i and tokens[i - 1] in (('punct', '+'), ('punct', '.'), ('punct', '?.')):
+            continue
+        (folded, text), end = evaluate(tokens, i, constants)
+        if text is None:
+            continue
+
+        # const BASE = '/shop/' + 'boards';
+        if (folded is not None and i > 2 and tokens[i - 1] == ('punct', '=') and tokens[i - 2][0] == 'name'
+                and tokens[i - 3][0] == 'name' and tokens[i - 3][1] in DECLARATIONS):
+            constants[tokens[i - 2][1]] = folded
+
+        if folded is not None and expects_link(tokens, i):
+            if folded.strip() and folded.upper() not in HTTP_METHODS:
+                links.append(folded.strip())
+        elif folded is not None and (kind != 'name' or end > i + 1) and looks_like_link(folded):
+            # A bare constant counts only where a link is expected
+            links.append(folded)
+        elif '<' in text and '=' in text:
+            # innerHTML = `<a href="/dynamic/${page}">...`
+            links.extend(markup_links(text))
+
+
+def script_links(source, constants=None):
+    """Return the link targets a piece of JavaScript mentions, in order
+
+    `constants` (name -> string) is shared by the scripts of one page, so a
+    handler can use a constant declared in an earlier <script>.
+    """
+    links = []
+    token_links(tokenize(source)[0], {} if constants is None else constants, links)
+    return links
+
+
+def script_sources(html_content):
+    """The JavaScript of a page: inline <script> blocks, event handlers and javascript: links"""
+    sources = []
+    for attributes, body in SCRIPT_BLOCK.findall(html_content):
+        attrs = {name.lower(): value.lower() for name, value in SCRIPT_SRC_OR_TYPE.findall(attributes)}
+        if 'src' not in attrs and attrs.get('type', '') in JS_TYPES:
+            sources.append(body)
+    # Handlers sit in attributes, so their entities are decoded first
+    for pattern in (INLINE_HANDLER, JAVASCRIPT_HREF):
+        for double, single in pattern.findall(html_content):
+            sources.append(html.unescape(double or single))
+    return sources
+
+
+def scan_script_links(html_content):
+    """Find link targets built by a page's inline JavaScript"""
+    constants = {}
+    links = []
+    for source in script_sources(html_content):
+        links.extend(script_links(source, constants))
+    return list(dict.fromkeys(links))
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Network Log Capture for the headless scraper
+Reads the requests a page actually made from Chrome's performance log
+(DevTools Network events), so XHR, fetch() and navigation URLs are collected
+exactly instead of guessed from the page source, and counts the image, font,
+stylesheet and media requests that were blocked
+"""
+
+import json
+
+# Network.setBlockedURLs patterns: resources a link crawler never needs
+BLOCKED_URL_PATTERNS = [
+    '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico', '*.bmp',
+    '*.css', '*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot',
+    '*.mp4', '*.webm', '*.ogg', '*.mp3', '*.wav', '*.m4a', '*.mov',
+]
+
+# Chrome prefs that block images by content type, whatever their URL looks like
+BLOCKING_PREFS = {
+    'profile.managed_default_content_settings.images': 2,
+}
+
+# DevTools resource types whose URLs are pages or endpoints worth crawling
+CAPTURED_TYPES = {'Document', 'XHR', 'Fetch', 'EventSource'}
+
+# 'Other' is also the browser's own traffic (favicons, CORS preflights), and
+# it is logged before setBlockedURLs drops it, so it only counts when a script asked for it
+SCRIPT_ONLY_TYPES = {'Other'}
+
+
+class NetworkCapture:
+    """Running totals of the requests seen in the performance log"""
+
+    def __init__(self, types=CAPTURED_TYPES, script_only_types=SCRIPT_ONLY_TYPES):
+        self.types = types
+        self.script_only_types = script_only_types
+        self.requests = 0
+        self.blocked = 0
+        self.captured = 0
+
+    def read(self, entries):
+        """Return the crawlable URLs requested in a batch of driver.get_log('performance') entries"""
+        urls = []
+        for entry in entries:
+            try:
+                message = json.loads(entry['message'])['message']
+            except (KeyError, TypeError, ValueError):
+                continue
+            method = message.get('method')
+            params = message.get('params', {})
+            if method == 'Network.requestWillBeSent':
+                self.requests += 1
+                if not self.captures(params):
+                    continue
+                urls.append(params.get('request', {}).get('url'))
+                # Each hop of a redirect chain is its own request
+                redirect = params.get('redirectResponse')
+                if redirect:
+                    urls.append(redirect.get('url'))
+            elif method == 'Network.loadingFailed' and params.get('blockedReason'):
+                self.blocked += 1
+        urls = [url for url in dict.fromkeys(urls) if url and not url.startswith('data:')]
+        self.captured += len(urls)
+        return urls
+
+    def captures(self, params):
+        """Whether a requestWillBeSent event is for a URL worth crawling"""
+        kind = params.get('type')
+        if kind in self.types:
+            return True
+        return kind in self.script_only_types and (params.get('initiator') or {}).get('type') == 'script'
+
+    def summary(self):
+        return (f"Network log: {self.requests} requests, {self.blocked} blocked, "
+                f"{self.captured} page/XHR/fetch URLs captured")
+
+
+class PageLoadStats:
+    """Page load times and JavaScript heap sizes of the rendered pages"""
+
+    def __init__(self):
+        self.load_seconds = []
+        self.heap_bytes = []
+
+    def record(self, load_seconds, heap_bytes=None):
+        self.load_seconds.append(load_seconds)
+        if heap_bytes:
+            self.heap_bytes.append(heap_bytes)
+
+    def summary(self):
+        if not self.load_seconds:
+            return "Page loads: none"
+        load = sum(self.load_seconds) / len(self.load_seconds)
+        text = f"Page loads: {len(self.load_seconds)}, average {load * 1000:.0f} ms"
+        if self.heap_bytes:
+            heap = sum(self.heap_bytes) / len(self.heap_bytes)
+            text += f", average JS heap {heap / (1 << 20):.1f} MB"
+        return text
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Stage Profiler for the crawlers and server.py
+Times each pipeline stage (fetch, parse, script scan, URL handling, save...)
+with two clock reads on the way in and out, per thread, so it can stay on for
+whole crawls. cProfile, a sampling stack profiler and tracemalloc can be added
+on top. At the end it writes a per-stage summary, a collapsed-stack file for
+flamegraph.pl or speedscope, and the top allocation sites
+"""
+
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# Worker thread names end in a per-thread number; stacks are merged without it
+THREAD_NUMBER = re.compile(r'_\d+$')
+
+
+class NullStage:
+    """A stage that records nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_STAGE = NullStage()
+
+
+class NullProfiler:
+    """Stands in for a StageProfiler when profiling is off"""
+    enabled = False
+
+    def stage(self, name):
+        return NULL_STAGE
+
+    def record(self, name, wall, cpu=0.0):
+        pass
+
+
+class Stage:
+    __slots__ = ('profiler', 'name')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.exit()
+        return False
+
+
+def profiled(name):
+    """Run a method as a stage of its object's `profiler`"""
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class StageProfiler:
+    """Per-stage wall time, CPU time and allocations, with optional deep profilers
+
+    Stages nest: a stage's self time leaves out the stages run inside it. CPU
+    time is the thread's own, so stages on worker threads are counted right.
+    With trace_memory, a stage's allocations are the net traced bytes while it
+    ran; tracemalloc counts every thread, so stages that overlap other threads'
+    work are only approximate.
+    """
+    enabled = True
+
+    def __init__(self, cprofile=False, sample_interval=None, trace_memory=0, clock=time.perf_counter):
+        self.cprofile = cprofile
+        self.sample_interval = sample_interval
+        self.trace_memory = trace_memory          # frames kept per allocation, 0 for off
+        self.clock = clock
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.totals = []                          # every thread's {stage: [calls, wall, self wall, cpu, self cpu, bytes]}
+        self.stacks = {}                          # thread ident -> its stack of open stages
+        self.samples = {}                         # collapsed stack -> count
+        self.profile = None
+        self.sampler = None
+        self.snapshot = None
+        self.peak_bytes = 0
+        self.started = clock()
+        self.cpu_started = time.process_time()
+        self.wall = self.cpu = None
+        if trace_memory:
+            import tracemalloc
+            self.traced_memory = tracemalloc.get_traced_memory
+
+    def thread_state(self):
+        state = self.local
+        if not hasattr(state, 'totals'):
+            state.totals = {}
+            state.stack = []
+            with self.lock:
+                self.totals.append(state.totals)
+                self.stacks[threading.get_ident()] = state.stack
+        return state
+
+    def stage(self, name):
+        return Stage(self, name)
+
+    def enter(self, name):
+        state = self.thread_state()
+        allocated = self.traced_memory()[0] if self.trace_memory else 0
+        # name, wall, cpu, bytes at entry, then wall and cpu spent in nested stages
+        state.stack.append([name, self.clock(), time.thread_time(), allocated, 0.0, 0.0])
+
+    def exit(self):
+        wall_now, cpu_now = self.clock(), time.thread_time()
+        state = self.local
+        name, wall_start, cpu_start, allocated, child_wall, child_cpu = state.stack.pop()
+        wall, cpu = wall_now - wall_start, cpu_now - cpu_start
+        totals = state.totals.get(name)
+        if totals is None:
+            totals = state.totals[name] = [0, 0.0, 0.0, 0.0, 0.0, 0]
+        totals[0] += 1
+        totals[1] += wall
+        totals[2] += wall - child_wall
+        totals[3] += cpu
+        totals[4] += cpu - child_cpu
+        if self.trace_memory:
+            totals[5] += self.traced_memory()[0] - allocated
+        if state.stack:
+            state.stack[-1][4] += wall
+            state.stack[-1][5] += cpu
+
+    def record(self, name, wall, cpu=0.0):
+        """Add time measured elsewhere, e.g. a fetch awaited on an event loop"""
+        totals = self.thread_state().totals.setdefault(name, [0, 0.0, 0.0, 0.0, 0.0, 0])
+        totals[0] += 1
+        totals[1] += wall
+        totals[2] += wall
+        totals[3] += cpu
+        totals[4] += cpu
+
+    def start(self):
+        """Start the clock and whichever deep profilers were asked for"""
+        self.started = self.clock()
+        self.cpu_started = time.process_time()
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.start(self.trace_memory)
+        if self.sample_interval:
+            self.sampler = threading.Thread(target=self.sample, name='stack-sampler', daemon=True)
+            self.sampler.running = True
+            self.sampler.start()
+        if self.cprofile:
+            import cProfile
+            # cProfile only sees the thread that enables it
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def finish(self):
+        """Stop the clock and the deep profilers"""
+        if self.wall is not None:
+            return
+        if self.profile is not None:
+            self.profile.disable()
+        if self.sampler is not None:
+            self.sampler.running = False
+            self.sampler.join()
+        if self.trace_memory:
+            import tracemalloc
+            self.peak_bytes = tracemalloc.get_traced_memory()[1]
+            # Leave out the profiler's own allocations and those of imports
+            self.snapshot = tracemalloc.take_snapshot().filter_traces(
+                [tracemalloc.Filter(False, filename)
+                 for filename in (__file__, tracemalloc.__file__, '<frozen importlib._bootstrap*>')])
+            tracemalloc.stop()
+        self.wall = self.clock() - self.started
+        self.cpu = time.process_time() - self.cpu_started
+
+    def sample(self):
+        """Record every other thread's stack every sample_interval seconds"""
+        me = threading.get_ident()
+        names = {}
+        while self.sampler.running:
+            time.sleep(self.sample_interval)
+            frames = sys._current_frames()
+            if len(names) != len(frames):
+                names = {thread.ident: THREAD_NUMBER.sub('', thread.name) for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                calls = []
+                while frame is not None:
+                    code = frame.f_code
+                    if code.co_filename != __file__:
+                        calls.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                # Stacks are grouped under the stage the thread is in, if any
+                try:
+                    stage = [f"[{self.stacks[ident][-1][0]}]"]
+                except (KeyError, IndexError):
+                    stage = []
+                key = ';'.join([names.get(ident, 'thread')] + stage + calls[::-1])
+                self.samples[key] = self.samples.get(key, 0) + 1
+
+    def stages(self):
+        """{stage: {calls, wall, self_wall, cpu, self_cpu, bytes}} summed over threads"""
+        merged = {}
+        with self.lock:
+            for totals in self.totals:
+                for name, values in list(totals.items()):
+                    into = merged.setdefault(name, [0, 0.0, 0.0, 0.0, 0.0, 0])
+                    for i, value in enumerate(values):
+                        into[i] += value
+        keys = ('calls', 'wall', 'self_wall', 'cpu', 'self_cpu', 'bytes')
+        return {name: dict(zip(keys, values))
+                for name, values in sorted(merged.items(), key=lambda item: -item[1][2])}
+
+    def allocation_sites(self, limit=10):
+        if self.snapshot is None:
+            return []
+        key = 'traceback' if self.trace_memory > 1 else 'lineno'
+        return self.snapshot.statistics(key)[:limit]
+
+    def summary(self, top=5):
+        wall = self.wall if self.wall is not None else self.clock() - self.started
+        cpu = self.cpu if self.cpu is not None else time.process_time() - self.cpu_started
+        lines = [f"Profile: {wall:.2f}s wall, {cpu:.2f}s CPU",
+                 f"  {'stage':<10} {'calls':>7} {'wall':>9} {'self':>9} {'self CPU':>9} {'per call':>9}"
+                 + (f" {'net alloc':>10}" if self.trace_memory else '')]
+        for name, stage in self.stages().items():
+            line = (f"  {name:<10} {stage['calls']:>7} {stage['wall']:>8.3f}s {stage['self_wall']:>8.3f}s "
+                    f"{stage['self_cpu']:>8.3f}s {stage['wall'] / stage['calls'] * 1000:>7.2f}ms")
+            if self.trace_memory:
+                line += f" {stage['bytes'] / 1024:>8.0f}KB"
+            lines.append(line)
+        if self.samples:
+            lines.append(f"Stack samples: {sum(self.samples.values())} every {self.sample_interval * 1000:g}ms")
+        if self.snapshot is not None:
+            lines.append(f"Traced memory peak: {self.peak_bytes / 1024:.0f}KB; top allocation sites:")
+            for stat in self.allocation_sites(top):
+                frame = stat.traceback[0]
+                lines.append(f"  {stat.size / 1024:8.0f}KB {stat.count:>7} blocks  "
+                             f"{os.path.basename(frame.filename)}:{frame.lineno}")
+        return '\n'.join(lines)
+
+    def save(self, directory):
+        """Write stages.json and whichever of stacks.collapsed, cprofile.*, allocations.txt apply"""
+        os.makedirs(directory, exist_ok=True)
+        written = [os.path.join(directory, 'stages.json')]
+        with open(written[-1], 'w', encoding='utf-8') as f:
+            json.dump({'wall': self.wall, 'cpu': self.cpu, 'stages': self.stages()}, f, indent=2)
+        if self.samples:
+            written.append(os.path.join(directory, 'stacks.collapsed'))
+            with open(written[-1], 'w', encoding='utf-8') as f:
+                for stack, count in sorted(self.samples.items()):
+                    f.write(f"{stack} {count}\n")
+        if self.profile is not None:
+            import pstats
+            written.append(os.path.join(directory, 'cprofile.prof'))
+            self.profile.dump_stats(written[-1])
+            written.append(os.path.join(directory, 'cprofile.txt'))
+            with open(written[-1], 'w', encoding='utf-8') as f:
+                pstats.Stats(self.profile, stream=f).sort_stats('cumulative').print_stats(40)
+        if self.snapshot is not None:
+            written.append(os.path.join(directory, 'allocations.txt'))
+            with open(written[-1], 'w', encoding='utf-8') as f:
+                f.write(f"Traced memory peak: {self.peak_bytes} bytes\n")
+                for stat in self.allocation_sites(50):
+                    f.write(f"\n{stat.size} bytes in {stat.count} blocks\n")
+                    f.write('\n'.join(stat.traceback.format()) + '\n')
+        return written
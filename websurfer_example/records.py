@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Compact Crawl Records for the requests-based scrapers
+Interns every URL a crawl meets to a dense integer id, with the URL text kept
+as UTF-8 in one byte arena, and keeps everything known about it (depth, first
+parent, HTTP status, redirect or /decode/ target, found/visited flags) in
+parallel typed arrays, with links stored as pairs of ids. A URL costs about
+40 bytes plus its length instead of a str, set and dict entries and tuples,
+so crawls of millions of URLs fit in memory with their metadata kept
+"""
+
+from array import array
+
+# URL flags
+FOUND = 1        # a link to it was found (the scraper's all_links)
+VISITED = 2      # it was fetched or given up on (the scraper's visited)
+
+EMPTY = -1
+
+
+class UrlTable:
+    """URLs interned to ids 0, 1, 2... in the order they were first seen
+
+    Lookups go through an open-addressing table of ids, probed linearly, and
+    compare hashes before text, so no str or dict entry is kept per URL.
+    """
+
+    def __init__(self, capacity=1024):
+        self.arena = bytearray()               # every URL's UTF-8 bytes, back to back
+        self.offsets = array('Q', [0])         # URL id -> start offset; id + 1 -> end
+        self.hashes = array('q')               # URL id -> hash of its bytes
+        self.slots = array('i', [EMPTY]) * capacity
+        self.mask = capacity - 1
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, url):
+        return self.find(url) != EMPTY
+
+    def __getitem__(self, url_id):
+        return self.arena[self.offsets[url_id]:self.offsets[url_id + 1]].decode('utf-8')
+
+    def __iter__(self):
+        for url_id in range(len(self)):
+            yield self[url_id]
+
+    def probe(self, data, digest):
+        """The slot holding `data`, or the empty slot where it would go"""
+        slot = digest & self.mask
+        while True:
+            url_id = self.slots[slot]
+            if url_id == EMPTY:
+                return slot
+            start, end = self.offsets[url_id], self.offsets[url_id + 1]
+            if self.hashes[url_id] == digest and end - start == len(data) and \
+                    self.arena.startswith(data, start):
+                return slot
+            slot = (slot + 1) & self.mask
+
+    def find(self, url):
+        """A URL's id, or -1 if it was never interned"""
+        data = url.encode('utf-8')
+        return self.slots[self.probe(data, hash(data))]
+
+    def intern(self, url):
+        """A URL's id, adding it if it is new"""
+        data = url.encode('utf-8')
+        digest = hash(data)
+        slot = self.probe(data, digest)
+        url_id = self.slots[slot]
+        if url_id != EMPTY:
+            return url_id
+        url_id = len(self.hashes)
+        self.arena += data
+        self.offsets.append(len(self.arena))
+        self.hashes.append(digest)
+        self.slots[slot] = url_id
+        # Kept at most half full, so probes stay short
+        if 2 * len(self.hashes) > len(self.slots):
+            self.grow()
+        return url_id
+
+    def grow(self):
+        self.slots = array('i', [EMPTY]) * (2 * len(self.slots))
+        self.mask = len(self.slots) - 1
+        for url_id, digest in enumerate(self.hashes):
+            slot = digest & self.mask
+            while self.slots[slot] != EMPTY:
+                slot = (slot + 1) & self.mask
+            self.slots[slot] = url_id
+
+    def nbytes(self):
+        return (len(self.arena) + self.offsets.itemsize * len(self.offsets)
+                + self.hashes.itemsize * len(self.hashes) + self.slots.itemsize * len(self.slots))
+
+
+class UrlRecord:
+    """What a crawl knows about one URL, read out of CrawlRecords"""
+
+    __slots__ = ('id', 'url', 'depth', 'parent', 'status', 'target', 'flags')
+
+    def __init__(self, id, url, depth, parent, status, target, flags):
+        self.id = id
+        self.url = url
+        self.depth = depth          # shallowest depth it was linked at, -1 if never
+        self.parent = parent        # URL of the first page linking to it, or None
+        self.status = status        # HTTP status, 0 if not fetched, -1 if the fetch failed
+        self.target = target        # URL it redirects (or /decode/s) to, or None
+        self.flags = flags
+
+    def __repr__(self):
+        return (f"UrlRecord({self.url!r}, depth={self.depth}, status={self.status}, "
+                f"parent={self.parent!r}, target={self.target!r})")
+
+
+class CrawlRecords:
+    """Per-URL crawl metadata as parallel arrays indexed by URL id, plus the link graph
+
+    Not thread-safe: the scrapers only touch it from the thread that runs the
+    crawl loop, not from their fetch workers.
+    """
+
+    def __init__(self):
+        self.urls = UrlTable()
+        self.flags = bytearray()
+        self.depths = array('h')
+        self.parents = array('i')
+        self.statuses = array('h')
+        self.targets = array('i')
+        self.edge_from = array('i')        # one link per index: page id -> linked URL id
+        self.edge_to = array('i')
+        self.counts = {FOUND: 0, VISITED: 0}
+        self.page = (None, EMPTY)          # the last page links were recorded from, and its id
+
+    def __len__(self):
+        return len(self.urls)
+
+    def id(self, url):
+        """A URL's id, adding a blank record for a new one"""
+        url_id = self.urls.intern(url)
+        if url_id == len(self.flags):
+            self.flags.append(0)
+            self.depths.append(EMPTY)
+            self.parents.append(EMPTY)
+            self.statuses.append(0)
+            self.targets.append(EMPTY)
+        return url_id
+
+    def has(self, url, flag):
+        url_id = self.urls.find(url)
+        return url_id != EMPTY and bool(self.flags[url_id] & flag)
+
+    def mark(self, url, flag):
+        url_id = self.id(url)
+        if not self.flags[url_id] & flag:
+            self.flags[url_id] |= flag
+            self.counts[flag] += 1
+        return url_id
+
+    def unmark(self, url, flag):
+        url_id = self.urls.find(url)
+        if url_id != EMPTY and self.flags[url_id] & flag:
+            self.flags[url_id] &= ~flag
+            self.counts[flag] -= 1
+
+    def marked(self, flag):
+        """URLs with a flag set, in id order"""
+        for url_id, flags in enumerate(self.flags):
+            if flags & flag:
+                yield self.urls[url_id]
+
+    def link(self, page, url, depth):
+        """Record a link from `page` to `url`, found at `depth`"""
+        # A page's links arrive together, so its id is looked up once
+        if page != self.page[0]:
+            self.page = (page, self.id(page))
+        page_id, url_id = self.page[1], self.id(url)
+        self.edge_from.append(page_id)
+        self.edge_to.append(url_id)
+        if self.parents[url_id] == EMPTY and url_id != page_id:
+            self.parents[url_id] = page_id
+        if self.depths[url_id] == EMPTY or depth < self.depths[url_id]:
+            self.depths[url_id] = depth
+
+    def fetched(self, url, status, depth=None):
+        """Record a fetch's HTTP status (-1 for a fetch that got no response) and depth"""
+        url_id = self.id(url)
+        self.statuses[url_id] = status
+        if depth is not None and (self.depths[url_id] == EMPTY or depth < self.depths[url_id]):
+            self.depths[url_id] = depth
+
+    def redirect(self, source, target):
+        if source != target:
+            self.targets[self.id(source)] = self.id(target)
+
+    def record(self, url):
+        """A URL's UrlRecord, or None if it was never seen"""
+        url_id = self.urls.find(url)
+        if url_id == EMPTY:
+            return None
+        parent, target = self.parents[url_id], self.targets[url_id]
+        return UrlRecord(url_id, url, self.depths[url_id],
+                         self.urls[parent] if parent != EMPTY else None, self.statuses[url_id],
+                         self.urls[target] if target != EMPTY else None, self.flags[url_id])
+
+    def view(self, flag):
+        return FlagSet(self, flag)
+
+    def frontier(self, items=()):
+        return CompactFrontier(self, items)
+
+    def nbytes(self):
+        """Bytes held by the URL table, metadata columns and link graph"""
+        columns = (self.depths, self.parents, self.statuses, self.targets, self.edge_from, self.edge_to)
+        return self.urls.nbytes() + len(self.flags) + sum(column.itemsize * len(column) for column in columns)
+
+    def summary(self):
+        return (f"Crawl records: {len(self)} URLs, {len(self.edge_from)} links in "
+                f"{self.nbytes() / 1024:.0f}KB ({self.nbytes() / max(1, len(self)):.0f} bytes per URL)")
+
+    def save(self, filename):
+        """Write a TSV of every URL's record, and its links as little-endian int32 id pairs to filename.edges"""
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write("id\turl\tdepth\tstatus\tparent\ttarget\n")
+            for url_id in range(len(self)):
+                f.write(f"{url_id}\t{self.urls[url_id]}\t{self.depths[url_id]}\t{self.statuses[url_id]}\t"
+                        f"{self.parents[url_id]}\t{self.targets[url_id]}\n")
+        edges = array('i', bytes(8 * len(self.edge_from)))
+        edges[0::2] = self.edge_from
+        edges[1::2] = self.edge_to
+        with open(filename + '.edges', 'wb') as f:
+            edges.tofile(f)
+        return [filename, filename + '.edges']
+
+
+class FlagSet:
+    """The URLs with one flag set, standing in for the scraper's sets of URLs"""
+
+    def __init__(self, records, flag):
+        self.records = records
+        self.flag = flag
+
+    def __contains__(self, url):
+        return self.records.has(url, self.flag)
+
+    def __len__(self):
+        return self.records.counts[self.flag]
+
+    def __iter__(self):
+        return self.records.marked(self.flag)
+
+    def add(self, url):
+        self.records.mark(url, self.flag)
+
+    def update(self, urls):
+        for url in urls:
+            self.records.mark(url, self.flag)
+
+    def discard(self, url):
+        self.records.unmark(url, self.flag)
+
+
+class CompactFrontier:
+    """A FIFO of (url, depth) kept as two arrays of URL ids and depths
+
+    Drop-in for the scrapers' deque: entries only become tuples when popped.
+    """
+
+    def __init__(self, records, items=()):
+        self.records = records
+        self.ids = array('i')
+        self.depths = array('h')
+        self.head = 0
+        self.extend(items)
+
+    def __len__(self):
+        return len(self.ids) - self.head
+
+    def __bool__(self):
+        return len(self.ids) > self.head
+
+    def append(self, item):
+        url, depth = item
+        self.ids.append(self.records.id(url))
+        self.depths.append(depth)
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+
+    def appendleft(self, item):
+        url, depth = item
+        if self.head:
+            self.head -= 1
+            self.ids[self.head] = self.records.id(url)
+            self.depths[self.head] = depth
+        else:
+            self.ids.insert(0, self.records.id(url))
+            self.depths.insert(0, depth)
+
+    def popleft(self):
+        if self.head >= len(self.ids):
+            raise IndexError("pop from an empty frontier")
+        url_id, depth = self.ids[self.head], self.depths[self.head]
+        self.head += 1
+        # Drop the popped entries once they are most of the arrays
+        if self.head >= 4096 and 2 * self.head >= len(self.ids):
+            del self.ids[:self.head]
+            del self.depths[:self.head]
+            self.head = 0
+        return self.records.urls[url_id], depth
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Redirect map shared by the scrapers
+Records where redirecting URLs (including /decode/ links resolved locally)
+end up, so each final URL is fetched once no matter how many links lead to it
+"""
+
+import threading
+
+
+class RedirectMap:
+    def __init__(self):
+        """Create an empty redirect map"""
+        self.lock = threading.Lock()
+        self.targets = {}     # source URL -> final URL
+        self.in_flight = {}   # final URL -> (Event, result holder)
+        self.fetched = set()  # final URLs whose fetch has finished
+
+    def record(self, source, target):
+        """Record that `source` redirects to `target`"""
+        if source == target:
+            return
+        with self.lock:
+            self.targets[source] = self._resolve(target)
+
+    def record_response(self, requested_url, response):
+        """Record every hop of a followed redirect chain from a requests response"""
+        final_url = response.url
+        for hop in getattr(response, 'history', []):
+            self.record(hop.url, final_url)
+        self.record(requested_url, final_url)
+
+    def resolve(self, url):
+        """Return the final URL a URL redirects to (the URL itself if none is known)"""
+        with self.lock:
+            return self._resolve(url)
+
+    def _resolve(self, url):
+        seen = set()
+        while url in self.targets and url not in seen:
+            seen.add(url)
+            url = self.targets[url]
+        return url
+
+    def redirect_target(self, url):
+        """Return the final URL for a known redirect source, or None"""
+        with self.lock:
+            if url not in self.targets:
+                return None
+            return self._resolve(url)
+
+    def fetch_once(self, url, fetch):
+        """Run fetch(final_url) at most once per final URL
+
+        Concurrent callers for the same final URL wait for the first fetch and
+        share its result; later callers get None. Returns (result, owner) where
+        owner is True only for the caller that actually fetched.
+        """
+        final_url = self.resolve(url)
+        with self.lock:
+            if final_url in self.fetched:
+                return None, False
+            waiter = self.in_flight.get(final_url)
+            if waiter is None:
+                waiter = (threading.Event(), [])
+                self.in_flight[final_url] = waiter
+                owner = True
+            else:
+                owner = False
+
+        event, holder = waiter
+        if not owner:
+            event.wait()
+            return (holder[0] if holder else None), False
+
+        result = None
+        try:
+            result = fetch(final_url)
+        finally:
+            with self.lock:
+                self.fetched.add(final_url)
+                del self.in_flight[final_url]
+            holder.append(result)
+            event.set()
+        return result, True
+
+    def forget(self, url):
+        """Let fetch_once fetch a URL's final URL again, e.g. after a 429 Too Many Requests"""
+        with self.lock:
+            self.fetched.discard(self._resolve(url))
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Script Link Check for the static scrapers
+Loads every page of a site (the start page plus its sitemap) both ways: the
+static way (tag links plus js_links.py's script scan) and in
+HeadlessBFSWebScraper's browser. It then lists per page the links only one
+side found, so the static script scan can be validated against the rendered
+DOM (not the headless scraper's own page source regexes)
+"""
+
+import argparse
+import sys
+import time
+from urllib.parse import urljoin
+
+import requests
+
+from js_links import scan_script_links
+from site_seeds import load_site_seeds
+from streaming_parser import LinkTokenizer
+from url_filter import UrlFilter
+
+# Runs every inline handler (e.g. "Load More" buttons) once
+CLICK_HANDLERS = """
+for (const element of document.querySelectorAll('[onclick]')) {
+    try { element.click(); } catch (e) {}
+}
+"""
+
+# The links parse_tag_links would find, read from the rendered DOM
+RENDERED_LINKS = """
+const links = [];
+document.querySelectorAll('a[href]').forEach(e => links.push(e.getAttribute('href')));
+document.querySelectorAll('form[action]').forEach(e => links.push(e.getAttribute('action')));
+document.querySelectorAll('[data-url]').forEach(e => links.push(e.getAttribute('data-url')));
+document.querySelectorAll('[data-href]').forEach(e => links.push(e.getAttribute('data-href')));
+return links;
+"""
+
+
+def static_links(url, html_content, url_filter):
+    """Return (tag links, script links) of a page, resolved and filtered like the scrapers do"""
+    tokenizer = LinkTokenizer()
+    tokenizer.feed(html_content)
+    tokenizer.close()
+    tags = url_filter.filter(urljoin(url, raw) for raw in tokenizer.links)
+    scripts = url_filter.filter(urljoin(url, raw) for raw in scan_script_links(html_content))
+    return set(tags), set(scripts)
+
+
+def site_pages(base_url, session, url_filter):
+    seeds = load_site_seeds(base_url, session)
+    urls = url_filter.scope(url_filter.filter(seeds.urls))
+    return [base_url] + [url for url in urls if url.rstrip('/') != base_url.rstrip('/')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare static script link discovery with a headless browser")
+    parser.add_argument('--base-url', default='http://localhost:8000', help="Site to check")
+    parser.add_argument('--js-wait', type=float, default=3, help="Seconds to let each page's scripts run")
+    parser.add_argument('--click', action='store_true',
+                        help="Also click every element with an onclick handler before collecting links")
+    args = parser.parse_args()
+
+    try:
+        from headless_scraper import HeadlessBFSWebScraper
+    except ImportError:
+        print("❌ Selenium is not installed (pip install selenium); nothing to compare against")
+        return 2
+
+    url_filter = UrlFilter(args.base_url)
+    session = requests.Session()
+    pages = site_pages(args.base_url, session, url_filter)
+    headless = HeadlessBFSWebScraper(args.base_url, js_wait_time=args.js_wait, use_sitemap=False)
+
+    print(f"🔍 Script links on {len(pages)} pages of {args.base_url}")
+    print("=" * 50)
+    missed_total = extra_total = found_total = 0
+    static_seconds = 0.0
+    try:
+        for url in pages:
+            response = session.get(url, timeout=10)
+            start = time.perf_counter()
+            tags, scripts = static_links(response.url, response.text, url_filter)
+            static_seconds += time.perf_counter() - start
+
+            headless.driver.get(url)
+            time.sleep(args.js_wait)
+            if args.click:
+                headless.driver.execute_script(CLICK_HANDLERS)
+                time.sleep(args.js_wait)
+            raw_links = headless.driver.execute_script(RENDERED_LINKS) or []
+            rendered = set(url_filter.filter(urljoin(url, raw) for raw in raw_links))
+
+            # Links the browser saw that the raw HTML's tags don't have came from JavaScript
+            from_js = rendered - tags
+            missed = from_js - scripts
+            extra = scripts - rendered - tags
+            found_total += len(from_js & scripts)
+            missed_total += len(missed)
+            extra_total += len(extra)
+            print(f"{'✅' if not missed else '❌'} {url}: {len(from_js & scripts)}/{len(from_js)} "
+                  f"script links found statically, {len(extra)} not seen by the browser")
+            for link in sorted(missed):
+                print(f"    - missed: {link}")
+            for link in sorted(extra):
+                print(f"    + static only: {link}")
+    finally:
+        headless.cleanup()
+
+    print("=" * 50)
+    print(f"Found {found_total} of {found_total + missed_total} script links statically "
+          f"({static_seconds * 1000:.1f} ms of static parsing), {extra_total} the browser did not show")
+    return 1 if missed_total else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,164 +5,125 @@ Alternative version with very aggressive timeouts to prevent hanging
 """
 
 import requests
-from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
 from collections import deque
 import time
 import signal
 import sys
-import base64
+from redirect_map import RedirectMap
+from url_filter import UrlFilter
+from content_fingerprint import ContentFingerprints
+from transfer_stats import ACCEPT_ENCODING, TransferStats
+from streaming_parser import StreamStats, read_body
+from adaptive_timeout import AdaptiveTimeouts
+from circuit_breaker import FAILURE, OK, TIMEOUT, CircuitBreaker
+from crawl_budget import BestFirstFrontier, CoverageCurve
+from profiling import NullProfiler, profiled
+from records import FOUND, VISITED, CrawlRecords
+from crawl_pipeline import CrawlPipeline
 
-class SimpleBFSWebScraper:
-    def __init__(self, base_url, max_depth=3, delay=0.5):
+class SimpleBFSWebScraper(CrawlPipeline):
+    def __init__(self, base_url, max_depth=3, delay=0.5, url_filter=None, use_sitemap=True,
+                 streaming=False, body_deadline=2.0, timeouts=None, breaker=None,
+                 transport=None, budget=None, best_first=False, parser='html.parser',
+                 profiler=None, compact=False):
         self.base_url = base_url
         self.max_depth = max_depth
         self.delay = delay
-        self.visited = set()
-        self.queue = deque([(base_url, 0)])
-        self.all_links = set()
+        self.best_first = best_first
+        self.parser = parser
+        self.profiler = profiler or NullProfiler()
+        # Compact records keep URLs, the queue and per-URL metadata in arrays instead of sets
+        self.records = CrawlRecords() if compact else None
+        if compact:
+            self.visited = self.records.view(VISITED)
+            self.all_links = self.records.view(FOUND)
+        else:
+            self.visited = set()
+            self.all_links = set()
+        if best_first:
+            self.queue = BestFirstFrontier([(base_url, 0)])
+        elif compact:
+            self.queue = self.records.frontier([(base_url, 0)])
+        else:
+            self.queue = deque([(base_url, 0)])
+        self.budget = budget
+        self.coverage = CoverageCurve()
+        self.crawled_count = 0
+        self.error_count = 0
+        self.skipped_count = 0
+        self.redirects = RedirectMap()
+        self.url_filter = url_filter or UrlFilter(base_url)
+        self.use_sitemap = use_sitemap
+        self.fingerprints = ContentFingerprints()
+        self.transfer = TransferStats()
+        self.streaming = streaming
+        self.body_deadline = body_deadline
+        self.stream_stats = StreamStats()
+        self.timeouts = timeouts or AdaptiveTimeouts()
+        self.breaker = breaker or CircuitBreaker()
         
         # Create session with very aggressive timeouts
         self.session = requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (compatible; SimpleScraper/1.0)'
+            'User-Agent': 'Mozilla/5.0 (compatible; SimpleScraper/1.0)',
+            'Accept-Encoding': ACCEPT_ENCODING
         })
         # Very short timeouts to prevent hanging
         self.session.timeout = (1, 3)  # 1s connect, 3s read
         self.session.verify = False
+        # Recorded or replayed requests (http_archive.py) instead of the network
+        if transport is not None:
+            self.session.mount('http://', transport)
+            self.session.mount('https://', transport)
         
         # Suppress SSL warnings
         import urllib3
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
     
     def is_valid_url(self, url):
-        try:
-            parsed = urlparse(url)
-            
-            if parsed.scheme not in ['http', 'https']:
-                return False
-            
-            skip_extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.gif', '.css', '.js', '.xml', '.zip']
-            if any(url.lower().endswith(ext) for ext in skip_extensions):
-                return False
-            
-            return True
-        except:
-            return False
+        return self.url_filter.allows(url)
     
-    def extract_links(self, url, html_content):
-        """Extract all links from HTML content including dynamic ones"""
-        soup = BeautifulSoup(html_content, 'html.parser')
-        links = []
-        
-        # Extract links from <a> tags
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            absolute_url = urljoin(url, href)
-            
-            if self.is_valid_url(absolute_url):
-                links.append(absolute_url)
-        
-        # Extract links from JavaScript (common patterns)
-        js_patterns = [
-            r'["\']([^"\']*\.php[^"\']*)["\']',  # PHP files
-            r'["\']([^"\']*\.html?[^"\']*)["\']',  # HTML files
-            r'["\']([^"\']*\.js[^"\']*)["\']',  # JS files
-            r'["\']([^"\']*\.json[^"\']*)["\']',  # JSON endpoints
-            r'["\']([^"\']*\.xml[^"\']*)["\']',  # XML endpoints
-            r'["\']([^"\']*api/[^"\']*)["\']',  # API endpoints
-            r'["\']([^"\']*ajax/[^"\']*)["\']',  # AJAX endpoints
-            r'["\']([^"\']*\/[a-zA-Z0-9_-]+\/[^"\']*)["\']',  # General path patterns
-            r'["\']([^"\']*\?[^"\']*)["\']',  # URLs with query parameters
-        ]
-        
-        for pattern in js_patterns:
-            matches = re.findall(pattern, html_content, re.IGNORECASE)
-            for match in matches:
-                if match.startswith('http'):
-                    absolute_url = match
-                else:
-                    absolute_url = urljoin(url, match)
-                
-                if self.is_valid_url(absolute_url):
-                    links.append(absolute_url)
-        
-        # Extract links from data attributes
-        for element in soup.find_all(attrs={'data-url': True}):
-            href = element['data-url']
-            absolute_url = urljoin(url, href)
-            if self.is_valid_url(absolute_url):
-                links.append(absolute_url)
-        
-        for element in soup.find_all(attrs={'data-href': True}):
-            href = element['data-href']
-            absolute_url = urljoin(url, href)
-            if self.is_valid_url(absolute_url):
-                links.append(absolute_url)
-        
-        # Extract links from onclick attributes
-        onclick_pattern = r'onclick=["\']([^"\']*)["\']'
-        onclick_matches = re.findall(onclick_pattern, html_content, re.IGNORECASE)
-        for match in onclick_matches:
-            # Look for URLs in onclick handlers
-            url_matches = re.findall(r'["\']([^"\']*\.(?:php|html?|js|json|xml)[^"\']*)["\']', match)
-            for url_match in url_matches:
-                absolute_url = urljoin(url, url_match)
-                if self.is_valid_url(absolute_url):
-                    links.append(absolute_url)
-        
-        # Extract links from form actions
-        for form in soup.find_all('form', action=True):
-            action = form['action']
-            absolute_url = urljoin(url, action)
-            if self.is_valid_url(absolute_url):
-                links.append(absolute_url)
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_links = []
-        for link in links:
-            if link not in seen:
-                seen.add(link)
-                unique_links.append(link)
-        
-        return unique_links
-    
-    def decode_base64_url(self, url):
-        """Decode base64-encoded URLs if possible"""
+    def timed_get(self, url, timeout, stream=False):
+        """GET a URL within a timeout and feed the outcome back into the learned timeouts"""
+        start = time.monotonic()
         try:
-            # Check if URL contains /decode/ followed by base64
-            if '/decode/' in url:
-                parts = url.split('/decode/')
-                if len(parts) == 2:
-                    encoded_part = parts[1]
-                    # Try to decode the base64 part
-                    decoded_bytes = base64.b64decode(encoded_part)
-                    decoded_path = decoded_bytes.decode('utf-8')
-                    return decoded_path
-        except:
-            pass
-        return url
+            response = self.session.get(url, timeout=(min(0.5, timeout), timeout), stream=True)
+            if not stream:
+                read_body(response, start + timeout)
+        except requests.exceptions.Timeout:
+            self.timeouts.record_timeout(url, timeout)
+            raise
+        self.timeouts.record(url, time.monotonic() - start)
+        return response
     
-    def safe_request(self, url):
+    @profiled('fetch')
+    def safe_request(self, url, stream=False):
         """Make a request with multiple fallback strategies"""
+        timeout = self.timeouts.timeout(url)
         strategies = [
-            # Strategy 1: Very short timeout
-            lambda: self.session.get(url, timeout=(0.5, 2)),
+            # Strategy 1: The timeout learned for this route
+            lambda: self.timed_get(url, timeout, stream=stream),
             # Strategy 2: Even shorter timeout
-            lambda: self.session.get(url, timeout=(0.3, 1)),
+            lambda: self.timed_get(url, timeout / 2, stream=stream),
             # Strategy 3: Head request only
-            lambda: self.session.head(url, timeout=(0.5, 2))
+            lambda: self.session.head(url, timeout=(min(0.5, timeout), timeout))
         ]
         
         for i, strategy in enumerate(strategies):
             try:
                 response = strategy()
-                if hasattr(response, 'text') or response.status_code < 400:
+                # Checking response.text would download a streamed body
+                if stream or hasattr(response, 'text') or response.status_code < 400:
+                    self.breaker.record(url, FAILURE if response.status_code >= 500 else OK)
                     return response
+            except requests.exceptions.Timeout:
+                # The route's whole timeout is spent; the other strategies won't do better
+                self.breaker.record(url, TIMEOUT)
+                return None
             except:
                 continue
         
+        self.breaker.record(url, FAILURE)
         return None
     
     def crawl(self):
@@ -170,73 +131,101 @@ class SimpleBFSWebScraper:
         print(f"Max depth: {self.max_depth}")
         print("-" * 50)
         
-        crawled_count = 0
-        error_count = 0
+        if self.budget is not None:
+            self.budget.start()
+        self.coverage.start()
+        if self.use_sitemap:
+            self.seed_frontier()
+        
+        self.crawled_count = 0
+        self.error_count = 0
+        self.skipped_count = 0
         
         while self.queue:
-            current_url, depth = self.queue.popleft()
-            
-            if current_url in self.visited or depth > self.max_depth:
+            if self.budget is not None and self.budget.exceeded(self.crawled_count, self.error_count, self.transfer.wire_bytes):
+                break
+            # Probes and URLs whose circuit closed again go back in the queue
+            self.queue.extend(self.breaker.release())
+            item = self.next_target()
+            if item is None:
                 continue
+            current_url, target_url, depth = item
             
-            print(f"Crawling (depth {depth}): {current_url}")
-            self.visited.add(current_url)
-            
-            # Try to get the page
-            response = self.safe_request(current_url)
+            # Try to get the page, once per final URL
+            response, owner = self.redirects.fetch_once(
+                target_url, lambda url: self.safe_request(url, stream=self.streaming))
+            if not owner:
+                continue
             
             if response is None:
                 print(f"Failed to get {current_url}")
-                error_count += 1
+                if self.records is not None:
+                    self.records.fetched(target_url, -1, depth)
+                self.error_count += 1
+                self.page_done(target_url, False)
                 continue
             
+            if not self.streaming:
+                self.transfer.record(response)
+            elif depth >= self.max_depth:
+                # The body won't be parsed, so don't download it
+                response.close()
+                self.transfer.record(response, 0)
+            
+            # Remember redirects the server answered with
+            if response.history:
+                self.redirects.record_response(target_url, response)
+                self.visited.add(response.url)
+            if self.records is not None:
+                self.records.fetched(response.url, response.status_code, depth)
+                self.records.redirect(current_url, response.url)
+            
             try:
                 # Add current URL to all_links
                 self.all_links.add(current_url)
+                self.all_links.add(response.url)
                 
-                # Extract and add new links (only if we have text content)
-                if depth < self.max_depth and hasattr(response, 'text'):
-                    links = self.extract_links(current_url, response.text)
-                    for link in links:
-                        # Add all valid links to results
-                        self.all_links.add(link)
-                        
-                        # Only crawl internal links (same domain)
-                        parsed = urlparse(link)
-                        base_parsed = urlparse(self.base_url)
-                        if parsed.netloc == base_parsed.netloc and link not in self.visited:
-                            self.queue.append((link, depth + 1))
-                            
-                            # Also crawl decoded version if it's a base64 URL
-                            if '/decode/' in link:
-                                decoded_url = self.decode_base64_url(link)
-                                if decoded_url != link:
-                                    # Construct full decoded URL
-                                    if decoded_url.startswith('/'):
-                                        decoded_full_url = self.base_url + decoded_url
-                                    else:
-                                        decoded_full_url = urljoin(self.base_url, decoded_url)
-                                    
-                                    # Add decoded URL to results and crawl queue
-                                    self.all_links.add(decoded_full_url)
-                                    if decoded_full_url not in self.visited:
-                                        self.queue.append((decoded_full_url, depth + 1))
+                # Extract and add new links (streamed bodies are read by stream_links only)
+                if depth < self.max_depth and self.streaming:
+                    self.stream_links(response, depth)
+                elif depth < self.max_depth and hasattr(response, 'text'):
+                    self.queue_links(self.extract_links(response.url, response.text), depth, response.url)
                 
-                crawled_count += 1
+                self.crawled_count += 1
+                self.page_done(target_url, response.ok)
                 
             except Exception as e:
                 print(f"Error processing {current_url}: {e}")
-                error_count += 1
+                self.error_count += 1
+                self.page_done(target_url, False)
             
             # Small delay
             time.sleep(self.delay)
         
+        self.coverage.finish(len(self.all_links), self.crawled_count)
+        
         print("-" * 50)
         print(f"Crawling completed!")
-        print(f"Successfully crawled: {crawled_count} URLs")
-        print(f"Errors encountered: {error_count} URLs")
+        print(f"Successfully crawled: {self.crawled_count} URLs")
+        print(f"Errors encountered: {self.error_count} URLs")
+        print(f"Skipped (breaker open): {self.skipped_count} fetches, {self.breaker.pending()} URLs never fetched")
         print(f"Total unique links found: {len(self.all_links)}")
+        if self.budget is not None and self.budget.reason:
+            print(f"Stopped at the {self.budget.reason} budget ({self.budget.describe()}), "
+                  f"{len(self.queue)} URLs left in the queue")
+        print(self.transfer.summary())
+        self.timeouts.print_report()
+        self.breaker.print_report()
+        if self.budget is not None or self.best_first:
+            print(self.coverage.summary())
+        if self.streaming:
+            print(self.stream_stats.summary())
+        else:
+            self.fingerprints.print_report()
+        if self.records is not None:
+            print(self.records.summary())
     
+    @profiled('save')
     def save_results(self, filename="results.txt"):
         with open(filename, 'w', encoding='utf-8') as f:
             for link in sorted(self.all_links):
@@ -250,8 +239,13 @@ class SimpleBFSWebScraper:
                     if relative_path != "/" and relative_path.endswith("/"):
                         relative_path = relative_path[:-1]
                     
-                    # Decode base64 URLs if present
-                    decoded_path = self.decode_base64_url(relative_path)
+                    # Redirect sources (like /decode/ links) are written as "source -> target"
+                    target = self.redirects.redirect_target(link)
+                    if target is not None:
+                        decoded_path = target[len(self.base_url):] if target.startswith(self.base_url) else target
+                        decoded_path = decoded_path or "/"
+                    else:
+                        decoded_path = self.decode_base64_url(relative_path)
                     if decoded_path != relative_path:
                         # Remove trailing slash from decoded path too
                         if decoded_path != "/" and decoded_path.endswith("/"):
@@ -288,7 +282,10 @@ def main():
     scraper = SimpleBFSWebScraper(
         base_url=base_url,
         max_depth=3,
-        delay=0.2  # Very short delay
+        delay=0.2,  # Very short delay
+        streaming=False,  # Parse pages as they arrive, keeping links from slow pages
+        best_first=False,  # Fetch the URLs most likely to find new links first
+        budget=None        # e.g. CrawlBudget(seconds=60, pages=500) to stop early
     )
     
     try:
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Site Seeds from robots.txt and sitemap.xml
+Reads a site's robots rules and streams its sitemaps, so the scrapers can seed
+their queue with every listed page up front instead of discovering deep pages
+one fetch layer at a time
+"""
+
+import re
+import urllib.error
+import urllib.request
+import xml.etree.ElementTree as ET
+
+# Sitemap index files may point at more sitemaps; don't follow them forever
+MAX_SITEMAPS = 50
+
+
+class SiteSeeds:
+    """Rules and URLs read from a site's robots.txt and sitemaps"""
+
+    def __init__(self):
+        self.allow = []          # path prefixes
+        self.disallow = []       # path prefixes
+        self.deny_patterns = []  # regexes for rules with * or $ or a query
+        self.crawl_delay = 0
+        self.sitemaps = []
+        self.urls = []
+
+    def apply_to(self, url_filter):
+        """Add the robots rules to a UrlFilter"""
+        url_filter.add_rules(self.allow, self.disallow, self.deny_patterns)
+
+
+def robots_rule_pattern(rule):
+    """Turn a robots rule using * or $ (or a query) into a regex over the full URL"""
+    anchored = rule.endswith('$')
+    if anchored:
+        rule = rule[:-1]
+    body = '.*'.join(re.escape(part) for part in rule.split('*'))
+    return r'^[A-Za-z]+://[^/?#]*' + body + ('$' if anchored else '')
+
+
+def parse_robots_txt(text, user_agent='*'):
+    """Parse robots.txt into a SiteSeeds (rules for `user_agent`, or for * if it has none)"""
+    seeds = SiteSeeds()
+    groups = {}
+    agents = []
+    in_rules = False
+    for line in text.splitlines():
+        line = line.split('#', 1)[0].strip()
+        field, sep, value = line.partition(':')
+        if not sep:
+            continue
+        field, value = field.strip().lower(), value.strip()
+        if field == 'sitemap':
+            seeds.sitemaps.append(value)
+        elif field == 'user-agent':
+            # Consecutive User-agent lines share the rules that follow
+            if in_rules:
+                agents, in_rules = [], False
+            agents.append(value.lower())
+            for agent in agents:
+                groups.setdefault(agent, [])
+        elif field in ('allow', 'disallow', 'crawl-delay'):
+            in_rules = True
+            for agent in agents:
+                groups[agent].append((field, value))
+
+    rules = groups.get(user_agent.lower(), groups.get('*', []))
+    for field, value in rules:
+        if field == 'crawl-delay':
+            try:
+                seeds.crawl_delay = float(value)
+            except ValueError:
+                pass
+        elif not value:
+            # An empty Disallow allows everything
+            continue
+        elif any(char in value for char in '*$?'):
+            # Wildcard allow rules can't be expressed as a deny; skipping them is conservative
+            if field == 'disallow':
+                seeds.deny_patterns.append(robots_rule_pattern(value))
+        elif field == 'allow':
+            seeds.allow.append(value)
+        else:
+            seeds.disallow.append(value)
+    return seeds
+
+
+def open_stream(url, session=None, timeout=5):
+    """Return (status code, iterator of body chunks) for a URL"""
+    if session is not None:
+        response = session.get(url, stream=True, timeout=timeout)
+        return response.status_code, response.iter_content(65536)
+    try:
+        response = urllib.request.urlopen(url, timeout=timeout)
+    except urllib.error.HTTPError as e:
+        return e.code, iter(())
+    return response.status, iter(lambda: response.read(65536), b'')
+
+
+def iter_sitemap(chunks):
+    """Stream-parse a sitemap, yielding ('url', loc) and ('sitemap', loc) entries
+
+    Elements are discarded as soon as they are read, so memory stays flat however
+    large the sitemap is.
+    """
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    root = None
+    loc = None
+    for chunk in chunks:
+        parser.feed(chunk)
+        for event, element in parser.read_events():
+            tag = element.tag.rpartition('}')[2]
+            if event == 'start':
+                if root is None:
+                    root = element
+                continue
+            if tag == 'loc':
+                loc = (element.text or '').strip()
+            elif tag in ('url', 'sitemap'):
+                if loc:
+                    yield tag, loc
+                loc = None
+                root.clear()
+    parser.close()
+
+
+def load_site_seeds(base_url, session=None, user_agent='*'):
+    """Read robots.txt and every sitemap it lists (or /sitemap.xml) for a site"""
+    base_url = base_url.rstrip('/')
+    try:
+        status, chunks = open_stream(base_url + '/robots.txt', session)
+        text = b''.join(chunks).decode('utf-8', 'replace') if status == 200 else ''
+    except Exception as e:
+        print(f"Could not read robots.txt: {e}")
+        text = ''
+    seeds = parse_robots_txt(text, user_agent)
+
+    pending = seeds.sitemaps or [base_url + '/sitemap.xml']
+    seen = set()
+    while pending and len(seen) < MAX_SITEMAPS:
+        sitemap_url = pending.pop(0)
+        if sitemap_url in seen:
+            continue
+        seen.add(sitemap_url)
+        try:
+            status, chunks = open_stream(sitemap_url, session)
+            if status != 200:
+                continue
+            for kind, loc in iter_sitemap(chunks):
+                if kind == 'sitemap':
+                    pending.append(loc)
+                else:
+                    seeds.urls.append(loc)
+        except Exception as e:
+            print(f"Could not read sitemap {sitemap_url}: {e}")
+    return seeds
@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Streaming Link Parser for the requests-based scrapers
+Feeds response chunks into an incremental HTML tokenizer as they arrive, so a
+page's links reach the crawl queue before its body finishes, and the links of
+a page cut off by its deadline are kept instead of thrown away
+"""
+
+import codecs
+import time
+from html.parser import HTMLParser
+
+import requests
+import urllib3
+
+CHUNK_SIZE = 8192
+
+# Errors a body read can end with; the links found before them are kept
+READ_ERRORS = (requests.exceptions.RequestException, urllib3.exceptions.HTTPError, OSError)
+
+
+class LinkTokenizer(HTMLParser):
+    """Incremental HTML tokenizer collecting the links parse_tag_links finds
+
+    Links are recorded as soon as their start tag is complete, in document order.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []
+        self.taken = 0
+
+    def handle_starttag(self, tag, attrs):
+        # Like BeautifulSoup, the last of a repeated attribute wins
+        attrs = dict(attrs)
+        if tag == 'a' and 'href' in attrs:
+            self.links.append(attrs['href'] or '')
+        if tag == 'form' and 'action' in attrs:
+            self.links.append(attrs['action'] or '')
+        for name in ('data-url', 'data-href'):
+            if name in attrs:
+                self.links.append(attrs[name] or '')
+
+    def take(self):
+        """Return the links found since the last call"""
+        links = self.links[self.taken:]
+        self.taken = len(self.links)
+        return links
+
+
+def tag_links(html_content):
+    """The links parse_tag_links finds, with the standard library's tokenizer instead of BeautifulSoup"""
+    tokenizer = LinkTokenizer()
+    tokenizer.feed(html_content)
+    tokenizer.close()
+    return tokenizer.links
+
+
+class StreamedPage:
+    """The part of a body that was read and the tag links found in it"""
+
+    def __init__(self, url):
+        self.url = url
+        self.text = ''
+        self.tag_links = []
+        self.decoded_bytes = 0
+        self.complete = False
+        self.error = None        # why the body was cut short, if it was
+        self.first_link_sec = None
+        self.elapsed_sec = 0.0
+
+
+def body_decoder(response):
+    """Incremental decoder for the response's charset (as response.text would use)"""
+    try:
+        return codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    except LookupError:
+        return codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+
+def response_chunks(response, chunk_size=CHUNK_SIZE, decode_content=True):
+    """Yield decompressed body chunks as soon as the socket delivers them
+
+    With decode_content=False the bytes come as sent, still compressed.
+    """
+    read1 = getattr(response.raw, 'read1', None)
+    if read1 is None:
+        # Older urllib3: iter_content waits for a full chunk
+        if decode_content:
+            yield from response.iter_content(chunk_size)
+        else:
+            yield from response.raw.stream(chunk_size, decode_content=False)
+        return
+    while True:
+        try:
+            chunk = read1(chunk_size, decode_content=decode_content)
+        except urllib3.exceptions.ReadTimeoutError as e:
+            # Raised as requests' own error, like iter_content does
+            raise requests.exceptions.ReadTimeout(e)
+        except urllib3.exceptions.ProtocolError as e:
+            raise requests.exceptions.ChunkedEncodingError(e)
+        if not chunk:
+            return
+        yield chunk
+
+
+def read_body(response, deadline, chunk_size=65536):
+    """Buffer a stream=True response's body as requests would, unless it runs past `deadline`
+
+    A per-read timeout never fires for a server that keeps trickling bytes; this
+    bounds the whole body. Raises requests' ReadTimeout when the deadline passes.
+    """
+    chunks = []
+    for chunk in response_chunks(response, chunk_size):
+        chunks.append(chunk)
+        if time.monotonic() > deadline:
+            response.close()
+            raise requests.exceptions.ReadTimeout(f"body of {response.url} still arriving at its deadline")
+    response._content = b''.join(chunks)
+    response._content_consumed = True
+    # Hands the connection back to the pool
+    response.close()
+    return response
+
+
+def stream_page(response, deadline, on_links=None, chunk_size=CHUNK_SIZE):
+    """Read a stream=True response, handing its links to on_links as they are parsed
+
+    Stops at the end of the body, on a read error or once time.monotonic() passes
+    `deadline`; the response is closed either way. Returns a StreamedPage.
+    """
+    start = time.monotonic()
+    page = StreamedPage(response.url)
+    decoder = body_decoder(response)
+    tokenizer = LinkTokenizer()
+    parts = []
+
+    def feed(text, final=False):
+        parts.append(text)
+        tokenizer.feed(text)
+        if final:
+            tokenizer.close()
+        links = tokenizer.take()
+        if links:
+            if page.first_link_sec is None:
+                page.first_link_sec = time.monotonic() - start
+            if on_links is not None:
+                on_links(links)
+
+    try:
+        for chunk in response_chunks(response, chunk_size):
+            page.decoded_bytes += len(chunk)
+            feed(decoder.decode(chunk))
+            if time.monotonic() > deadline:
+                page.error = 'deadline'
+                break
+        else:
+            feed(decoder.decode(b'', final=True), final=True)
+            page.complete = True
+    except READ_ERRORS as e:
+        page.error = e.__class__.__name__
+    finally:
+        response.close()
+
+    # When the body is cut short, a tag still open at the cut is left out
+    page.text = ''.join(parts)
+    page.tag_links = tokenizer.links
+    page.elapsed_sec = time.monotonic() - start
+    return page
+
+
+class StreamStats:
+    """Running totals for streamed pages"""
+
+    def __init__(self):
+        self.pages = 0
+        self.cut_short = 0
+        self.salvaged_links = 0
+        self.first_link_sec = []
+
+    def record(self, page, links):
+        self.pages += 1
+        if page.first_link_sec is not None:
+            self.first_link_sec.append(page.first_link_sec)
+        if not page.complete:
+            self.cut_short += 1
+            self.salvaged_links += len(links)
+
+    def summary(self):
+        first = sorted(self.first_link_sec)
+        median = f"{first[len(first) // 2] * 1000:.1f} ms" if first else "n/a"
+        return (f"Streamed {self.pages} pages (median time to first link {median}), "
+                f"{self.cut_short} cut short with {self.salvaged_links} links salvaged")
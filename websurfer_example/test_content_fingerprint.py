@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Regression tests for content_fingerprint.py
+Run with: python -m pytest test_content_fingerprint.py (or python test_content_fingerprint.py)
+"""
+
+import importlib.util
+import os
+import unittest
+
+from content_fingerprint import ContentFingerprints
+from streaming_parser import tag_links
+
+SITE_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+BODY = ['<p>line %d</p>' % i for i in range(40)]
+SITE_PAGES = ['index.html', 'spots.html', 'about.html', os.path.join('gallery', 'mavericks-photos.html')]
+
+
+def no_scripts(html_content):
+    return []
+
+
+def read_page(name):
+    with open(os.path.join(SITE_ROOT, name), encoding='utf-8') as f:
+        return f.read()
+
+
+class NearDuplicateReuseTest(unittest.TestCase):
+    def assert_reuse_matches_full_parse(self, pages, max_delta=0.25):
+        fingerprints = ContentFingerprints(max_delta=max_delta)
+        for url, html in pages:
+            self.assertEqual(fingerprints.raw_links(url, html, tag_links, no_scripts), tag_links(html), url)
+        return fingerprints
+
+    def test_site_pages_keep_every_link(self):
+        # The pages share their stylesheet, so they are near-duplicates of each other
+        pages = [('/' + name, read_page(name)) for name in SITE_PAGES]
+        fingerprints = self.assert_reuse_matches_full_parse(pages, max_delta=1.0)
+        self.assertGreater(fingerprints.stats['near'], 0)
+        for first in pages:
+            for second in pages:
+                self.assert_reuse_matches_full_parse([first, second], max_delta=1.0)
+
+    def test_link_on_a_changed_title_page_is_kept(self):
+        # '/' also appears in the title line, which used to claim the logo link
+        spots, about = read_page('spots.html'), read_page('about.html')
+        fingerprints = self.assert_reuse_matches_full_parse([('/spots', spots), ('/about', about)], max_delta=1.0)
+        self.assertEqual(fingerprints.stats['near'], 1)
+        self.assertIn('/', fingerprints.raw_links('/about', about, tag_links, no_scripts))
+
+    @unittest.skipUnless(importlib.util.find_spec('bs4'), "bs4 is not installed")
+    def test_site_pages_with_beautifulsoup(self):
+        from web_scraper import BFSWebScraper
+        scraper = BFSWebScraper('http://localhost:8000')
+        fingerprints = ContentFingerprints(max_delta=1.0)
+        for name in SITE_PAGES:
+            html = read_page(name)
+            # Reused links come in document order, BeautifulSoup's grouped by kind
+            self.assertEqual(sorted(fingerprints.raw_links('/' + name, html, scraper.parse_tag_links, no_scripts)),
+                             sorted(scraper.parse_tag_links(html)), name)
+        self.assertGreater(fingerprints.stats['near'], 0)
+
+    def reuse(self, template, page):
+        """The template's links reused for `page`, checked against a full parse; None if not reused"""
+        fingerprints = ContentFingerprints()
+        fingerprints.raw_links('/template', template, tag_links, no_scripts)
+        links = fingerprints.reuse_template(fingerprints.clusters[0], page.splitlines())
+        if links is not None:
+            self.assertEqual(links, tag_links(page))
+        return links
+
+    def test_changed_lines_are_reparsed(self):
+        template = '\n'.join(BODY[:5] + ['<a href="/old">old</a>'] + BODY[5:] + ['<a href="/end">end</a>'])
+        page = '\n'.join(BODY[:5] + ['<a href="/new">new</a>', '<form action="/go"></form>'] + BODY[5:]
+                         + ['<a href="/end">end</a>'])
+        self.assertEqual(self.reuse(template, page), ['/new', '/go', '/end'])
+
+    def test_partly_changed_multiline_tag(self):
+        template = '\n'.join(BODY + ['<a', 'href="/one"', 'class="x">one</a>'])
+        self.assertIsNone(self.reuse(template, template.replace('href="/one"', 'href="/two"')))
+        self.assertIsNone(self.reuse(template, template.replace('class="x"', 'class="y" href="/two"')))
+
+    def test_change_opening_a_comment(self):
+        template = '\n'.join(BODY[:10] + ['<a href="/hidden">x</a>'] + BODY[10:])
+        page = '\n'.join(BODY[:9] + ['<!-- start', '<a href="/hidden">x</a>', '-->'] + BODY[10:])
+        self.assertIsNone(self.reuse(template, page))
+
+    def test_change_inside_a_script(self):
+        template = '\n'.join(['<script>', 'let a = 1;', '</script>', '<a href="/x">x</a>'] + BODY)
+        self.assertEqual(self.reuse(template, template.replace('let a = 1;', 'let a = "<a href=/no>";')), ['/x'])
+        self.assertIsNone(self.reuse(template, template.replace('let a = 1;', '</script><a href="/yes">')))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Regression tests for js_links.py
+Run with: python -m pytest test_js_links.py (or python test_js_links.py)
+"""
+
+import unittest
+
+from js_links import MAX_TEMPLATE_NESTING, scan_script_links, script_links
+
+
+class TemplateNestingTest(unittest.TestCase):
+    def test_deeply_nested_templates_do_not_raise(self):
+        # ~600 levels used to overflow the stack through tokenize/read_template
+        for levels in (600, 5000, 100000):
+            page = '<a href="/ok">ok</a><script>' + '`${' * levels + '</script>'
+            self.assertEqual(scan_script_links(page), [])
+
+    def test_nesting_within_the_limit_is_folded(self):
+        source = 'el.href = ' + '`${' * MAX_TEMPLATE_NESTING + "'/deep'" + '}`' * MAX_TEMPLATE_NESTING
+        self.assertEqual(set(script_links(source)), {'/deep'})
+
+    def test_shallow_templates_still_fold(self):
+        source = 'el.href = `/a/${`b`}/c`; fetch(`/api/${"x"}`)'
+        self.assertEqual(script_links(source), ['/a/b/c', '/api/x'])
+
+
+if __name__ == "__main__":
+    unittest.main()
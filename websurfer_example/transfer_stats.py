@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Transfer Statistics for the requests-based scrapers
+Asks servers for compressed responses and counts bytes on the wire separately
+from the decoded bytes the scraper actually parses
+"""
+
+# Every encoding urllib3 can decode here (gzip and deflate, plus br/zstd when installed)
+from urllib3.util.request import ACCEPT_ENCODING
+
+
+class TransferStats:
+    """Running totals of response sizes"""
+
+    def __init__(self):
+        self.responses = 0
+        self.compressed = 0
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+
+    def record(self, response, decoded=None):
+        """Count a requests response whose body has been read
+
+        Streamed responses pass the number of decoded bytes they read instead.
+        """
+        if decoded is None:
+            decoded = len(response.content or b'')
+        wire = decoded
+        raw = getattr(response, 'raw', None)
+        if raw is not None and hasattr(raw, 'tell'):
+            try:
+                # urllib3 counts the bytes it read from the socket, before decoding
+                wire = raw.tell() or decoded
+            except (OSError, ValueError):
+                pass
+        self.responses += 1
+        if response.headers.get('Content-Encoding'):
+            self.compressed += 1
+        self.wire_bytes += wire
+        self.decoded_bytes += decoded
+
+    def ratio(self):
+        return self.decoded_bytes / self.wire_bytes if self.wire_bytes else 1.0
+
+    def summary(self):
+        return (f"Transferred {self.wire_bytes / 1024:.1f} KB on the wire for "
+                f"{self.decoded_bytes / 1024:.1f} KB of content ({self.ratio():.1f}x, "
+                f"{self.compressed}/{self.responses} responses compressed)")
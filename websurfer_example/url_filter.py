@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+URL Filter shared by the scrapers
+Compiles scheme, host scope, extension, path prefix and regex rules once, so
+each page's link batch is checked with set lookups and string slicing instead
+of re-parsing every URL
+"""
+
+import re
+
+DEFAULT_SCHEMES = ('http', 'https')
+DEFAULT_SKIP_EXTENSIONS = ('.pdf', '.jpg', '.jpeg', '.png', '.gif', '.css', '.js', '.xml',
+                           '.zip', '.tar', '.gz')
+
+# Marks the end of a prefix in the trie
+_RULE = object()
+
+
+def split_url(url):
+    """Split an absolute URL into (scheme, host, path) without urlparse
+
+    Returns None for URLs without a '://' separator.
+    """
+    scheme, sep, rest = url.partition('://')
+    if not sep:
+        return None
+    end = len(rest)
+    for char in '/?#':
+        index = rest.find(char)
+        if index != -1 and index < end:
+            end = index
+    host = rest[:end]
+    path = rest[end:]
+    for char in '?#':
+        index = path.find(char)
+        if index != -1:
+            path = path[:index]
+    return scheme.lower(), host.lower(), path or '/'
+
+
+class PrefixTrie:
+    """Character trie mapping path prefixes to a rule; the longest prefix wins"""
+
+    def __init__(self, rules=()):
+        self.root = {}
+        self.size = 0
+        for prefix, rule in rules:
+            self.add(prefix, rule)
+
+    def add(self, prefix, rule):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        node[_RULE] = rule
+        self.size += 1
+
+    def match(self, path):
+        """Return the rule of the longest prefix of `path`, or None"""
+        node = self.root
+        rule = node.get(_RULE)
+        for char in path:
+            node = node.get(char)
+            if node is None:
+                break
+            rule = node.get(_RULE, rule)
+        return rule
+
+
+class UrlFilter:
+    """Compiled allow/deny rules deciding which links are kept and crawled
+
+    Two levels are checked:
+      - allows(url): the link is worth recording (scheme and extension rules)
+      - in_scope(url): the link may be crawled (also host, path prefix and regex rules)
+    """
+
+    def __init__(self, base_url, schemes=DEFAULT_SCHEMES, skip_extensions=DEFAULT_SKIP_EXTENSIONS,
+                 hosts=None, allow_prefixes=(), deny_prefixes=(), deny_patterns=()):
+        """
+        Args:
+            base_url (str): The crawl's start URL; its host is in scope by default
+            schemes (iterable): URL schemes to keep
+            skip_extensions (iterable): URL endings to drop (case-insensitive)
+            hosts (iterable): Hosts (with port) to crawl, default: the base URL's host
+            allow_prefixes (iterable): If given, only paths under these prefixes are crawled
+            deny_prefixes (iterable): Paths under these prefixes are not crawled
+            deny_patterns (iterable): Regexes; URLs matching any of them are not crawled
+        """
+        self.base_url = base_url
+        self.schemes = frozenset(scheme.lower() for scheme in schemes)
+        self.skip_extensions = frozenset(ext.lower() for ext in skip_extensions)
+        # Checking each distinct length costs one slice and one set lookup
+        self.extension_lengths = sorted({len(ext) for ext in self.skip_extensions})
+
+        base = split_url(base_url)
+        self.hosts = frozenset(host.lower() for host in hosts) if hosts else frozenset([base[1]])
+
+        self.prefixes = PrefixTrie([(prefix, True) for prefix in allow_prefixes]
+                                   + [(prefix, False) for prefix in deny_prefixes])
+        self.default_allowed = not allow_prefixes
+        self.deny_patterns = list(deny_patterns)
+        self.deny_regex = None
+        self.compile_patterns()
+
+    def compile_patterns(self):
+        """Combine the deny patterns into one regex"""
+        self.deny_regex = (re.compile('|'.join(f'(?:{pattern})' for pattern in self.deny_patterns))
+                           if self.deny_patterns else None)
+
+    def add_rules(self, allow_prefixes=(), deny_prefixes=(), deny_patterns=()):
+        """Add more crawl rules (e.g. from robots.txt) without changing the default scope"""
+        for prefix in allow_prefixes:
+            self.prefixes.add(prefix, True)
+        for prefix in deny_prefixes:
+            self.prefixes.add(prefix, False)
+        if deny_patterns:
+            self.deny_patterns.extend(deny_patterns)
+            self.compile_patterns()
+
+    def allows(self, url):
+        """Check if a link is worth keeping (replaces the scrapers' is_valid_url)"""
+        scheme, sep, _ = url.partition('://')
+        if not sep or scheme.lower() not in self.schemes:
+            return False
+        for length in self.extension_lengths:
+            if url[-length:].lower() in self.skip_extensions:
+                return False
+        return True
+
+    def is_internal(self, url):
+        """Check if a URL is on one of the crawled hosts"""
+        parts = split_url(url)
+        return parts is not None and parts[1] in self.hosts
+
+    def in_scope(self, url):
+        """Check if a kept link may be crawled"""
+        parts = split_url(url)
+        if parts is None or parts[1] not in self.hosts:
+            return False
+        if self.prefixes.size:
+            rule = self.prefixes.match(parts[2])
+            if rule is None:
+                rule = self.default_allowed
+            if not rule:
+                return False
+        return self.deny_regex is None or not self.deny_regex.search(url)
+
+    def filter(self, urls):
+        """Return the kept links of a batch, deduplicated, in their original order"""
+        seen = set()
+        kept = []
+        for url in urls:
+            if url not in seen:
+                seen.add(url)
+                if self.allows(url):
+                    kept.append(url)
+        return kept
+
+    def scope(self, urls):
+        """Return the links of a batch that may be crawled"""
+        return [url for url in urls if self.in_scope(url)]
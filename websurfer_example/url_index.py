@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Sorted URL Index for post-crawl queries
+Writes a crawl's URLs in sorted order into one file: front-coded blocks of
+URLs (each URL stored as the length it shares with the one before plus the
+rest), a table of block offsets, and status and depth columns in the same
+order. Queries run on a memory map: exact lookups binary search the blocks'
+first URLs, prefix scans read only the blocks they cover, and two crawls are
+compared in one merge pass, so nothing is loaded into RAM
+"""
+
+import argparse
+import json
+import mmap
+import struct
+import sys
+import time
+from array import array
+
+MAGIC = b'SURFIDX1'
+FOOTER = struct.Struct('<QQII8s')       # block table offset, URLs, URLs per block, metadata length, MAGIC
+BLOCK_SIZE = 16
+
+
+def write_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7f | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(buffer, pos):
+    """(value, position after it)"""
+    value = shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def shared_prefix(a, b):
+    length = min(len(a), len(b))
+    for i in range(length):
+        if a[i] != b[i]:
+            return i
+    return length
+
+
+class UrlIndexWriter:
+    """Writes URLs, which must come in ascending order, with their status and depth
+
+    Only the block offsets and the two columns are held until close().
+    """
+
+    def __init__(self, path, meta=None, block_size=BLOCK_SIZE):
+        self.path = path
+        self.meta = dict(meta or {})
+        self.block_size = block_size
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.offset = len(MAGIC)
+        self.blocks = array('Q')
+        self.statuses = array('h')
+        self.depths = array('h')
+        self.block = bytearray()
+        self.previous = None
+
+    def append(self, url, status=0, depth=-1):
+        key = url.encode('utf-8')
+        if self.previous is not None and key <= self.previous:
+            raise ValueError(f"URLs must be unique and sorted: {url!r} after {self.previous.decode()!r}")
+        if len(self.statuses) % self.block_size == 0:
+            # Each block starts with a whole URL, so it can be read on its own
+            self.flush_block()
+            self.blocks.append(self.offset)
+            shared = 0
+        else:
+            shared = shared_prefix(self.previous, key)
+            write_varint(self.block, shared)
+        write_varint(self.block, len(key) - shared)
+        self.block += key[shared:]
+        self.statuses.append(status)
+        self.depths.append(depth)
+        self.previous = key
+
+    def flush_block(self):
+        self.file.write(self.block)
+        self.offset += len(self.block)
+        self.block = bytearray()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush_block()
+        # The table and columns are read through memoryview casts, so keep them aligned
+        padding = -self.offset % 8
+        self.file.write(bytes(padding))
+        table_offset = self.offset + padding
+        for column in (self.blocks, self.statuses, self.depths):
+            column.tofile(self.file)
+        meta = json.dumps(self.meta).encode()
+        self.file.write(meta)
+        self.file.write(FOOTER.pack(table_offset, len(self.statuses), self.block_size, len(meta), MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class UrlIndex:
+    """Read-only view of a URL index through mmap
+
+    Entries are (url, status, depth); status is 0 for a URL that was found but
+    not fetched and -1 for a fetch that got no response, depth -1 if unknown.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < len(MAGIC) + FOOTER.size or self.map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a URL index")
+        table_offset, self.count, self.block_size, meta_length, magic = \
+            FOOTER.unpack_from(self.map, len(self.map) - FOOTER.size)
+        if magic != MAGIC:
+            raise ValueError(f"{path} was not closed properly")
+        self.meta = json.loads(self.map[len(self.map) - FOOTER.size - meta_length:len(self.map) - FOOTER.size])
+        self.view = memoryview(self.map)
+        blocks = -(-self.count // self.block_size)
+        statuses_offset = table_offset + 8 * blocks
+        depths_offset = statuses_offset + 2 * self.count
+        self.blocks = self.view[table_offset:statuses_offset].cast('Q')
+        self.statuses = self.view[statuses_offset:depths_offset].cast('h')
+        self.depths = self.view[depths_offset:depths_offset + 2 * self.count].cast('h')
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, url):
+        return self.find(url) is not None
+
+    def __iter__(self):
+        return self.scan(0)
+
+    def first_key(self, block):
+        length, pos = read_varint(self.map, self.blocks[block])
+        return self.map[pos:pos + length]
+
+    def block_keys(self, block):
+        """Every URL of a block, as UTF-8"""
+        pos = self.blocks[block]
+        key = b''
+        for i in range(min(self.block_size, self.count - block * self.block_size)):
+            shared, pos = read_varint(self.map, pos) if i else (0, pos)
+            length, pos = read_varint(self.map, pos)
+            key = key[:shared] + self.map[pos:pos + length]
+            pos += length
+            yield key
+
+    def lower_bound(self, key):
+        """Position of the first URL >= key (UTF-8)"""
+        if not self.count:
+            return 0
+        lo, hi = 0, len(self.blocks)
+        # The last block whose first URL is <= key
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.first_key(mid) <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        block = max(lo - 1, 0)
+        position = block * self.block_size
+        for found in self.block_keys(block):
+            if found >= key:
+                return position
+            position += 1
+        return position
+
+    def find(self, url):
+        """A URL's position in the index, or None; O(log n) block reads"""
+        key = url.encode('utf-8')
+        position = self.lower_bound(key)
+        if position < self.count and self.key_at(position) == key:
+            return position
+        return None
+
+    def key_at(self, position):
+        block, offset = divmod(position, self.block_size)
+        for i, key in enumerate(self.block_keys(block)):
+            if i == offset:
+                return key
+
+    def get(self, url):
+        """(status, depth) for a URL, or None if it isn't in the index"""
+        position = self.find(url)
+        if position is None:
+            return None
+        return self.statuses[position], self.depths[position]
+
+    def scan(self, position):
+        """(url, status, depth) in URL order from a position on"""
+        block, skip = divmod(position, self.block_size)
+        while block < len(self.blocks):
+            for key in self.block_keys(block):
+                if skip:
+                    skip -= 1
+                    continue
+                yield key.decode('utf-8'), self.statuses[position], self.depths[position]
+                position += 1
+            block += 1
+
+    def prefix(self, prefix):
+        """(url, status, depth) for every URL starting with `prefix`"""
+        for entry in self.scan(self.lower_bound(prefix.encode('utf-8'))):
+            if not entry[0].startswith(prefix):
+                return
+            yield entry
+
+    def merge(self, other):
+        """(url, (status, depth) or None, other's (status, depth) or None) over both indexes' URLs"""
+        mine, theirs = iter(self), iter(other)
+        a, b = next(mine, None), next(theirs, None)
+        while a is not None or b is not None:
+            if b is None or (a is not None and a[0] < b[0]):
+                yield a[0], a[1:], None
+                a = next(mine, None)
+            elif a is None or b[0] < a[0]:
+                yield b[0], None, b[1:]
+                b = next(theirs, None)
+            else:
+                yield a[0], a[1:], b[1:]
+                a, b = next(mine, None), next(theirs, None)
+
+    def difference(self, other):
+        """(url, status, depth) of the URLs in this index but not in `other`"""
+        for url, mine, theirs in self.merge(other):
+            if theirs is None and mine is not None:
+                yield (url,) + mine
+
+    def close(self):
+        for view in (self.blocks, self.statuses, self.depths, self.view):
+            view.release()
+        self.map.close()
+
+
+def write_records_index(records, path, meta=None):
+    """Index every found URL of a records.CrawlRecords with its status and depth"""
+    from records import FOUND
+
+    urls = records.urls
+    found = [url_id for url_id in range(len(records)) if records.flags[url_id] & FOUND]
+    found.sort(key=lambda url_id: urls.arena[urls.offsets[url_id]:urls.offsets[url_id + 1]])
+    with UrlIndexWriter(path, meta) as writer:
+        for url_id in found:
+            writer.append(urls[url_id], records.statuses[url_id], records.depths[url_id])
+    return path
+
+
+def read_records_tsv(path):
+    """(url, status, depth) from a records TSV written by CrawlRecords.save"""
+    with open(path, encoding='utf-8') as f:
+        next(f)
+        for line in f:
+            _, url, depth, status, _, _ = line.rstrip('\n').split('\t')
+            yield url, int(status), int(depth)
+
+
+def absolute(index, url):
+    """Paths like /spots/ are taken relative to the crawl's base URL"""
+    return index.meta.get('base_url', '') + url if url.startswith('/') else url
+
+
+def print_entry(url, status, depth):
+    print(f"{status:>4} {depth:>3}  {url}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query a crawl's sorted URL index")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build_parser = commands.add_parser('build', help="Index a records TSV (websurfer.py crawl --records)")
+    build_parser.add_argument('records')
+    build_parser.add_argument('index')
+    build_parser.add_argument('--base-url', default='http://localhost:8000')
+    get_parser = commands.add_parser('get', help="Status and depth of URLs")
+    get_parser.add_argument('index')
+    get_parser.add_argument('url', nargs='+')
+    prefix_parser = commands.add_parser('prefix', help="URLs under a prefix, e.g. /spots/")
+    prefix_parser.add_argument('index')
+    prefix_parser.add_argument('prefix')
+    prefix_parser.add_argument('--status', type=int, action='append', help="Only this status (repeatable)")
+    diff_parser = commands.add_parser('diff', help="URLs only in one crawl, and changed statuses")
+    diff_parser.add_argument('index')
+    diff_parser.add_argument('other')
+    info_parser = commands.add_parser('info', help="Summarize an index")
+    info_parser.add_argument('index')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        entries = sorted(read_records_tsv(args.records), key=lambda entry: entry[0].encode('utf-8'))
+        with UrlIndexWriter(args.index, {'base_url': args.base_url, 'source': args.records,
+                                         'created': time.strftime('%Y-%m-%dT%H:%M:%S')}) as writer:
+            for entry in entries:
+                writer.append(*entry)
+        print(f"🗂️  Indexed {len(entries)} URLs into {args.index}")
+        return 0
+
+    index = UrlIndex(args.index)
+    if args.command == 'get':
+        missing = 0
+        for url in args.url:
+            entry = index.get(absolute(index, url))
+            if entry is None:
+                print(f"   -   -  {url} (not in the index)")
+                missing += 1
+            else:
+                print_entry(url, *entry)
+        return 1 if missing else 0
+
+    if args.command == 'prefix':
+        matches = 0
+        for url, status, depth in index.prefix(absolute(index, args.prefix)):
+            if args.status is None or status in args.status:
+                print_entry(url, status, depth)
+                matches += 1
+        print(f"{matches} URLs")
+        return 0
+
+    if args.command == 'diff':
+        other = UrlIndex(args.other)
+        counts = {'-': 0, '+': 0, '~': 0}
+        for url, mine, theirs in index.merge(other):
+            if theirs is None:
+                mark, line = '-', f"{url} ({mine[0]})"
+            elif mine is None:
+                mark, line = '+', f"{url} ({theirs[0]})"
+            elif mine[0] != theirs[0]:
+                mark, line = '~', f"{url} ({mine[0]} -> {theirs[0]})"
+            else:
+                continue
+            counts[mark] += 1
+            print(f"{mark} {line}")
+        print(f"{counts['-']} only in {args.index}, {counts['+']} only in {args.other}, "
+              f"{counts['~']} with a different status")
+        return 0
+
+    statuses = {}
+    for status in index.statuses:
+        statuses[status] = statuses.get(status, 0) + 1
+    print(f"🗂️  {args.index}: {len(index)} URLs in {len(index.blocks)} blocks of {index.block_size}, "
+          f"{len(index.map) >> 10}KB, from {index.meta.get('base_url')}")
+    print("   " + ", ".join(f"{status}: {count}" for status, count in sorted(statuses.items())))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
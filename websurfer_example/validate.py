@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Results Validator
+Compares a results.txt with solution.txt by streaming both files and hashing
+their normalized entries, so multi-million-line results are scored without
+sorting, temp files or holding both files in memory. Reports found, missing
+and extra links with precision and recall, as text or JSON
+"""
+
+import argparse
+import itertools
+import json
+import math
+import os
+import sys
+
+# Memory one stored entry takes, relative to its length in the file (str and set overhead)
+ENTRY_EXPANSION = 4
+
+GREEN = '\033[0;32m'
+RED = '\033[0;31m'
+YELLOW = '\033[1;33m'
+BLUE = '\033[0;34m'
+PURPLE = '\033[0;35m'
+CYAN = '\033[0;36m'
+NC = '\033[0m'
+
+# (lowest recall %, headline, advice, colour)
+ASSESSMENTS = [
+    (90, "🚀 EXCELLENT! You're a web scraping master!", "You found almost all the links - impressive work!", GREEN),
+    (70, "🏄‍♂️ GREAT JOB! You're getting the hang of this!", "You found most links, but there's room for improvement.", YELLOW),
+    (40, "🌊 GOOD START! You're on the right track!", "You found some links, but you're missing quite a few.", YELLOW),
+    (0, "❌ NEEDS WORK! Keep practicing!", "You found very few links. Review the basics and try again!", RED),
+]
+
+
+def normalize_entry(line):
+    """Turn a results/solution line into the entries it stands for
+
+    Comments and blank lines stand for nothing, a decode line ("a -> b") for
+    both of its sides, and a trailing slash is dropped (except from "/").
+    """
+    line = line.strip()
+    if not line or line.startswith('#'):
+        return []
+    entries = []
+    for part in line.split(' -> '):
+        part = part.strip()
+        if part != '/' and part.endswith('/'):
+            part = part[:-1]
+        entries.append(part)
+    return entries
+
+
+def iter_entries(filename):
+    """Stream the normalized entries of a file, repeats included"""
+    with open(filename, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            # Inline fast path for the common plain link line
+            line = line.strip()
+            if not line or line[0] == '#':
+                continue
+            if ' -> ' in line:
+                yield from normalize_entry(line)
+                continue
+            if line[-1] == '/' and line != '/':
+                line = line[:-1]
+            yield line
+
+
+def load_entries(filename):
+    """Load a results.txt style file into a set of normalized entries"""
+    return set(iter_entries(filename))
+
+
+def partitions_for(filenames, memory_mb):
+    """Passes needed so one pass's entries fit in about memory_mb"""
+    size = sum(os.path.getsize(filename) for filename in filenames)
+    return max(1, math.ceil(size * ENTRY_EXPANSION / (memory_mb << 20)))
+
+
+class Validation:
+    """Counts of a comparison, plus up to `keep` example entries of each kind"""
+
+    def __init__(self, keep=None):
+        self.keep = keep
+        self.expected = 0
+        self.results = 0
+        self.duplicates = 0
+        self.found = []
+        self.missing = []
+        self.extra = []
+        self.found_count = 0
+        self.missing_count = 0
+        self.extra_count = 0
+
+    def sample(self, examples, entries):
+        room = len(entries) if self.keep is None else max(0, self.keep - len(examples))
+        examples.extend(itertools.islice(entries, room))
+
+    @property
+    def recall(self):
+        return self.found_count / self.expected if self.expected else 1.0
+
+    @property
+    def precision(self):
+        return self.found_count / self.results if self.results else 0.0
+
+    def report(self):
+        return {
+            'expected': self.expected,
+            'results': self.results,
+            'duplicates': self.duplicates,
+            'found': self.found_count,
+            'missing': self.missing_count,
+            'extra': self.extra_count,
+            'recall': self.recall,
+            'precision': self.precision,
+            'found_links': sorted(self.found),
+            'missing_links': sorted(self.missing),
+            'extra_links': sorted(self.extra),
+        }
+
+
+def validate(results_file, solution_file, partitions=1, keep=None):
+    """Compare two files in `partitions` passes, each holding only the entries hashed to it
+
+    One pass is a plain hash join. More passes read both files again each
+    time but keep memory to about 1/partitions of the entries.
+    """
+    validation = Validation(keep)
+    for partition in range(partitions):
+        expected = set()
+        for entry in iter_entries(solution_file):
+            if hash(entry) % partitions == partition:
+                expected.add(entry)
+        seen = set()
+        for entry in iter_entries(results_file):
+            if hash(entry) % partitions != partition:
+                continue
+            if entry in seen:
+                validation.duplicates += 1
+                continue
+            seen.add(entry)
+        found = seen & expected
+        missing = expected - seen
+        extra = seen - expected
+        validation.expected += len(expected)
+        validation.results += len(seen)
+        validation.found_count += len(found)
+        validation.missing_count += len(missing)
+        validation.extra_count += len(extra)
+        validation.sample(validation.found, found)
+        validation.sample(validation.missing, missing)
+        validation.sample(validation.extra, extra)
+    return validation
+
+
+def print_links(title, links, count, mark, colour, empty):
+    print(f"\n{colour}{mark} {title} ({count}){NC}")
+    print(f"{BLUE}========================{NC}")
+    for link in sorted(links):
+        print(f"{colour}{mark} {link}{NC}")
+    if count > len(links):
+        print(f"{colour}   ... and {count - len(links)} more{NC}")
+    if not count:
+        print(empty)
+
+
+def print_report(validation):
+    recall = int(validation.recall * 100)
+    print(f"\n{GREEN}✅ SCORING SUMMARY{NC}")
+    print(f"{BLUE}==================={NC}")
+    print(f"{GREEN}Total links available: {validation.expected}{NC}")
+    print(f"{GREEN}Links you found: {validation.found_count}{NC}")
+    print(f"{RED}Links you missed: {validation.missing_count}{NC}")
+    print(f"{YELLOW}Other links you listed: {validation.extra_count}{NC}")
+    print(f"{YELLOW}Success rate: {recall}% (precision {validation.precision:.0%}){NC}")
+
+    print(f"\n{PURPLE}🏆 PERFORMANCE ASSESSMENT{NC}")
+    print(f"{BLUE}======================={NC}")
+    for threshold, headline, advice, colour in ASSESSMENTS:
+        if recall >= threshold:
+            print(f"{GREEN if threshold >= 70 else colour}{headline}{NC}")
+            print(f"{colour}{advice}{NC}")
+            break
+
+    print_links("LINKS YOU FOUND", validation.found, validation.found_count, '✅', GREEN,
+                f"{RED}❌ No links found!{NC}")
+    print_links("LINKS YOU MISSED", validation.missing, validation.missing_count, '❌', RED,
+                f"{GREEN}✅ No links missed! Perfect score!{NC}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score results.txt against solution.txt")
+    parser.add_argument('results', nargs='?', default='results.txt')
+    parser.add_argument('solution', nargs='?', default='solution.txt')
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    parser.add_argument('--show', type=int, default=200,
+                        help="Links listed per kind (default: 200, -1 for all)")
+    parser.add_argument('--memory-mb', type=int, default=256,
+                        help="Memory per pass; larger inputs are compared in several passes")
+    parser.add_argument('--partitions', type=int, help="Number of passes (default: from --memory-mb)")
+    args = parser.parse_args()
+
+    for filename, hint in ((args.results, "Make sure you've created results.txt with your scraped links"),
+                           (args.solution, "The solution file should be provided by the interviewer")):
+        if not os.path.isfile(filename):
+            if not args.json:
+                print(f"{RED}❌ Error: {filename} not found!{NC}")
+                print(f"{YELLOW}💡 {hint}{NC}")
+            else:
+                print(json.dumps({'error': f"{filename} not found"}))
+            return 1
+
+    partitions = args.partitions or partitions_for((args.results, args.solution), args.memory_mb)
+    validation = validate(args.results, args.solution, partitions, None if args.show < 0 else args.show)
+    if args.json:
+        print(json.dumps(validation.report(), indent=2))
+        return 0
+
+    print(f"{CYAN}🏄‍♂️ NorCal Surf Adventures - Web Scraping Interview Validator 🌊{NC}")
+    print(f"{BLUE}================================================{NC}")
+    print_report(validation)
+    print(f"\n{BLUE}🌊 Happy scraping! 🏄‍♂️{NC}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
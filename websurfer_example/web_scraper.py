@@ -5,19 +5,31 @@ Crawls the website using breadth-first search and saves all discovered links to
 """
 
 import requests
-from urllib.parse import urljoin, urlparse
-from bs4 import BeautifulSoup
 from collections import deque
 import time
-import re
 import signal
 import sys
 import threading
-from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
-import base64
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from redirect_map import RedirectMap
+from url_filter import UrlFilter
+from content_fingerprint import ContentFingerprints
+from transfer_stats import ACCEPT_ENCODING, TransferStats
+from streaming_parser import StreamStats, read_body
+from adaptive_timeout import AdaptiveTimeouts
+from circuit_breaker import FAILURE, OK, TIMEOUT, CircuitBreaker
+from concurrency import THROTTLED, AIMDLimiter, outcome_of, retry_after_seconds
+from crawl_budget import BestFirstFrontier, CoverageCurve
+from profiling import NullProfiler, profiled
+from records import FOUND, VISITED, CrawlRecords
+from crawl_pipeline import CrawlPipeline
 
-class BFSWebScraper:
-    def __init__(self, base_url, max_depth=3, delay=1):
+class BFSWebScraper(CrawlPipeline):
+    def __init__(self, base_url, max_depth=3, delay=1, url_filter=None, use_sitemap=True,
+                 streaming=False, body_deadline=2.0, timeouts=None, breaker=None,
+                 concurrent=False, limiter=None, max_retries=5, transport=None, session=None,
+                 executor=None, budget=None, best_first=False, parser='html.parser',
+                 profiler=None, compact=False):
         """
         Initialize the BFS web scraper
         
@@ -25,16 +37,68 @@ class BFSWebScraper:
             base_url (str): The starting URL to crawl
             max_depth (int): Maximum depth to crawl
             delay (float): Delay between requests in seconds
+            url_filter (UrlFilter): Link filter and crawl scope (default: same host as base_url)
+            use_sitemap (bool): Honour robots.txt and seed the queue from the sitemap
+            streaming (bool): Parse bodies as they arrive and queue links right away
+            body_deadline (float): Seconds a streamed page may take; links found by then are kept
+            timeouts (AdaptiveTimeouts): Per-route request timeouts (default: learned from this crawl)
+            breaker (CircuitBreaker): Skips hosts and path prefixes that keep failing
+            concurrent (bool): Keep several requests in flight instead of sleeping `delay` between them
+            limiter (AIMDLimiter): How many requests may be in flight (default: adapts to the server)
+            max_retries (int): Times a URL answered with 429 Too Many Requests is queued again
+            transport (HTTPAdapter): Sends every request instead of the network (e.g. http_archive.ReplayAdapter)
+            session (requests.Session): Session to fetch with, e.g. one shared by several crawls
+            executor (ThreadPoolExecutor): Fetch worker pool, e.g. one shared by several crawls
+            budget (CrawlBudget): Wall time, page, byte and error limits that end the crawl early
+            best_first (bool): Fetch the URLs most likely to find new links first instead of in BFS order
+            parser (str): BeautifulSoup parser for tag links ('html.parser', 'lxml', 'html5lib'),
+                or 'tokenizer' for the standard library's tokenizer without bs4
+            profiler (StageProfiler): Times fetching, parsing, script scans, URL handling and saving
+            compact (bool): Keep URLs, the queue and per-URL metadata (depth, parent, status,
+                redirect target, links) in compact arrays (records.CrawlRecords) instead of sets
         """
         self.base_url = base_url
         self.max_depth = max_depth
         self.delay = delay
-        self.visited = set()
-        self.queue = deque([(base_url, 0)])  # (url, depth)
-        self.all_links = set()
-        self.session = requests.Session()
+        self.best_first = best_first
+        self.parser = parser
+        self.profiler = profiler or NullProfiler()
+        self.records = CrawlRecords() if compact else None
+        if compact:
+            self.visited = self.records.view(VISITED)
+            self.all_links = self.records.view(FOUND)
+        else:
+            self.visited = set()
+            self.all_links = set()
+        if best_first:
+            self.queue = BestFirstFrontier([(base_url, 0)])
+        elif compact:
+            self.queue = self.records.frontier([(base_url, 0)])
+        else:
+            self.queue = deque([(base_url, 0)])  # (url, depth)
+        self.budget = budget
+        self.coverage = CoverageCurve()
+        self.crawled_count = 0
+        self.error_count = 0
+        self.skipped_count = 0
+        self.redirects = RedirectMap()
+        self.url_filter = url_filter or UrlFilter(base_url)
+        self.use_sitemap = use_sitemap
+        self.fingerprints = ContentFingerprints()
+        self.transfer = TransferStats()
+        self.streaming = streaming
+        self.body_deadline = body_deadline
+        self.stream_stats = StreamStats()
+        self.timeouts = timeouts or AdaptiveTimeouts(default=1.0)
+        self.breaker = breaker or CircuitBreaker()
+        self.concurrent = concurrent
+        self.limiter = limiter or AIMDLimiter()
+        self.max_retries = max_retries
+        self.retries = {}
+        self.session = session or requests.Session()
         self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36',
+            'Accept-Encoding': ACCEPT_ENCODING
         })
         # Configure session for better timeout handling
         self.session.timeout = (2, 5)  # (connect_timeout, read_timeout) - much shorter
@@ -44,132 +108,203 @@ class BFSWebScraper:
         import urllib3
         urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
         # Thread pool for handling requests
-        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.executor = executor or ThreadPoolExecutor(max_workers=self.limiter.maximum if concurrent else 1)
+        if concurrent:
+            # One pooled connection per worker, or urllib3 discards the extras
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.limiter.maximum)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+        if transport is not None:
+            self.session.mount('http://', transport)
+            self.session.mount('https://', transport)
     
     def is_valid_url(self, url):
         """Check if URL is valid (including external URLs)"""
+        return self.url_filter.allows(url)
+    
+    def fetch(self, url, timeout, stream=False):
+        """GET a URL; a buffered body must be complete within `timeout`"""
+        deadline = time.monotonic() + timeout
+        response = self.session.get(url, timeout=(min(1, timeout), timeout), stream=True)
+        return response if stream else read_body(response, deadline)
+    
+    @profiled('fetch')
+    def timed_fetch(self, url, timeout=None, stream=False):
+        """Fetch a URL in the calling thread and feed the outcome to the timeouts, breaker and limiter
+        
+        Without an explicit timeout the URL's learned one is used, and the outcome
+        is fed back into it.
+        """
+        adaptive = timeout is None
+        if adaptive:
+            timeout = self.timeouts.timeout(url)
+        start = time.monotonic()
         try:
-            parsed = urlparse(url)
-            
-            # Skip non-HTTP/HTTPS URLs
-            if parsed.scheme not in ['http', 'https']:
+            response = self.fetch(url, timeout, stream)
+        except requests.exceptions.Timeout:
+            if adaptive:
+                self.timeouts.record_timeout(url, timeout)
+            self.breaker.record(url, TIMEOUT)
+            self.limiter.record(timeout, TIMEOUT)
+            print(f"Request timeout for {url} after {timeout:.2f}s")
+            return None
+        except Exception as e:
+            self.breaker.record(url, FAILURE)
+            self.limiter.record(time.monotonic() - start, FAILURE)
+            print(f"Request error for {url}: {e}")
+            return None
+        elapsed = time.monotonic() - start
+        if adaptive:
+            self.timeouts.record(url, elapsed)
+        outcome = outcome_of(response)
+        # Being throttled says nothing about whether the route works
+        self.breaker.record(url, OK if outcome == THROTTLED else outcome)
+        self.limiter.record(elapsed, outcome, retry_after_seconds(response.headers.get('Retry-After')))
+        return response
+    
+    def make_request_with_timeout(self, url, timeout=None, stream=False):
+        """Make a request with strict timeout handling"""
+        budget = timeout or self.timeouts.timeout(url)
+        future = self.executor.submit(self.timed_fetch, url, timeout, stream)
+        try:
+            # fetch() gives up by itself, at most one read past the timeout,
+            # and timed_fetch records that timeout
+            return future.result(timeout=budget * 2)
+        except FutureTimeoutError:
+            print(f"Request timeout for {url} after {budget * 2:.2f}s")
+            return None
+    
+    def retry_later(self, current_url, target_url, depth):
+        """Queue a throttled URL again; returns False once it has used up its retries"""
+        tries = self.retries[current_url] = self.retries.get(current_url, 0) + 1
+        if tries > self.max_retries:
+            return False
+        print(f"Throttled (429): {current_url}, retrying in {self.limiter.pause_remaining():.1f}s")
+        self.visited.discard(current_url)
+        self.visited.discard(target_url)
+        self.redirects.forget(target_url)
+        self.queue.appendleft((current_url, depth))
+        return True
+    
+    @profiled('process')
+    def process_response(self, current_url, target_url, depth, response):
+        """Record a fetched page and queue its links; returns True if it was crawled"""
+        try:
+            if response is None:
+                print(f"Failed to get response for {current_url}")
+                self.visited.add(current_url)
+                if self.records is not None:
+                    self.records.fetched(target_url, -1, depth)
+                self.error_count += 1
+                self.page_done(target_url, False)
                 return False
             
-            # Skip common non-content URLs
-            skip_extensions = ['.pdf', '.jpg', '.jpeg', '.png', '.gif', '.css', '.js', '.xml', '.zip', '.tar', '.gz']
-            if any(url.lower().endswith(ext) for ext in skip_extensions):
+            # Remember redirects the server answered with
+            if response.history:
+                self.redirects.record_response(target_url, response)
+                self.visited.add(response.url)
+            if self.records is not None:
+                self.records.fetched(response.url, response.status_code, depth)
+                self.records.redirect(current_url, response.url)
+            
+            if not self.streaming:
+                self.transfer.record(response)
+            elif not response.ok or depth >= self.max_depth:
+                # The body won't be parsed, so don't download it
+                response.close()
+                self.transfer.record(response, 0)
+            
+            if response.status_code == 429 and self.retry_later(current_url, target_url, depth):
                 return False
+            response.raise_for_status()
             
+            # Add current URL to all_links
+            self.all_links.add(current_url)
+            self.all_links.add(response.url)
+            
+            # Extract and add new links
+            if depth < self.max_depth:
+                if self.streaming:
+                    self.stream_links(response, depth)
+                else:
+                    self.queue_links(self.extract_links(response.url, response.text), depth, response.url)
+            
+            self.crawled_count += 1
+            self.page_done(target_url, True)
             return True
-        except:
+            
+        except requests.exceptions.Timeout:
+            print(f"Timeout error crawling {current_url}")
+            self.visited.add(current_url)  # Mark as visited to avoid infinite retries
+        except requests.exceptions.ConnectionError:
+            print(f"Connection error crawling {current_url}")
+            self.visited.add(current_url)  # Mark as visited to avoid infinite retries
+        except requests.exceptions.RequestException as e:
+            print(f"Request error crawling {current_url}: {e}")
+            self.visited.add(current_url)  # Mark as visited to avoid infinite retries
+        except Exception as e:
+            print(f"Unexpected error crawling {current_url}: {e}")
+            self.visited.add(current_url)  # Mark as visited to avoid infinite retries
+        self.error_count += 1
+        self.page_done(target_url, False)
+        return False
+    
+    def out_of_budget(self):
+        """Check the crawl budget before starting another fetch"""
+        if self.budget is None:
             return False
+        return self.budget.exceeded(self.crawled_count, self.error_count, self.transfer.wire_bytes) is not None
     
-    def extract_links(self, url, html_content):
-        """Extract all links from HTML content including dynamic ones"""
-        soup = BeautifulSoup(html_content, 'html.parser')
-        links = []
-        
-        # Extract links from <a> tags
-        for link in soup.find_all('a', href=True):
-            href = link['href']
-            absolute_url = urljoin(url, href)
+    def crawl_sequentially(self):
+        """Fetch one URL at a time, sleeping `delay` after each page"""
+        while self.queue and not self.out_of_budget():
+            # Probes and URLs whose circuit closed again go back in the queue
+            self.queue.extend(self.breaker.release())
+            item = self.next_target()
+            if item is None:
+                continue
+            current_url, target_url, depth = item
             
-            if self.is_valid_url(absolute_url):
-                links.append(absolute_url)
-        
-        # Extract links from JavaScript (common patterns)
-        js_patterns = [
-            r'["\']([^"\']*\.php[^"\']*)["\']',  # PHP files
-            r'["\']([^"\']*\.html?[^"\']*)["\']',  # HTML files
-            r'["\']([^"\']*\.js[^"\']*)["\']',  # JS files
-            r'["\']([^"\']*\.json[^"\']*)["\']',  # JSON endpoints
-            r'["\']([^"\']*\.xml[^"\']*)["\']',  # XML endpoints
-            r'["\']([^"\']*api/[^"\']*)["\']',  # API endpoints
-            r'["\']([^"\']*ajax/[^"\']*)["\']',  # AJAX endpoints
-            r'["\']([^"\']*\/[a-zA-Z0-9_-]+\/[^"\']*)["\']',  # General path patterns
-            r'["\']([^"\']*\?[^"\']*)["\']',  # URLs with query parameters
-        ]
-        
-        for pattern in js_patterns:
-            matches = re.findall(pattern, html_content, re.IGNORECASE)
-            for match in matches:
-                if match.startswith('http'):
-                    absolute_url = match
-                else:
-                    absolute_url = urljoin(url, match)
-                
-                if self.is_valid_url(absolute_url):
-                    links.append(absolute_url)
-        
-        # Extract links from data attributes
-        for element in soup.find_all(attrs={'data-url': True}):
-            href = element['data-url']
-            absolute_url = urljoin(url, href)
-            if self.is_valid_url(absolute_url):
-                links.append(absolute_url)
-        
-        for element in soup.find_all(attrs={'data-href': True}):
-            href = element['data-href']
-            absolute_url = urljoin(url, href)
-            if self.is_valid_url(absolute_url):
-                links.append(absolute_url)
-        
-        # Extract links from onclick attributes
-        onclick_pattern = r'onclick=["\']([^"\']*)["\']'
-        onclick_matches = re.findall(onclick_pattern, html_content, re.IGNORECASE)
-        for match in onclick_matches:
-            # Look for URLs in onclick handlers
-            url_matches = re.findall(r'["\']([^"\']*\.(?:php|html?|js|json|xml)[^"\']*)["\']', match)
-            for url_match in url_matches:
-                absolute_url = urljoin(url, url_match)
-                if self.is_valid_url(absolute_url):
-                    links.append(absolute_url)
-        
-        # Extract links from form actions
-        for form in soup.find_all('form', action=True):
-            action = form['action']
-            absolute_url = urljoin(url, action)
-            if self.is_valid_url(absolute_url):
-                links.append(absolute_url)
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_links = []
-        for link in links:
-            if link not in seen:
-                seen.add(link)
-                unique_links.append(link)
-        
-        return unique_links
-    
-    def decode_base64_url(self, url):
-        """Decode base64-encoded URLs if possible"""
-        try:
-            # Check if URL contains /decode/ followed by base64
-            if '/decode/' in url:
-                parts = url.split('/decode/')
-                if len(parts) == 2:
-                    encoded_part = parts[1]
-                    # Try to decode the base64 part
-                    decoded_bytes = base64.b64decode(encoded_part)
-                    decoded_path = decoded_bytes.decode('utf-8')
-                    return decoded_path
-        except:
-            pass
-        return url
+            # Wait out a 429's Retry-After
+            time.sleep(self.limiter.pause_remaining())
+            
+            # Use the timeout-protected request method, once per final URL
+            response, owner = self.redirects.fetch_once(
+                target_url, lambda url: self.make_request_with_timeout(url, stream=self.streaming))
+            if owner and self.process_response(current_url, target_url, depth, response):
+                # Delay between requests
+                time.sleep(self.delay)
     
-    def make_request_with_timeout(self, url, timeout=10):
-        """Make a request with strict timeout handling"""
-        try:
-            future = self.executor.submit(self.session.get, url, timeout=(1, timeout))
-            response = future.result(timeout=timeout + 2)  # Add buffer for thread overhead
-            return response
-        except FutureTimeoutError:
-            print(f"Request timeout for {url} (thread timeout)")
-            return None
-        except Exception as e:
-            print(f"Request error for {url}: {e}")
-            return None
+    def crawl_concurrently(self):
+        """Keep as many URLs in flight as the limiter allows
+        
+        Pages are fetched on the executor's threads and parsed here, in the
+        order they finish; the limiter stands in for `delay`.
+        """
+        in_flight = {}  # future -> (url, final URL, depth)
+        while (self.queue and not self.out_of_budget()) or in_flight:
+            self.queue.extend(self.breaker.release())
+            # Once the budget is spent, only the fetches in flight are finished
+            while self.queue and self.limiter.available(len(in_flight)) and not self.out_of_budget():
+                item = self.next_target()
+                if item is None:
+                    continue
+                future = self.executor.submit(
+                    self.redirects.fetch_once, item[1],
+                    lambda url: self.timed_fetch(url, stream=self.streaming))
+                in_flight[future] = item
+            
+            if not in_flight:
+                # Everything left waits on a 429's Retry-After
+                time.sleep(self.limiter.pause_remaining())
+                continue
+            
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                current_url, target_url, depth = in_flight.pop(future)
+                response, owner = future.result()
+                if owner:
+                    self.process_response(current_url, target_url, depth, response)
     
     def crawl(self):
         """Perform BFS crawling"""
@@ -177,88 +312,47 @@ class BFSWebScraper:
         print(f"Max depth: {self.max_depth}")
         print("-" * 50)
         
-        crawled_count = 0
-        error_count = 0
+        if self.budget is not None:
+            self.budget.start()
+        self.coverage.start()
+        if self.use_sitemap:
+            self.seed_frontier()
         
-        while self.queue:
-            current_url, depth = self.queue.popleft()
-            
-            if current_url in self.visited or depth > self.max_depth:
-                continue
-            
-            print(f"Crawling (depth {depth}): {current_url}")
-            self.visited.add(current_url)
-            
-            try:
-                # Use the timeout-protected request method
-                response = self.make_request_with_timeout(current_url, timeout=1)
-                
-                if response is None:
-                    print(f"Failed to get response for {current_url}")
-                    self.visited.add(current_url)
-                    error_count += 1
-                    continue
-                
-                response.raise_for_status()
-                
-                # Add current URL to all_links
-                self.all_links.add(current_url)
-                
-                # Extract and add new links
-                if depth < self.max_depth:
-                    links = self.extract_links(current_url, response.text)
-                    for link in links:
-                        # Add all valid links to results
-                        self.all_links.add(link)
-                        
-                        # Only crawl internal links (same domain)
-                        parsed = urlparse(link)
-                        base_parsed = urlparse(self.base_url)
-                        if parsed.netloc == base_parsed.netloc and link not in self.visited:
-                            self.queue.append((link, depth + 1))
-                            
-                            # Also crawl decoded version if it's a base64 URL
-                            if '/decode/' in link:
-                                decoded_url = self.decode_base64_url(link)
-                                if decoded_url != link:
-                                    # Construct full decoded URL
-                                    if decoded_url.startswith('/'):
-                                        decoded_full_url = self.base_url + decoded_url
-                                    else:
-                                        decoded_full_url = urljoin(self.base_url, decoded_url)
-                                    
-                                    # Add decoded URL to results and crawl queue
-                                    self.all_links.add(decoded_full_url)
-                                    if decoded_full_url not in self.visited:
-                                        self.queue.append((decoded_full_url, depth + 1))
-                
-                # Delay between requests
-                time.sleep(self.delay)
-                crawled_count += 1
-                
-            except requests.exceptions.Timeout:
-                print(f"Timeout error crawling {current_url}")
-                self.visited.add(current_url)  # Mark as visited to avoid infinite retries
-                error_count += 1
-            except requests.exceptions.ConnectionError:
-                print(f"Connection error crawling {current_url}")
-                self.visited.add(current_url)  # Mark as visited to avoid infinite retries
-                error_count += 1
-            except requests.exceptions.RequestException as e:
-                print(f"Request error crawling {current_url}: {e}")
-                self.visited.add(current_url)  # Mark as visited to avoid infinite retries
-                error_count += 1
-            except Exception as e:
-                print(f"Unexpected error crawling {current_url}: {e}")
-                self.visited.add(current_url)  # Mark as visited to avoid infinite retries
-                error_count += 1
+        self.crawled_count = 0
+        self.error_count = 0
+        self.skipped_count = 0
+        
+        if self.concurrent:
+            self.crawl_concurrently()
+        else:
+            self.crawl_sequentially()
+        
+        self.coverage.finish(len(self.all_links), self.crawled_count)
         
         print("-" * 50)
         print(f"Crawling completed!")
-        print(f"Successfully crawled: {crawled_count} URLs")
-        print(f"Errors encountered: {error_count} URLs")
+        print(f"Successfully crawled: {self.crawled_count} URLs")
+        print(f"Errors encountered: {self.error_count} URLs")
+        print(f"Skipped (breaker open): {self.skipped_count} fetches, {self.breaker.pending()} URLs never fetched")
         print(f"Total unique links found: {len(self.all_links)}")
+        if self.budget is not None and self.budget.reason:
+            print(f"Stopped at the {self.budget.reason} budget ({self.budget.describe()}), "
+                  f"{len(self.queue)} URLs left in the queue")
+        print(self.transfer.summary())
+        self.timeouts.print_report()
+        self.breaker.print_report()
+        if self.budget is not None or self.best_first:
+            print(self.coverage.summary())
+        if self.concurrent:
+            print(self.limiter.summary())
+        if self.streaming:
+            print(self.stream_stats.summary())
+        else:
+            self.fingerprints.print_report()
+        if self.records is not None:
+            print(self.records.summary())
     
+    @profiled('save')
     def save_results(self, filename="results.txt"):
         """Save all discovered links to a file"""
         with open(filename, 'w', encoding='utf-8') as f:
@@ -273,8 +367,13 @@ class BFSWebScraper:
                     if relative_path != "/" and relative_path.endswith("/"):
                         relative_path = relative_path[:-1]
                     
-                    # Decode base64 URLs if present
-                    decoded_path = self.decode_base64_url(relative_path)
+                    # Redirect sources (like /decode/ links) are written as "source -> target"
+                    target = self.redirects.redirect_target(link)
+                    if target is not None:
+                        decoded_path = target[len(self.base_url):] if target.startswith(self.base_url) else target
+                        decoded_path = decoded_path or "/"
+                    else:
+                        decoded_path = self.decode_base64_url(relative_path)
                     if decoded_path != relative_path:
                         # Remove trailing slash from decoded path too
                         if decoded_path != "/" and decoded_path.endswith("/"):
@@ -326,7 +425,11 @@ def main():
     scraper = BFSWebScraper(
         base_url=base_url,
         max_depth=3,  # Adjust this value to control crawl depth
-        delay=0.5     # Adjust this value to control request rate
+        delay=0.5,    # Adjust this value to control request rate
+        streaming=False,  # Parse pages as they arrive, keeping links from slow pages
+        concurrent=False,  # Adapt the requests in flight to the server instead of using delay
+        best_first=False,  # Fetch the URLs most likely to find new links first
+        budget=None        # e.g. CrawlBudget(seconds=60, pages=500) to stop early
     )
     
     try:
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+websurfer: one command line for every crawler
+Picks an engine (simple, threaded, async, headless, hybrid) and a link parser
+by flag and imports only what that engine needs, so Selenium, bs4 and
+friends are loaded only when selected. No reachability probe runs unless
+asked for. `websurfer.py startup` times interpreter start, engine imports
+and a one-page crawl per engine against the old eager-import-and-probe path
+
+    python websurfer.py crawl --engine async --max-depth 5 --budget-seconds 30
+    python websurfer.py engines
+    python websurfer.py startup --repeat 5
+"""
+
+import argparse
+import contextlib
+import importlib
+import importlib.util
+import os
+import sys
+import time
+
+EXAMPLE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# name -> (module, class, options set for the engine, modules it needs, description)
+ENGINES = {
+    'simple': ('simple_scraper', 'SimpleBFSWebScraper', {}, ('requests',),
+               "one request at a time"),
+    'threaded': ('web_scraper', 'BFSWebScraper', {'concurrent': True}, ('requests',),
+                 "adaptive number of requests in flight on a thread pool"),
+    'async': ('async_scraper', 'AsyncBFSWebScraper', {}, ('requests',),
+              "requests in flight as asyncio tasks over keep-alive connections"),
+    'headless': ('headless_scraper', 'HeadlessBFSWebScraper', {}, ('selenium',),
+                 "every page rendered in headless Chrome"),
+    'hybrid': ('hybrid_scraper', 'HybridBFSWebScraper', {'concurrent': True}, ('requests',),
+               "threaded, plus headless Chrome for pages with scripts (when Selenium is installed)"),
+}
+
+# Engines that do their own networking, so a recorded archive can't stand in for it
+UNREPLAYABLE = ('async', 'headless')
+
+# name -> modules it needs; 'tokenizer' is the standard library's HTML tokenizer
+PARSERS = {
+    'html.parser': ('bs4',),
+    'lxml': ('bs4', 'lxml'),
+    'html5lib': ('bs4', 'html5lib'),
+    'tokenizer': (),
+}
+
+# The old scripts' start: every scraper module imported up front, then a probe request
+LEGACY_STARTUP = """
+import sys
+sys.path.insert(0, {example_dir!r})
+import requests
+import bs4
+import simple_scraper, web_scraper
+try:
+    import headless_scraper
+except ImportError:
+    pass
+requests.get({base_url!r}, timeout=5, verify=False)
+"""
+
+
+def missing_modules(names):
+    """The modules of `names` that are not installed, found without importing them"""
+    return [name for name in names if importlib.util.find_spec(name) is None]
+
+
+def load_engine(name):
+    """Import an engine's module and return its scraper class"""
+    module_name, class_name = ENGINES[name][:2]
+    if EXAMPLE_DIR not in sys.path:
+        sys.path.insert(0, EXAMPLE_DIR)
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def accepted_options(scraper_class):
+    """Keyword arguments a scraper class takes, following **kwargs up to its base classes"""
+    import inspect
+
+    names = set()
+    for klass in scraper_class.__mro__:
+        if '__init__' not in vars(klass):
+            continue
+        parameters = inspect.signature(klass.__init__).parameters.values()
+        names.update(p.name for p in parameters if p.kind not in (p.VAR_KEYWORD, p.VAR_POSITIONAL))
+        if not any(p.kind == p.VAR_KEYWORD for p in parameters):
+            break
+    return names
+
+
+def url_filter_for(base_url, args):
+    if not (args.host or args.allow_prefix or args.deny_prefix or args.deny_pattern):
+        return None
+    from urllib.parse import urlsplit
+    from url_filter import UrlFilter
+    hosts = [urlsplit(base_url).netloc] + args.host if args.host else None
+    return UrlFilter(base_url, hosts=hosts, allow_prefixes=args.allow_prefix,
+                     deny_prefixes=args.deny_prefix, deny_patterns=args.deny_pattern)
+
+
+def budget_for(args):
+    limits = {'seconds': args.budget_seconds, 'pages': args.budget_pages,
+              'bytes': args.budget_kb << 10 if args.budget_kb is not None else None,
+              'errors': args.budget_errors}
+    if all(limit is None for limit in limits.values()):
+        return None
+    from crawl_budget import CrawlBudget
+    return CrawlBudget(**limits)
+
+
+def profiler_for(args):
+    """A StageProfiler if any --profile flag was given"""
+    if not (args.profile or args.profile_cprofile or args.profile_stacks or args.profile_memory):
+        return None
+    from profiling import StageProfiler
+    return StageProfiler(cprofile=args.profile_cprofile, trace_memory=args.profile_memory or 0,
+                         sample_interval=args.profile_stacks / 1000 if args.profile_stacks else None)
+
+
+def scraper_options(args, base_url):
+    """(keyword, value, flag) for every setting given on the command line"""
+    options = [('max_depth', args.max_depth, '--max-depth'),
+               ('delay', args.delay, '--delay'),
+               ('parser', args.parser, '--parser'),
+               ('streaming', args.streaming or None, '--streaming'),
+               ('body_deadline', args.body_deadline, '--body-deadline'),
+               ('use_sitemap', False if args.no_sitemap else None, '--no-sitemap'),
+               ('best_first', args.best_first or None, '--best-first'),
+               ('compact', args.compact or bool(args.records or args.index) or None, '--compact/--records/--index'),
+               ('concurrent', False if args.sequential else None, '--sequential'),
+               ('max_retries', args.max_retries, '--max-retries'),
+               ('js_wait_time', args.js_wait, '--js-wait'),
+               ('url_filter', url_filter_for(base_url, args), '--host/--allow-prefix/--deny-*'),
+               ('budget', budget_for(args), '--budget-*')]
+    if args.max_concurrency is not None:
+        from concurrency import AIMDLimiter
+        options.append(('limiter', AIMDLimiter(initial=min(4, args.max_concurrency),
+                                               maximum=args.max_concurrency), '--max-concurrency'))
+    return [option for option in options if option[1] is not None]
+
+
+def probe(base_url):
+    """The old scripts' reachability check, on request only"""
+    import urllib.error
+    import urllib.request
+
+    try:
+        with urllib.request.urlopen(base_url, timeout=5) as response:
+            print(f"✓ Server is reachable (Status: {response.status})")
+    except urllib.error.HTTPError as e:
+        print(f"✓ Server is reachable (Status: {e.code})")
+    except OSError as e:
+        print(f"✗ Cannot connect to {base_url}: {e}")
+        return False
+    return True
+
+
+def crawl(args):
+    missing = missing_modules(ENGINES[args.engine][3] + PARSERS.get(args.parser, ()))
+    if missing:
+        print(f"❌ The {args.engine} engine{f' with the {args.parser} parser' if args.parser else ''} "
+              f"needs {', '.join(missing)}: pip install {' '.join(missing)}")
+        return 1
+    if args.replay and args.engine in UNREPLAYABLE:
+        print(f"❌ The {args.engine} engine does its own networking and can't be replayed")
+        return 1
+
+    start = time.perf_counter()
+    scraper_class = load_engine(args.engine)
+    options = dict(ENGINES[args.engine][2])
+    base_url = args.base_url
+    if args.replay:
+        from http_archive import HttpArchive, ReplayAdapter
+        archive = HttpArchive(args.replay)
+        base_url = base_url or archive.meta['base_url']
+        options['transport'] = ReplayAdapter(archive, latency=args.replay_latency)
+    base_url = (base_url or 'http://localhost:8000').rstrip('/')
+
+    profiler = profiler_for(args)
+    accepted = accepted_options(scraper_class)
+    for name, value, flag in scraper_options(args, base_url) + [('profiler', profiler, '--profile')] * bool(profiler):
+        if name in accepted:
+            options[name] = value
+        else:
+            print(f"⚠️  The {args.engine} engine has no {flag} setting; ignoring it")
+    for name in [name for name in options if name not in accepted]:
+        print(f"⚠️  The {args.engine} engine can't use {name}; ignoring it")
+        del options[name]
+    if args.probe and not args.replay and not probe(base_url):
+        return 1
+
+    with open(os.devnull, 'w') as devnull, \
+            contextlib.redirect_stdout(devnull) if args.quiet else contextlib.nullcontext():
+        scraper = scraper_class(base_url=base_url, **options)
+        if profiler is not None:
+            profiler.start()
+        try:
+            scraper.crawl()
+        except KeyboardInterrupt:
+            print("\nCrawling interrupted by user; saving partial results...")
+        finally:
+            scraper.save_results(args.output)
+            if args.records and getattr(scraper, 'records', None) is not None:
+                print(f"Records saved to {', '.join(scraper.records.save(args.records))}")
+            if args.index and getattr(scraper, 'records', None) is not None:
+                from url_index import write_records_index
+                meta = {'base_url': base_url, 'engine': args.engine,
+                        'created': time.strftime('%Y-%m-%dT%H:%M:%S')}
+                print(f"URL index saved to {write_records_index(scraper.records, args.index, meta)}")
+            if hasattr(scraper, 'cleanup'):
+                scraper.cleanup()
+    print(f"✅ {len(scraper.all_links)} links from {len(scraper.visited)} pages with the {args.engine} "
+          f"engine in {time.perf_counter() - start:.2f}s -> {args.output}")
+    if profiler is not None:
+        profiler.finish()
+        print(profiler.summary())
+        directory = args.profile or 'profile'
+        print(f"Profile written to {', '.join(profiler.save(directory))}")
+    return 0
+
+
+def engines(args):
+    print("Engines:")
+    for name, (_, _, _, needs, description) in ENGINES.items():
+        missing = missing_modules(needs)
+        state = f"needs {', '.join(missing)}" if missing else "available"
+        print(f"  {name:<9} {description} [{state}]")
+    print("Parsers:")
+    for name, needs in PARSERS.items():
+        missing = missing_modules(needs)
+        print(f"  {name:<12} {'needs ' + ', '.join(missing) if missing else 'available'}")
+    return 0
+
+
+def timed_run(cmd):
+    """Wall seconds of a command, and its stdout"""
+    import subprocess
+
+    start = time.perf_counter()
+    output = subprocess.run(cmd, cwd=EXAMPLE_DIR, capture_output=True, text=True, check=True).stdout
+    return time.perf_counter() - start, output
+
+
+def measure_startup(base_url, names, repeat, output, parser=None):
+    """Median milliseconds of each step, each run in a fresh interpreter"""
+    import statistics
+
+    def median_ms(cmd):
+        return statistics.median(timed_run(cmd)[0] for _ in range(repeat)) * 1000
+
+    script = os.path.abspath(__file__)
+    results = {'interpreter_ms': median_ms([sys.executable, '-c', 'pass']), 'engines': {}}
+    for name in names:
+        # Timed inside the interpreter, so its own start isn't counted
+        load = (f"import sys, time; start = time.perf_counter(); sys.path.insert(0, {EXAMPLE_DIR!r}); "
+                f"import websurfer; websurfer.load_engine({name!r}); "
+                f"print(time.perf_counter() - start, len(sys.modules))")
+        runs = [timed_run([sys.executable, '-c', load])[1].split() for _ in range(repeat)]
+        results['engines'][name] = {
+            'import_ms': statistics.median(float(seconds) for seconds, _ in runs) * 1000,
+            'modules': int(runs[-1][1]),
+            'crawl_ms': median_ms([sys.executable, script, 'crawl', '--engine', name, '--base-url', base_url,
+                                   '--max-depth', '0', '--delay', '0', '--no-sitemap', '--quiet',
+                                   '--output', output] + (['--parser', parser] if parser else [])),
+        }
+    legacy = LEGACY_STARTUP.format(example_dir=EXAMPLE_DIR, base_url=base_url)
+    results['legacy_ms'] = median_ms([sys.executable, '-c', legacy])
+    return results
+
+
+def startup(args):
+    names = args.engine or [name for name in ENGINES if name != 'headless' and not missing_modules(ENGINES[name][3])]
+    output = os.path.join(os.environ.get('TMPDIR', '/tmp'), f"websurfer-startup-{os.getpid()}.txt")
+    try:
+        if args.base_url:
+            results = measure_startup(args.base_url, names, args.repeat, output, args.parser)
+        else:
+            from benchmark import CONFIGS, running_server
+            with running_server(CONFIGS['site']) as base_url:
+                results = measure_startup(base_url, names, args.repeat, output, args.parser)
+    finally:
+        if os.path.exists(output):
+            os.remove(output)
+
+    if args.json:
+        import json
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"🏄‍♂️ Startup time (median of {args.repeat} fresh interpreters)")
+    print("=" * 50)
+    print(f"Python interpreter alone: {results['interpreter_ms']:.0f} ms")
+    print(f"{'engine':<10} {'imports':>9} {'modules':>8} {'1-page crawl, start to exit':>29}")
+    for name, result in results['engines'].items():
+        print(f"{name:<10} {result['import_ms']:>6.0f} ms {result['modules']:>8} {result['crawl_ms']:>26.0f} ms")
+    print(f"Old scripts' start (every scraper imported, then a probe request): "
+          f"{results['legacy_ms']:.0f} ms before crawling")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl a site with any of the websurfer engines")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('crawl', help="Crawl a site")
+    run.add_argument('--base-url', help="Where the crawl starts (default: http://localhost:8000)")
+    run.add_argument('--engine', choices=ENGINES, default='threaded')
+    run.add_argument('--parser', choices=PARSERS,
+                     help="Tag link parser of the requests-based engines (default: html.parser)")
+    run.add_argument('--output', default='results.txt', help="Where the links are saved")
+    run.add_argument('--max-depth', type=int, default=3)
+    run.add_argument('--delay', type=float, help="Seconds between requests (default: the engine's)")
+    run.add_argument('--sequential', action='store_true',
+                     help="One request at a time with --delay between them (threaded/hybrid)")
+    run.add_argument('--max-concurrency', type=int, help="Most requests in flight (threaded/async/hybrid)")
+    run.add_argument('--max-retries', type=int, help="Times a URL answered with 429 is queued again")
+    run.add_argument('--streaming', action='store_true', help="Parse pages as they arrive")
+    run.add_argument('--body-deadline', type=float, help="Seconds a streamed page may take")
+    run.add_argument('--no-sitemap', action='store_true', help="Don't read robots.txt and the sitemap")
+    run.add_argument('--best-first', action='store_true',
+                     help="Fetch the URLs most likely to find new links first")
+    run.add_argument('--compact', action='store_true',
+                     help="Keep URLs, the queue and per-URL metadata in compact arrays")
+    run.add_argument('--records', metavar='FILE',
+                     help="Save every URL's depth, parent, status and redirect target to FILE "
+                          "and its links to FILE.edges (implies --compact)")
+    run.add_argument('--index', metavar='FILE',
+                     help="Write a sorted, memory-mapped URL index with status and depth for "
+                          "url_index.py queries (implies --compact)")
+    run.add_argument('--js-wait', type=float, help="Seconds to let a rendered page's scripts run")
+    run.add_argument('--host', action='append', default=[], help="Another host to crawl (repeatable)")
+    run.add_argument('--allow-prefix', action='append', default=[], help="Only crawl paths under this")
+    run.add_argument('--deny-prefix', action='append', default=[], help="Don't crawl paths under this")
+    run.add_argument('--deny-pattern', action='append', default=[], help="Don't crawl URLs matching this regex")
+    run.add_argument('--budget-seconds', type=float, help="Stop after this many seconds")
+    run.add_argument('--budget-pages', type=int, help="Stop after this many pages")
+    run.add_argument('--budget-kb', type=int, help="Stop after this many KB on the wire")
+    run.add_argument('--budget-errors', type=int, help="Stop after this many failed pages")
+    run.add_argument('--replay', metavar='ARCHIVE', help="Serve the crawl from an http_archive.py recording")
+    run.add_argument('--replay-latency', type=float, default=0.0,
+                     help="With --replay, wait this multiple of each recorded response time")
+    run.add_argument('--probe', action='store_true', help="Check the server answers before crawling")
+    run.add_argument('--profile', nargs='?', const='profile', metavar='DIR',
+                     help="Time each stage and write the profile to DIR (default: profile/)")
+    run.add_argument('--profile-cprofile', action='store_true',
+                     help="Add a cProfile of the crawl's main thread")
+    run.add_argument('--profile-stacks', type=float, metavar='MS',
+                     help="Sample every thread's stack this often, for a flamegraph")
+    run.add_argument('--profile-memory', type=int, nargs='?', const=1, metavar='FRAMES',
+                     help="Trace allocations with tracemalloc, keeping FRAMES frames per site (default: 1)")
+    run.add_argument('--quiet', action='store_true', help="Only print the final line")
+    run.set_defaults(handler=crawl)
+
+    listing = commands.add_parser('engines', help="List the engines and parsers installed here")
+    listing.set_defaults(handler=engines)
+
+    timing = commands.add_parser('startup', help="Time imports and a one-page crawl per engine")
+    timing.add_argument('--base-url', help="Server to crawl (default: server.py on a free port)")
+    timing.add_argument('--engine', action='append', choices=ENGINES,
+                        help="Engine to time (repeatable, default: every available one but headless)")
+    timing.add_argument('--parser', choices=PARSERS, help="Parser the one-page crawls use")
+    timing.add_argument('--repeat', type=int, default=5)
+    timing.add_argument('--json', action='store_true', help="Print the timings as JSON")
+    timing.set_defaults(handler=startup)
+
+    args = parser.parse_args()
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())